@@ -0,0 +1,31 @@
+"""add profile image_status
+
+Revision ID: 3f1c9a7d2b84
+Revises: 6e9493ed171b
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1c9a7d2b84'
+down_revision: Union[str, None] = '6e9493ed171b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # La tabla puede haberse creado ya con Base.metadata.create_all
+    columns = [c['name'] for c in sa.inspect(op.get_bind()).get_columns('profiles')]
+    if 'image_status' not in columns:
+        op.add_column('profiles', sa.Column('image_status', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('profiles', 'image_status')
@@ -0,0 +1,59 @@
+"""cascade user delete and image job payload
+
+Revision ID: 8b2d4e6f1a37
+Revises: 3f1c9a7d2b84
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b2d4e6f1a37'
+down_revision: Union[str, None] = '3f1c9a7d2b84'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _user_fk(inspector):
+    for fk in inspector.get_foreign_keys('profiles'):
+        if fk['constrained_columns'] == ['user_id'] and fk['referred_table'] == 'users':
+            return fk
+    return None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+
+    # Recrear la clave foránea de profiles.user_id con ON DELETE CASCADE
+    fk = _user_fk(inspector)
+    if fk is None or (fk.get('options') or {}).get('ondelete', '').upper() != 'CASCADE':
+        with op.batch_alter_table('profiles') as batch_op:
+            if fk is not None and fk.get('name'):
+                batch_op.drop_constraint(fk['name'], type_='foreignkey')
+            batch_op.create_foreign_key(
+                'profiles_user_id_fkey', 'users', ['user_id'], ['id'], ondelete='CASCADE'
+            )
+
+    # La tabla puede no existir todavía; en ese caso la crea Base.metadata.create_all
+    if 'image_jobs' in inspector.get_table_names():
+        columns = [c['name'] for c in inspector.get_columns('image_jobs')]
+        if 'payload' not in columns:
+            op.add_column('image_jobs', sa.Column('payload', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    if 'image_jobs' in inspector.get_table_names():
+        op.drop_column('image_jobs', 'payload')
+
+    fk = _user_fk(inspector)
+    with op.batch_alter_table('profiles') as batch_op:
+        if fk is not None and fk.get('name'):
+            batch_op.drop_constraint(fk['name'], type_='foreignkey')
+        batch_op.create_foreign_key('profiles_user_id_fkey', 'users', ['user_id'], ['id'])
@@ -0,0 +1,31 @@
+"""add profile version
+
+Revision ID: c4e7a9b2d5f1
+Revises: 8b2d4e6f1a37
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e7a9b2d5f1'
+down_revision: Union[str, None] = '8b2d4e6f1a37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # La tabla puede haberse creado ya con Base.metadata.create_all
+    columns = [c['name'] for c in sa.inspect(op.get_bind()).get_columns('profiles')]
+    if 'version' not in columns:
+        op.add_column('profiles', sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('profiles', 'version')
@@ -0,0 +1,39 @@
+"""add profile listing indexes
+
+Revision ID: d8f3b1c6e2a9
+Revises: c4e7a9b2d5f1
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8f3b1c6e2a9'
+down_revision: Union[str, None] = 'c4e7a9b2d5f1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = {
+    'ix_profiles_created_at_id': ['created_at', 'id'],
+    'ix_profiles_last_activity_id': [sa.text('coalesce(updated_at, created_at)'), 'id'],
+    'ix_profiles_name_id': ['name', 'id'],
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Los índices pueden haberse creado ya con Base.metadata.create_all
+    existing = {index['name'] for index in sa.inspect(op.get_bind()).get_indexes('profiles')}
+    for name, columns in INDEXES.items():
+        if name not in existing:
+            op.create_index(name, 'profiles', columns)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name in INDEXES:
+        op.drop_index(name, table_name='profiles')
@@ -0,0 +1,31 @@
+"""add profile image_meta
+
+Revision ID: e5a2c8f4b7d3
+Revises: d8f3b1c6e2a9
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a2c8f4b7d3'
+down_revision: Union[str, None] = 'd8f3b1c6e2a9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # La tabla puede haberse creado ya con Base.metadata.create_all
+    columns = [c['name'] for c in sa.inspect(op.get_bind()).get_columns('profiles')]
+    if 'image_meta' not in columns:
+        op.add_column('profiles', sa.Column('image_meta', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('profiles', 'image_meta')
@@ -0,0 +1,34 @@
+"""add outbox checkpoint skipped_ids
+
+Revision ID: f2b7d9e4a6c1
+Revises: e5a2c8f4b7d3
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2b7d9e4a6c1'
+down_revision: Union[str, None] = 'e5a2c8f4b7d3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # La tabla la crea Base.metadata.create_all; puede no existir todavía
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('outbox_checkpoints'):
+        return
+    columns = [c['name'] for c in inspector.get_columns('outbox_checkpoints')]
+    if 'skipped_ids' not in columns:
+        op.add_column('outbox_checkpoints', sa.Column('skipped_ids', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('outbox_checkpoints', 'skipped_ids')
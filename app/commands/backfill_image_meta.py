@@ -0,0 +1,28 @@
+"""
+Calcula las dimensiones y la miniatura (placeholder) de las imágenes de perfil
+guardadas antes de que se registraran al procesarlas.
+
+Uso:
+    python -m app.commands.backfill_image_meta [--batch-size 100]
+"""
+import argparse
+import logging
+from app.services.image_queue_service import backfill_image_meta
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Metadatos de las imágenes de perfil existentes")
+    parser.add_argument("--batch-size", type=int, default=100, help="Perfiles revisados por transacción")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        updated, failed = backfill_image_meta(batch_size=args.batch_size)
+    except RuntimeError as e:
+        raise SystemExit(str(e))
+    print(f"Imágenes actualizadas: {updated}")
+    print(f"Imágenes que no se pudieron leer: {failed}")
+
+
+if __name__ == "__main__":
+    main()
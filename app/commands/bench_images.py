@@ -0,0 +1,83 @@
+"""
+Compara el tiempo y los píxeles decodificados al optimizar fotos de móvil
+típicas: decodificación completa frente a decodificación reducida (draft).
+
+Uso:
+    python -m app.commands.bench_images [--repeat 3]
+"""
+import argparse
+import io
+import math
+import time
+from PIL import Image, ImageDraw
+from app.services.image_service import ImageService, MAX_WIDTH, MAX_HEIGHT
+
+# Resoluciones habituales de cámaras de móvil (todas por debajo de MAX_IMAGE_PIXELS)
+PHONE_SIZES = {
+    "8 MP": (3264, 2448),
+    "12 MP": (4032, 3024),
+    "20 MP": (5472, 3648),
+    "24 MP": (6000, 4000),
+    "40 MP": (7296, 5472),
+}
+
+
+def make_photo(size) -> bytes:
+    # Degradado con formas: se comprime como una foto real y no como ruido
+    width, height = size
+    image = Image.linear_gradient("L").resize(size).convert("RGB")
+    draw = ImageDraw.Draw(image)
+    for index in range(12):
+        x, y = (index * 613) % width, (index * 379) % height
+        draw.ellipse((x, y, x + width // 6, y + height // 6), fill=(40 * index % 255, 90, 160))
+    output = io.BytesIO()
+    image.save(output, "JPEG", quality=90)
+    return output.getvalue()
+
+
+def full_decode(data: bytes) -> int:
+    """Camino anterior: decodificar a resolución completa y luego reducir"""
+    with Image.open(io.BytesIO(data)) as img:
+        img.load()
+        decoded = img.size[0] * img.size[1]
+        img.thumbnail((MAX_WIDTH, MAX_HEIGHT), reducing_gap=None)
+        img.save(io.BytesIO(), format="JPEG", optimize=True, quality=85)
+    return decoded
+
+
+def reduced_decode(data: bytes) -> int:
+    ImageService.optimize_image(io.BytesIO(data), ".jpg")
+    with Image.open(io.BytesIO(data)) as img:
+        scale = min(MAX_WIDTH / img.size[0], MAX_HEIGHT / img.size[1], 1)
+        img.draft(None, (math.ceil(img.size[0] * scale), math.ceil(img.size[1] * scale)))
+        return img.size[0] * img.size[1]
+
+
+def measure(function, data: bytes, repeat: int):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        decoded = function(data)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, decoded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la optimización de imágenes")
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticiones por caso (se toma la mejor)")
+    args = parser.parse_args()
+
+    print(f"{'Foto':>6} {'Completa':>10} {'Reducida':>10} {'Mejora':>7} {'MP decod. (completa -> reducida)':>34}")
+    for label, size in PHONE_SIZES.items():
+        data = make_photo(size)
+        full_time, full_pixels = measure(full_decode, data, args.repeat)
+        reduced_time, reduced_pixels = measure(reduced_decode, data, args.repeat)
+        print(
+            f"{label:>6} {full_time * 1000:>8.0f}ms {reduced_time * 1000:>8.0f}ms "
+            f"{full_time / reduced_time:>6.1f}x {full_pixels / 1e6:>16.1f} -> {reduced_pixels / 1e6:.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Mide la CPU por llamada de las búsquedas de usuario de get_current_user y del
+login: consulta construida en cada petición (db.query) frente a las sentencias
+ya construidas de app.database.statements. Usa la base de datos configurada y
+necesita al menos un usuario (p. ej. python -m app.commands.seed --count 1000).
+
+Uso:
+    python -m app.commands.bench_queries [--iterations 2000]
+"""
+import argparse
+import time
+from sqlalchemy import or_, select
+from app.database.connection import SessionLocal, query_cache_stats
+from app.models.user_model import User
+from app.schemas.user_schema import UserResponse
+from app.services.auth_service import AuthService
+from app.services.user_service import UserService
+
+
+def legacy_get_user_by_id(db, user_id: str) -> UserResponse:
+    """Camino anterior de get_current_user: la consulta se construye en cada llamada"""
+    db_user = db.query(User).filter(User.id == user_id).first()
+    return UserResponse.model_validate(db_user)
+
+
+def legacy_get_user_by_login(db, username_or_email: str) -> User:
+    """Camino anterior del login"""
+    return db.query(User).filter(
+        or_(
+            User.username == username_or_email,
+            User.email == username_or_email
+        )
+    ).first()
+
+
+def measure(function, iterations: int) -> float:
+    """CPU del proceso por llamada, en microsegundos (la espera de red no cuenta)"""
+    db = SessionLocal()
+    try:
+        function(db)
+        started = time.process_time()
+        for _ in range(iterations):
+            function(db)
+            # Como en una petición nueva: las filas se vuelven a convertir en objetos
+            db.expunge_all()
+        return (time.process_time() - started) / iterations * 1e6
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de las consultas de autenticación")
+    parser.add_argument("--iterations", type=int, default=2000, help="Llamadas por caso")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        user = db.execute(select(User.id, User.username, User.email).limit(1)).first()
+    finally:
+        db.close()
+    if user is None:
+        print("No hay usuarios en la base de datos; ejecuta antes app.commands.seed")
+        return
+
+    cases = {
+        "get_current_user": (
+            lambda db: legacy_get_user_by_id(db, user.id),
+            lambda db: UserService(db).get_user_by_id(user.id),
+        ),
+        "login": (
+            lambda db: legacy_get_user_by_login(db, user.email),
+            lambda db: AuthService(db).get_user_by_username_or_email(user.email),
+        ),
+    }
+
+    print(f"{'Caso':>18} {'db.query':>10} {'Sentencia':>10} {'Ahorro':>10}")
+    for label, (legacy, cached) in cases.items():
+        legacy_us = measure(legacy, args.iterations)
+        cached_us = measure(cached, args.iterations)
+        print(
+            f"{label:>18} {legacy_us:>8.0f}us {cached_us:>8.0f}us "
+            f"{legacy_us - cached_us:>6.0f}us ({(legacy_us - cached_us) / legacy_us:.0%})"
+        )
+
+    for name, stats in query_cache_stats.items():
+        snapshot = stats.snapshot()
+        print(
+            f"Caché de compilación ({name}): {snapshot['entries']}/{snapshot['size']} sentencias, "
+            f"aciertos {snapshot['hit_rate']:.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Compara configuraciones del servidor de producción (workers, bucle de eventos y
+parser HTTP) con los escenarios de carga de la API. Cada configuración arranca
+python -m app.commands.serve en un puerto local, espera a /api/health/ready y
+lanza cada escenario durante --duration segundos con --concurrency conexiones.
+
+Usa la base de datos configurada y necesita datos
+(p. ej. python -m app.commands.seed --count 10000 --password secret123).
+El cliente es un único proceso Python: con muchos workers puede ser él el límite
+(se nota en que las peticiones/s dejan de subir y la CPU del cliente está al 100%).
+
+Uso:
+    python -m app.commands.bench_server [--workers 1,2,4] [--loops uvloop,asyncio]
+                                        [--http httptools,h11] [--scenarios directory,login]
+                                        [--duration 10] [--concurrency 64] [--password secret123]
+"""
+import argparse
+import asyncio
+import importlib.util
+import itertools
+import os
+import random
+import subprocess
+import sys
+import time
+import httpx
+from sqlalchemy import select
+from app.database.connection import SessionLocal
+from app.models.profile_model import Profile
+from app.models.user_model import User
+from app.server_config import available_cpus
+
+SCENARIOS = {
+    # Directorio público precalculado
+    "directory": lambda data: ("GET", "/api/profiles", None, None),
+    # Página del listado con orden y recuento
+    "page": lambda data: ("GET", "/api/profiles?sort=newest&limit=20", None, None),
+    "profile": lambda data: ("GET", f"/api/profiles/{random.choice(data['profile_ids'])}", None, None),
+    # Ruta autenticada: decodificar el token y una consulta
+    "me": lambda data: ("GET", "/api/profiles/me", None, {"Authorization": f"Bearer {data['token']}"}),
+    # Casi siempre libre: lo responde el filtro de disponibilidad
+    "availability": lambda data: ("GET", f"/api/users/availability?username=bench-{random.getrandbits(48):x}", None, None),
+    # bcrypt: limitado por CPU y por PASSWORD_HASH_CONCURRENCY
+    "login": lambda data: ("POST", "/api/auth/login", {"username_or_email": data["username"], "password": data["password"]}, None),
+}
+
+
+def load_data(password: str) -> dict:
+    db = SessionLocal()
+    try:
+        profile_ids = list(db.execute(select(Profile.id).limit(1000)).scalars())
+        username = db.execute(select(User.username).where(User.email.like("%@seed.example.com")).limit(1)).scalar()
+    finally:
+        db.close()
+    if not profile_ids or not username:
+        raise SystemExit("No hay datos: ejecuta antes python -m app.commands.seed --count 10000")
+    return {"profile_ids": profile_ids, "username": username, "password": password}
+
+
+def start_server(workers: int, loop: str, http: str, port: int) -> subprocess.Popen:
+    command = [
+        sys.executable, "-m", "app.commands.serve",
+        "--workers", str(workers), "--loop", loop, "--http", http, "--port", str(port), "--host", "127.0.0.1",
+    ]
+    return subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=dict(os.environ))
+
+
+async def wait_ready(base_url: str, server: subprocess.Popen, timeout: float = 120):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise RuntimeError(f"El servidor terminó al arrancar (código {server.returncode})")
+            try:
+                if (await client.get("/api/health/ready")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.5)
+    raise RuntimeError("El servidor no estuvo listo a tiempo")
+
+
+async def run_scenario(base_url: str, scenario, data: dict, duration: float, concurrency: int) -> dict:
+    latencies = []
+    errors = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        deadline = time.monotonic() + duration
+
+        async def user():
+            nonlocal errors
+            while time.monotonic() < deadline:
+                method, url, body, headers = scenario(data)
+                started = time.perf_counter()
+                try:
+                    response = await client.request(method, url, json=body, headers=headers)
+                    if response.status_code >= 400:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.monotonic()
+        await asyncio.gather(*[user() for _ in range(concurrency)])
+        elapsed = time.monotonic() - started
+
+    latencies.sort()
+
+    def percentile(p: float) -> float:
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0.0
+
+    return {"rps": len(latencies) / elapsed, "p50": percentile(0.5), "p99": percentile(0.99), "errors": errors}
+
+
+async def bench_config(workers: int, loop: str, http: str, args, data: dict) -> list:
+    base_url = f"http://127.0.0.1:{args.port}"
+    server = start_server(workers, loop, http, args.port)
+    try:
+        await wait_ready(base_url, server)
+        async with httpx.AsyncClient(base_url=base_url) as client:
+            response = await client.post(
+                "/api/auth/login", json={"username_or_email": data["username"], "password": data["password"]}
+            )
+            if response.status_code != 200:
+                raise SystemExit(f"Login fallido ({response.status_code}): revisa --password")
+            data["token"] = response.json()["access_token"]
+        results = []
+        for name in args.scenarios:
+            # Calentamiento corto para abrir conexiones y cachés de cada worker
+            await run_scenario(base_url, SCENARIOS[name], data, 1, args.concurrency)
+            results.append((name, await run_scenario(base_url, SCENARIOS[name], data, args.duration, args.concurrency)))
+        return results
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de configuraciones del servidor")
+    parser.add_argument("--workers", default=f"1,{available_cpus()}", help="Números de workers separados por comas")
+    default_loops = "uvloop,asyncio" if importlib.util.find_spec("uvloop") else "asyncio"
+    parser.add_argument("--loops", default=default_loops, help="Bucles de eventos a comparar")
+    parser.add_argument("--http", default="httptools,h11", help="Parsers HTTP a comparar")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"Escenarios: {', '.join(SCENARIOS)}")
+    parser.add_argument("--duration", type=float, default=10, help="Segundos por escenario")
+    parser.add_argument("--concurrency", type=int, default=64, help="Conexiones simultáneas del cliente")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--password", default="secret123", help="Contraseña de los usuarios del seed")
+    args = parser.parse_args()
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"Escenarios no válidos: {', '.join(unknown)}")
+
+    data = load_data(args.password)
+    workers = [int(value) for value in dict.fromkeys(args.workers.split(","))]
+    configs = list(itertools.product(workers, args.loops.split(","), args.http.split(",")))
+
+    print(f"{'config':<26} {'escenario':<13} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errores':>8}")
+    for worker_count, loop, http in configs:
+        label = f"{worker_count}w {loop} {http}"
+        for name, result in asyncio.run(bench_config(worker_count, loop, http, args, data)):
+            print(
+                f"{label:<26} {name:<13} {result['rps']:>9.0f} {result['p50']:>8.1f} "
+                f"{result['p99']:>8.1f} {result['errors']:>8}"
+            )
+
+
+if __name__ == "__main__":
+    main()
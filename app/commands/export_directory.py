@@ -0,0 +1,34 @@
+"""
+Guarda una copia completa del directorio (usuarios, perfiles e imágenes) en un zip.
+Es el mismo archivo que descarga GET /api/backup/export.
+
+Uso:
+    python -m app.commands.export_directory --output backup.zip [--batch-size 1000]
+"""
+import argparse
+import logging
+import sys
+from app.services.backup_service import export_directory, EXPORT_BATCH_SIZE
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exportación del directorio a un zip")
+    parser.add_argument("--output", required=True, help="Archivo de salida (- para la salida estándar)")
+    parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE, help="Filas leídas por vez del cursor")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    output = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+    written = 0
+    try:
+        for chunk in export_directory(batch_size=args.batch_size):
+            output.write(chunk)
+            written += len(chunk)
+    finally:
+        if output is not sys.stdout.buffer:
+            output.close()
+    print(f"Exportados {written} bytes", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""
+Elimina del almacenamiento las imágenes que ningún perfil referencia.
+
+Uso:
+    python -m app.commands.gc_uploads [--grace-seconds 3600] [--batch-size 500] [--dry-run]
+"""
+import argparse
+import logging
+from app.services.upload_gc_service import collect_orphaned_uploads, UPLOAD_GC_GRACE_SECONDS
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recolector de imágenes huérfanas en uploads")
+    parser.add_argument("--grace-seconds", type=int, default=UPLOAD_GC_GRACE_SECONDS,
+                        help="Antigüedad mínima de un archivo para poder eliminarlo")
+    parser.add_argument("--batch-size", type=int, default=500, help="Archivos comprobados por consulta")
+    parser.add_argument("--dry-run", action="store_true", help="Solo informar, sin eliminar nada")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    report = collect_orphaned_uploads(
+        grace_seconds=args.grace_seconds,
+        batch_size=args.batch_size,
+        dry_run=args.dry_run
+    )
+
+    action = "se eliminarían" if args.dry_run else "eliminados"
+    print(f"Archivos revisados: {report.scanned}")
+    print(f"Huérfanos: {report.orphaned} ({action})")
+    print(f"Bytes recuperados: {report.reclaimed_bytes}")
+    for error in report.errors:
+        print(f"Error: {error}")
+
+
+if __name__ == "__main__":
+    main()
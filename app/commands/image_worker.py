@@ -0,0 +1,23 @@
+"""
+Proceso trabajador de la cola de imágenes (IMAGE_QUEUE_MODE=worker).
+
+Uso:
+    python -m app.commands.image_worker [--poll-interval 1.0] [--batch-size 50]
+"""
+import argparse
+import logging
+from app.services.image_queue_service import run_worker
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Procesa los trabajos pendientes de la tabla image_jobs")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="Segundos de espera cuando no hay trabajos")
+    parser.add_argument("--batch-size", type=int, default=50, help="Trabajos leídos por consulta")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    run_worker(poll_interval=args.poll_interval, batch_size=args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
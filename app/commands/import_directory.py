@@ -0,0 +1,31 @@
+"""
+Importa un zip generado por la exportación del directorio. Si se interrumpe,
+basta con repetir el mismo comando: lo ya importado se salta.
+
+Uso:
+    python -m app.commands.import_directory --file backup.zip [--batch-size 1000]
+"""
+import argparse
+import logging
+from app.services.backup_service import import_directory, EXPORT_BATCH_SIZE
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importación del directorio desde un zip")
+    parser.add_argument("--file", required=True, help="Zip generado por la exportación")
+    parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE, help="Filas por transacción")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    report = import_directory(args.file, batch_size=args.batch_size)
+
+    print(f"Usuarios importados: {report.users}")
+    print(f"Perfiles importados: {report.profiles}")
+    print(f"Imágenes copiadas: {report.images}")
+    print(f"Ya existentes (omitidos): {report.skipped}")
+    print(f"Conflictos: {report.conflicts}")
+    print(f"Tiempo: {report.seconds:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Muestra los eventos del outbox que no se pudieron entregar tras
+OUTBOX_MAX_ATTEMPTS intentos y, con --replay, los vuelve a encolar.
+
+Uso:
+    python -m app.commands.outbox_failures [--consumer api] [--replay] [--ids 1,2,3]
+"""
+import argparse
+import logging
+from sqlalchemy import select
+from app.database.connection import engine
+from app.models.outbox_event_model import OutboxFailure
+from app.services.outbox_service import replay_failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Eventos del outbox no entregados")
+    parser.add_argument("--consumer", default=None, help="Solo los de este consumidor")
+    parser.add_argument("--replay", action="store_true", help="Volver a encolarlos como eventos nuevos")
+    parser.add_argument("--ids", default=None, help="Ids de outbox_failures separados por comas (por defecto, todos)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    failure_ids = [int(value) for value in args.ids.split(",")] if args.ids else None
+
+    if args.replay:
+        replayed = replay_failures(args.consumer, failure_ids)
+        print(f"Eventos encolados de nuevo: {replayed}")
+        return
+
+    query = select(OutboxFailure).order_by(OutboxFailure.id)
+    if args.consumer:
+        query = query.where(OutboxFailure.consumer == args.consumer)
+    if failure_ids:
+        query = query.where(OutboxFailure.id.in_(failure_ids))
+    with engine.connect() as connection:
+        failures = connection.execute(query).all()
+    for row in failures:
+        print(
+            f"{row.id}\t{row.consumer}\tevento {row.event_id}\t{row.topic}/{row.entity_id} {row.action}\t"
+            f"{row.attempts} intentos\t{row.failed_at}\t{row.error}"
+        )
+    print(f"Total: {len(failures)}")
+
+
+if __name__ == "__main__":
+    main()
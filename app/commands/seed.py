@@ -0,0 +1,41 @@
+"""
+Genera usuarios y perfiles sintéticos para pruebas de carga y planes de consulta.
+
+Uso:
+    python -m app.commands.seed --count 1000000 [--batch-size 5000] [--images 20]
+                                [--password secret123] [--seed 42]
+"""
+import argparse
+import logging
+from app.services.seed_service import seed_profiles
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Carga de datos sintéticos (usuarios, perfiles e imágenes)")
+    parser.add_argument("--count", type=int, required=True, help="Número de usuarios a crear")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Filas por INSERT")
+    parser.add_argument("--images", type=int, default=20, help="Imágenes de muestra de las que se copian las de cada perfil")
+    parser.add_argument("--password", default="secret123", help="Contraseña de todos los usuarios generados")
+    parser.add_argument("--seed", type=int, default=None, help="Semilla para repetir los mismos datos")
+    parser.add_argument("--cover-ratio", type=float, default=0.7, help="Proporción de perfiles con portada")
+    parser.add_argument("--contact-ratio", type=float, default=0.5, help="Proporción con WhatsApp / Facebook")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    report = seed_profiles(
+        count=args.count,
+        batch_size=args.batch_size,
+        image_count=args.images,
+        password=args.password,
+        seed=args.seed,
+        cover_ratio=args.cover_ratio,
+        contact_ratio=args.contact_ratio
+    )
+
+    print(f"Usuarios creados: {report.users}")
+    print(f"Imágenes copiadas: {report.images}")
+    print(f"Tiempo: {report.seconds:.1f} s ({report.users / max(report.seconds, 0.001):.0f} usuarios/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Servidor de producción: uvicorn con varios workers, uvloop (si está instalado)
+y httptools. El número de workers y los recursos de cada uno salen de
+app/server_config.py; los argumentos solo sustituyen a las variables de entorno.
+
+Recarga sin cortar el servicio (varios workers): kill -HUP <pid del proceso padre>
+reinicia los workers uno a uno; cada uno termina sus peticiones en curso
+(hasta SERVER_GRACEFUL_TIMEOUT). Con SIGTTIN / SIGTTOU se añade o quita un worker.
+
+Uso:
+    python -m app.commands.serve [--workers 4] [--port 8000] [--loop uvloop] [--http httptools]
+                                 [--print-config]
+"""
+import argparse
+import json
+import os
+import uvicorn
+from app.server_config import ServerConfig
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor de producción de la API")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos (por defecto WEB_CONCURRENCY o uno por núcleo)")
+    parser.add_argument("--host", default=None)
+    parser.add_argument("--port", type=int, default=None)
+    parser.add_argument("--loop", choices=["uvloop", "asyncio", "auto"], default=None, help="Bucle de eventos")
+    parser.add_argument("--http", choices=["httptools", "h11", "auto"], default=None, help="Parser HTTP")
+    parser.add_argument("--print-config", action="store_true", help="Mostrar la configuración resuelta y salir")
+    args = parser.parse_args()
+
+    # Los workers heredan el entorno: así calculan los mismos tamaños por proceso
+    if args.workers:
+        os.environ["WEB_CONCURRENCY"] = str(args.workers)
+    if args.loop:
+        os.environ["SERVER_LOOP"] = args.loop
+    if args.http:
+        os.environ["SERVER_HTTP"] = args.http
+    config = ServerConfig.from_env(workers=args.workers)
+    if args.host:
+        config.host = args.host
+    if args.port:
+        config.port = args.port
+
+    if args.print_config:
+        print(json.dumps(config.as_dict(), indent=2))
+        return
+
+    uvicorn.run(
+        "main:app",
+        host=config.host,
+        port=config.port,
+        workers=config.workers,
+        loop=config.loop,
+        http=config.http,
+        backlog=config.backlog,
+        timeout_keep_alive=config.keep_alive,
+        timeout_graceful_shutdown=config.graceful_timeout,
+        limit_concurrency=config.limit_concurrency or None,
+        # Detrás del balanceador: IP real del cliente y esquema desde X-Forwarded-*
+        proxy_headers=True,
+        forwarded_allow_ips=os.getenv("FORWARDED_ALLOW_IPS", "*"),
+        access_log=config.access_log,
+        server_header=False,
+    )
+
+
+if __name__ == "__main__":
+    main()
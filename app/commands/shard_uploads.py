@@ -0,0 +1,37 @@
+"""
+Migra las imágenes de la raíz de uploads/ al esquema repartido ab/cd/<nombre>.
+Se puede ejecutar con la aplicación en marcha y reanudar si se interrumpe.
+
+Uso:
+    python -m app.commands.shard_uploads [--batch-size 500] [--checkpoint archivo] [--dry-run]
+"""
+import argparse
+import logging
+from app.services.upload_migration_service import migrate_to_sharded_layout
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migración de uploads/ a subdirectorios por hash")
+    parser.add_argument("--batch-size", type=int, default=500, help="Perfiles procesados por lote")
+    parser.add_argument("--checkpoint", default="uploads_migration.checkpoint",
+                        help="Archivo donde se guarda el último perfil migrado")
+    parser.add_argument("--dry-run", action="store_true", help="Solo informar, sin mover nada")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    report = migrate_to_sharded_layout(
+        batch_size=args.batch_size,
+        checkpoint_path=args.checkpoint,
+        dry_run=args.dry_run
+    )
+
+    print(f"Perfiles revisados: {report.profiles}")
+    print(f"Imágenes movidas: {report.moved}")
+    print(f"Imágenes omitidas: {report.skipped}")
+    print(f"Último perfil: {report.last_profile_id}")
+    for error in report.errors:
+        print(f"Error: {error}")
+
+
+if __name__ == "__main__":
+    main()
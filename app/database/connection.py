@@ -1,23 +1,155 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.default import CACHE_HIT, CACHE_MISS
 from sqlalchemy.orm import sessionmaker, Session
-from typing import Generator
+from fastapi import Request
+from starlette.concurrency import run_in_threadpool
+from typing import Dict, Generator, List
+import asyncio
+import itertools
 import os
+import threading
+import logging
 from dotenv import load_dotenv
 from app.models.base_model import Base
+from app.server_config import server_config
 
 load_dotenv()
 
-DB_URL = f"{os.getenv('DB_DRIVER')}://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}"
+logger = logging.getLogger("app")
 
-engine = create_engine(DB_URL)
+# DATABASE_URL se usa como respaldo cuando no se definen las variables por partes
+if os.getenv("DB_DRIVER"):
+    DB_URL = f"{os.getenv('DB_DRIVER')}://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}"
+else:
+    DB_URL = os.getenv("DATABASE_URL")
+
+# Réplicas de solo lectura: URLs completas separadas por comas
+DB_REPLICA_URLS = [url.strip() for url in os.getenv("DB_REPLICA_URLS", "").split(",") if url.strip()]
+# Tiempo durante el que las lecturas de un cliente van al primario después de escribir
+DB_REPLICA_STICKY_SECONDS = float(os.getenv("DB_REPLICA_STICKY_SECONDS", "5"))
+DB_REPLICA_HEALTH_INTERVAL = float(os.getenv("DB_REPLICA_HEALTH_INTERVAL", "10"))
+# Sentencias compiladas que guarda cada engine (SQLAlchemy usa 500 por defecto)
+DB_QUERY_CACHE_SIZE = int(os.getenv("DB_QUERY_CACHE_SIZE", "1200"))
+
+
+class QueryCacheStats:
+    """
+    Aciertos y fallos de la caché de compilación de SQL de un engine
+    """
+
+    def __init__(self, target: Engine):
+        self.engine = target
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        event.listen(target, "after_cursor_execute", self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        cache_hit = getattr(context, "cache_hit", None)
+        if cache_hit is CACHE_HIT:
+            with self._lock:
+                self.hits += 1
+        elif cache_hit is CACHE_MISS:
+            with self._lock:
+                self.misses += 1
+
+    def snapshot(self) -> Dict:
+        total = self.hits + self.misses
+        compiled_cache = self.engine._compiled_cache
+        return {
+            "size": DB_QUERY_CACHE_SIZE,
+            "entries": len(compiled_cache) if compiled_cache is not None else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else None,
+        }
+
+
+def _create_engine(url: str, **kwargs) -> Engine:
+    if url.startswith("sqlite"):
+        # Permite usar bases SQLite locales (p. ej. para probar las réplicas)
+        kwargs.setdefault("connect_args", {"check_same_thread": False})
+    else:
+        # Conexiones por worker (ver app/server_config.py)
+        kwargs.setdefault("pool_size", server_config.db_pool_size)
+        kwargs.setdefault("max_overflow", server_config.db_max_overflow)
+        kwargs.setdefault("pool_timeout", server_config.db_pool_timeout)
+    kwargs.setdefault("query_cache_size", DB_QUERY_CACHE_SIZE)
+    return create_engine(url, **kwargs)
+
+
+engine = _create_engine(DB_URL)
+replica_engines = [_create_engine(url, pool_pre_ping=True) for url in DB_REPLICA_URLS]
+query_cache_stats = {"primary": QueryCacheStats(engine)}
+query_cache_stats.update({f"replica_{index}": QueryCacheStats(replica) for index, replica in enumerate(replica_engines)})
 SessionLocal = sessionmaker(bind=engine)
 
 # Crear todas las tablas
 Base.metadata.create_all(bind=engine)
 
-def get_db() -> Generator[Session, None, None]:
-    db = SessionLocal()
+
+class ReplicaRouter:
+    """
+    Decide a qué base de datos va cada petición: las de solo lectura a una
+    réplica sana (en rueda), y todo lo demás al primario. Después de escribir,
+    el cliente lee del primario durante DB_REPLICA_STICKY_SECONDS: la marca
+    viaja con él (ver ReplicaRoutingMiddleware), así que vale en cualquier worker.
+    """
+
+    def __init__(self, primary: Engine, replicas: List[Engine], sticky_seconds: float = DB_REPLICA_STICKY_SECONDS):
+        self.primary = primary
+        self.replicas = replicas
+        self.sticky_seconds = sticky_seconds
+        self.healthy = list(replicas)
+        self._cycle = itertools.count()
+        self._lock = threading.Lock()
+        for replica in replicas:
+            event.listen(replica, "handle_error", self._on_replica_error)
+
+    def pick_read_engine(self) -> Engine:
+        healthy = self.healthy
+        if not healthy:
+            return self.primary
+        return healthy[next(self._cycle) % len(healthy)]
+
+    def _on_replica_error(self, context):
+        # Sacar la réplica de la rotación en cuanto falla la conexión
+        if context.is_disconnect or context.connection is None:
+            failed = context.engine
+            with self._lock:
+                if failed in self.healthy:
+                    logger.error(f"Réplica no disponible, se usará el primario: {failed.url}")
+                    self.healthy = [replica for replica in self.healthy if replica is not failed]
+
+    def check_health(self):
+        healthy = []
+        for replica in self.replicas:
+            try:
+                with replica.connect() as connection:
+                    connection.execute(text("SELECT 1"))
+                healthy.append(replica)
+            except Exception as e:
+                logger.error(f"Réplica no disponible ({replica.url}): {str(e)}")
+        with self._lock:
+            self.healthy = healthy
+
+    async def run_health_checks(self, interval: float = DB_REPLICA_HEALTH_INTERVAL):
+        while True:
+            await run_in_threadpool(self.check_health)
+            await asyncio.sleep(interval)
+
+
+db_router = ReplicaRouter(engine, replica_engines)
+
+
+def get_db(request: Request) -> Generator[Session, None, None]:
+    # El middleware de réplicas marca las peticiones que pueden leer de una réplica
+    if getattr(request.state, "read_replica", False):
+        db = SessionLocal(bind=db_router.pick_read_engine())
+    else:
+        db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
@@ -0,0 +1,39 @@
+"""
+Consultas frecuentes construidas una sola vez al importar el módulo.
+
+Con db.query(...).filter(...) cada petición vuelve a construir la consulta y a
+calcular su clave de caché; estas sentencias ya construidas reutilizan la clave
+(memorizada en el objeto) y la SQL compilada de la caché del engine. Los valores
+se pasan como parámetros: db.execute(USER_BY_ID, {"user_id": ...}).
+"""
+from sqlalchemy import bindparam, or_, select
+from sqlalchemy.orm import contains_eager
+from app.models.user_model import User
+from app.models.profile_model import Profile
+
+USER_BY_ID = select(User).where(User.id == bindparam("user_id")).limit(1)
+
+USER_BY_USERNAME = select(User).where(User.username == bindparam("username")).limit(1)
+
+USER_BY_EMAIL = select(User).where(User.email == bindparam("email")).limit(1)
+
+# Login: el mismo valor se compara con el username y con el email
+USER_BY_LOGIN = select(User).where(
+    or_(User.username == bindparam("login"), User.email == bindparam("login"))
+).limit(1)
+
+# Disponibilidad: username y email en una sola consulta (ambas columnas tienen índice único)
+USERNAME_OR_EMAIL_TAKEN = select(User.username, User.email).where(
+    or_(User.username == bindparam("username"), User.email == bindparam("email"))
+).limit(2)
+
+USER_IS_SUPERUSER = select(User.is_superuser).where(User.id == bindparam("user_id"))
+
+PROFILE_BY_USER_ID = select(Profile).where(Profile.user_id == bindparam("user_id")).limit(1)
+
+# Perfil del usuario autenticado junto con su usuario (rutas /me)
+_PROFILE_WITH_USER = select(Profile).join(Profile.user).options(contains_eager(Profile.user))
+
+PROFILE_WITH_USER_BY_USER_ID = _PROFILE_WITH_USER.where(User.id == bindparam("user_id")).limit(1)
+
+PROFILE_WITH_USER_BY_USERNAME = _PROFILE_WITH_USER.where(User.username == bindparam("username")).limit(1)
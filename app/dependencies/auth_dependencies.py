@@ -4,6 +4,13 @@ from jose import JWTError, jwt
 from app.services.auth_service import SECRET_KEY, ALGORITHM
 from app.services.user_service import UserService
 from app.models.user_model import User
+from app.models.profile_model import Profile
+from app.database.connection import get_db
+from sqlalchemy.orm import Session
+from app.database.statements import PROFILE_WITH_USER_BY_USER_ID, PROFILE_WITH_USER_BY_USERNAME
+from app.services.invalidation_service import CACHE_ENABLED, principal_cache
+from app.services.revocation_service import revocation_list
+from app.schemas.auth_schema import TokenPrincipal
 import os
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth")
@@ -20,33 +27,64 @@ def write_log(message: str):
     except Exception as e:
         print(f"Error escribiendo log: {str(e)}")  # Fallback a print si no se puede escribir
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    user_service: UserService = Depends(UserService)
-) -> User:
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Credenciales inválidas",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+async def get_token_payload(
+    token: str = Depends(oauth2_scheme)
+) -> dict:
+    """
+    Decodifica el token y comprueba en memoria que no esté revocado (sin consultar la base)
+    """
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError as e:
+        write_log(f"Error al decodificar JWT: {str(e)}")
+        raise _credentials_exception()
+    if revocation_list.is_revoked(payload.get("jti"), payload.get("id"), payload.get("iat")):
+        write_log(f"Error: token revocado - ID: {payload.get('id')}")
+        raise _credentials_exception()
+    return payload
+
+async def get_current_user(
+    payload: dict = Depends(get_token_payload),
+    user_service: UserService = Depends(UserService)
+) -> User:
+    credentials_exception = _credentials_exception()
     try:
         # Log del token recibido
         write_log("\n--- Nueva solicitud de autenticación ---")
-        write_log(f"Token recibido: {token[:20]}...")  # Solo los primeros 20 caracteres por seguridad
-        
-        # Decodificar token
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         write_log(f"Token decodificado (payload): {payload}")
         
         # Obtener información del token
         user_id = payload.get("id")
         username = payload.get("sub")
         write_log(f"Información extraída del token - ID: {user_id}, Username: {username}")
+
+        # Los tokens actuales llevan todo lo necesario y ya se comprobó que no
+        # están revocados: no hace falta consultar la base
+        if user_id and username and payload.get("jti") and "su" in payload:
+            return TokenPrincipal(
+                id=user_id,
+                username=username,
+                email=payload.get("email"),
+                is_superuser=payload["su"]
+            )
         
-        # Obtener usuario
-        if user_id:
+        # Tokens emitidos antes de las revocaciones: se busca el usuario
+        # (en la caché del worker si está activada)
+        user = principal_cache.get(user_id) if user_id and CACHE_ENABLED else None
+        if user is not None:
+            write_log(f"Usuario obtenido de la caché: {user_id}")
+        elif user_id:
             user = user_service.get_user_by_id(user_id)
             write_log(f"Buscando usuario por ID: {user_id}")
+            if CACHE_ENABLED:
+                principal_cache.set(user_id, user)
         elif username:
             user = user_service.get_user_by_username(username)
             write_log(f"Buscando usuario por username: {username}")
@@ -61,13 +99,44 @@ async def get_current_user(
         write_log(f"Usuario encontrado exitosamente - ID: {user.id}, Username: {user.username}")
         return user
         
-    except JWTError as e:
-        write_log(f"Error al decodificar JWT: {str(e)}")
-        raise credentials_exception
+    except HTTPException:
+        raise
     except Exception as e:
         write_log(f"Error inesperado: {str(e)}")
         raise credentials_exception
 
+async def get_current_profile(
+    payload: dict = Depends(get_token_payload),
+    db: Session = Depends(get_db)
+) -> Profile:
+    """
+    Obtiene el perfil del usuario autenticado junto con su usuario en una sola
+    consulta, en lugar de buscar primero el usuario y después el perfil
+    """
+    credentials_exception = _credentials_exception()
+
+    user_id = payload.get("id")
+    username = payload.get("sub")
+    if user_id:
+        statement, params = PROFILE_WITH_USER_BY_USER_ID, {"user_id": user_id}
+        condition = User.id == user_id
+    elif username:
+        statement, params = PROFILE_WITH_USER_BY_USERNAME, {"username": username}
+        condition = User.username == username
+    else:
+        write_log("Error: No se encontró ID ni username en el token")
+        raise credentials_exception
+
+    profile = db.execute(statement, params).scalars().first()
+    if profile is None:
+        # Solo en el caso de error se distingue entre usuario inexistente y perfil inexistente
+        user = db.query(User.username).filter(condition).first()
+        if user is None:
+            write_log("Error: Usuario no encontrado en la base de datos")
+            raise credentials_exception
+        raise HTTPException(status_code=404, detail=f"No se encontró el perfil para el usuario {user.username}")
+    return profile
+
 async def check_superuser_or_owner(
     current_user: User = Depends(get_current_user),
     user_id: str = None
@@ -1,7 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from fastapi.security import OAuth2PasswordRequestForm
+from starlette.concurrency import run_in_threadpool
 from app.schemas.auth_schema import AuthResponse, AuthLogin
 from app.services.auth_service import AuthService
+from app.dependencies.auth_dependencies import get_token_payload
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -14,7 +16,8 @@ async def login_oauth(
     Endpoint para autenticación OAuth2 (usado por Swagger/OpenAPI)
     """
     try:
-        return service.login_oauth(form_data)
+        # bcrypt fuera del bucle de eventos
+        return await run_in_threadpool(service.login_oauth, form_data)
     except ValueError as e:
         raise HTTPException(
             status_code=400,
@@ -30,10 +33,28 @@ async def login(
     Endpoint personalizado para login con username/email
     """
     try:
-        return service.login(login_data)
+        # bcrypt fuera del bucle de eventos
+        return await run_in_threadpool(service.login, login_data)
     except ValueError as e:
         raise HTTPException(
             status_code=400,
             detail=str(e)
         )
 
+@router.post("/logout", status_code=204)
+async def logout(
+    everywhere: bool = Query(False, description="Revocar también los tokens de las demás sesiones"),
+    payload: dict = Depends(get_token_payload),
+    service: AuthService = Depends(AuthService)
+):
+    """
+    Revoca el token actual (o todos los del usuario con everywhere=true)
+    """
+    try:
+        service.logout(payload, everywhere)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=str(e)
+        )
+    return Response(status_code=204)
@@ -0,0 +1,24 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+from app.models.user_model import User
+from app.dependencies.auth_dependencies import check_superuser
+from app.services.backup_service import export_directory
+import time
+
+router = APIRouter(prefix="/backup", tags=["backup"])
+
+@router.get("/export")
+async def export_backup(
+    _: User = Depends(check_superuser)
+):
+    """
+    Descarga una copia completa del directorio (usuarios, perfiles e imágenes)
+    como zip generado sobre la marcha (solo superusuario).
+    Se importa con: python -m app.commands.import_directory --file <zip>
+    """
+    filename = f"directorio-{time.strftime('%Y%m%d-%H%M%S')}.zip"
+    return StreamingResponse(
+        export_directory(),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
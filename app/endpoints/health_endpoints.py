@@ -0,0 +1,39 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import JSONResponse
+from app.database.connection import query_cache_stats
+from app.dependencies.auth_dependencies import check_superuser
+from app.models.user_model import User
+from app.services.health_service import warmup_state
+
+router = APIRouter(prefix="/health", tags=["health"])
+
+@router.get("/live")
+async def live():
+    """
+    El proceso responde (no comprueba dependencias)
+    """
+    return {"status": "ok"}
+
+@router.get("/ready")
+async def ready():
+    """
+    La base de datos y el listado de perfiles están calentados y la instancia
+    puede recibir tráfico. Mientras no lo estén responde 503 con los errores.
+    """
+    content = {
+        "status": "ready" if warmup_state.ready else "warming_up",
+        "steps_ms": warmup_state.steps,
+        "total_ms": warmup_state.total_ms,
+        "errors": warmup_state.errors,
+        "attempts": warmup_state.attempts,
+    }
+    return JSONResponse(content, status_code=200 if warmup_state.ready else 503)
+
+@router.get("/query-cache")
+async def query_cache(
+    _: User = Depends(check_superuser)
+):
+    """
+    Uso de la caché de compilación de SQL de cada engine (primario y réplicas) (solo superusuario)
+    """
+    return {name: stats.snapshot() for name, stats in query_cache_stats.items()}
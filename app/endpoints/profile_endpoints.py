@@ -1,10 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, Request, File, UploadFile, Form
-from app.services.profile_service import ProfileService
-from app.schemas.profile_schema import ProfileResponse, ProfileUpdate, AllProfilesResponse
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, File, UploadFile, Form, Query, Header
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from app.services.profile_service import ProfileService, VersionConflictError
+from app.services.image_service import ImageTooLargeError
+from app.services.invalidation_service import CACHE_ENABLED, profile_cache
+from app.services.directory_service import directory_snapshot
+from app.services.stream_service import profile_stream, replay_events, StreamFullError, RESET_MESSAGE, HEARTBEAT_MESSAGE, STREAM_HEARTBEAT_SECONDS
+from app.schemas.profile_schema import ProfileResponse, ProfileUpdate, ProfilePatch, AllProfilesResponse, ProfileListingResponse, ImageUploadUrlResponse, ImageUploadConfirm
 from app.models.user_model import User
-from app.dependencies.auth_dependencies import get_current_user, check_superuser, check_superuser_or_owner
-from typing import List, Optional
+from app.middleware.query_budget_middleware import query_budget
+from app.dependencies.auth_dependencies import get_current_user, get_current_profile, check_superuser, check_superuser_or_owner
+from typing import List, Optional, Union
 from app.models.profile_model import Profile
+import asyncio
 import logging
 from app.dependencies.auth_dependencies import get_current_user
 
@@ -13,46 +22,214 @@ logger = logging.getLogger("app")
 
 router = APIRouter(prefix="/profiles", tags=["profiles"])
 
-@router.get("/me", response_model=ProfileResponse)
+
+def _etag(version: Optional[int]) -> str:
+    return f'"{version}"'
+
+
+def _parse_if_match(if_match: Optional[str]) -> Optional[int]:
+    """
+    Convierte la cabecera If-Match ('"3"', 'W/"3"' o '*') en la versión esperada
+    """
+    if if_match is None or if_match.strip() == "*":
+        return None
+    value = if_match.strip()
+    if value.startswith("W/"):
+        value = value[2:]
+    try:
+        return int(value.strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=412, detail="If-Match no corresponde a ninguna versión del perfil")
+
+@router.get("/me", response_model=ProfileResponse, dependencies=[Depends(query_budget(1))])
 async def get_my_profile(
-    current_user: User = Depends(get_current_user),
-    service: ProfileService = Depends(ProfileService)
+    profile: Profile = Depends(get_current_profile)
 ):
     """
     Ruta protegida para obtener el perfil del usuario autenticado
     """
-    try:
-        # Solo buscar el perfil existente por user_id
-        profile = service.db.query(Profile).filter(Profile.user_id == current_user.id).first()
-        if not profile:
-            raise ValueError(f"No se encontró el perfil para el usuario {current_user.username}")
-        return profile
-    except ValueError as e:
-        raise HTTPException(status_code=404, detail=str(e))
+    return profile
 
-@router.get("", response_model=List[AllProfilesResponse])
+@router.get(
+    "",
+    response_model=Union[List[AllProfilesResponse], ProfileListingResponse],
+    dependencies=[Depends(query_budget(2))]
+)
 async def get_all_profiles(
+    request: Request,
+    ids: Optional[str] = Query(None, description="IDs separados por comas: devuelve esos perfiles completos en una sola consulta"),
+    fields: Optional[str] = Query(None, description="Campos separados por comas a incluir en la respuesta"),
+    sort: Optional[str] = Query(None, description="Orden: newest, updated o name"),
+    has_cover: Optional[bool] = Query(None, description="Solo perfiles con (true) o sin (false) portada"),
+    has_whatsapp: Optional[bool] = Query(None, description="Solo perfiles con (true) o sin (false) WhatsApp"),
+    has_facebook: Optional[bool] = Query(None, description="Solo perfiles con (true) o sin (false) Facebook"),
+    limit: Optional[int] = Query(None, ge=1, description="Tamaño de la página"),
+    offset: int = Query(0, ge=0),
+    facets: bool = Query(False, description="Incluir cuántos resultados cumple cada filtro has_*"),
     service: ProfileService = Depends(ProfileService)
 ):
     """
-    Ruta pública para obtener todos los perfiles con información básica
+    Ruta pública para obtener todos los perfiles con información básica,
+    o varios perfiles concretos con ?ids=a,b,c.
+    Con sort, filtros has_* o limit/offset devuelve solo esa página con el
+    total (ProfileListingResponse); con facets=true, también los recuentos por filtro.
     """
-    return service.get_all_profiles()
+    filters = {"has_cover": has_cover, "has_whatsapp": has_whatsapp, "has_facebook": has_facebook}
+    paged = sort is not None or limit is not None or offset or facets
+    if ids is None and (paged or any(v is not None for v in filters.values())):
+        try:
+            selected = service.parse_fields(fields) or service.LISTING_FIELDS
+            listing = service.search_profiles(selected, sort, filters, limit or 20, offset, with_facets=facets)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return JSONResponse(jsonable_encoder(ProfileListingResponse(**listing)))
+
+    if ids is None and fields is None:
+        if not directory_snapshot.enabled:
+            return service.get_all_profiles()
+        # Listado precalculado: sin cambios pendientes no se consulta la base
+        body, etag = directory_snapshot.get(service.db)
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        return Response(content=body, media_type="application/json", headers={"ETag": etag})
 
-@router.get("/{profile_id}", response_model=ProfileResponse)
+    try:
+        id_list = service.parse_ids(ids)
+        selected = service.parse_fields(fields)
+        if selected is None:
+            selected = service.SELECTABLE_FIELDS if id_list is not None else service.LISTING_FIELDS
+        return JSONResponse(jsonable_encoder(service.select_profiles(selected, id_list)))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/stream")
+async def stream_profiles(
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+    last_event_id_param: Optional[str] = Query(None, alias="last_event_id", description="Alternativa a la cabecera Last-Event-ID")
+):
+    """
+    Server-sent events con los perfiles creados, modificados o eliminados.
+    EventSource se reconecta solo y envía Last-Event-ID para recibir lo que se perdió;
+    si ya no se puede reconstruir llega un evento "reset" y hay que recargar el directorio.
+    """
+    if not profile_stream.running:
+        raise HTTPException(status_code=503, detail="El stream de perfiles no está disponible")
+    raw_event_id = last_event_id or last_event_id_param
+    try:
+        resume_from = int(raw_event_id) if raw_event_id else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Last-Event-ID no válido")
+    try:
+        queue, position = await profile_stream.subscribe()
+    except StreamFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+
+    async def events():
+        try:
+            sent_id = position
+            if resume_from is None:
+                # La posición inicial sirve de Last-Event-ID si el navegador se reconecta
+                yield f"retry: 3000\nid: {position}\nevent: ready\ndata: {{}}\n\n".encode("utf-8")
+            else:
+                yield b"retry: 3000\nevent: ready\ndata: {}\n\n"
+                replayed = await run_in_threadpool(replay_events, resume_from, position)
+                if replayed is None:
+                    # El cliente recarga el directorio y sigue desde la posición actual
+                    yield f"id: {position}\n".encode("utf-8") + RESET_MESSAGE
+                else:
+                    for message in replayed:
+                        yield message
+                sent_id = max(position, resume_from)
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield HEARTBEAT_MESSAGE
+                    continue
+                if item is None:
+                    # Cierre del servidor o cliente demasiado lento: el navegador se reconecta
+                    return
+                event_id, message = item
+                if event_id > sent_id:
+                    sent_id = event_id
+                    yield message
+        finally:
+            profile_stream.unsubscribe(queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/{profile_id}", response_model=ProfileResponse, dependencies=[Depends(query_budget(1))])
 async def get_profile(
     profile_id: str,
+    response: Response,
+    fields: Optional[str] = Query(None, description="Campos separados por comas a incluir en la respuesta"),
     service: ProfileService = Depends(ProfileService)
 ):
     """
     Ruta pública para obtener los detalles de un perfil específico
     """
+    if fields is not None:
+        try:
+            selected = service.parse_fields(fields)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        rows = service.select_profiles(selected, [profile_id])
+        if not rows:
+            raise HTTPException(status_code=404, detail=f"No se encontró el perfil con ID {profile_id}")
+        return JSONResponse(jsonable_encoder(rows[0]))
+
+    # Caché por worker, invalidada por el bus cuando el perfil cambia en cualquier worker
+    profile = profile_cache.get(profile_id) if CACHE_ENABLED else None
+    if profile is None:
+        try:
+            profile = ProfileResponse.model_validate(service.get_profile_by_id(profile_id))
+        except ValueError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        if CACHE_ENABLED:
+            profile_cache.set(profile_id, profile)
+    response.headers["ETag"] = _etag(profile.version)
+    return profile
+
+@router.patch("/{profile_id}", response_model=ProfileResponse, dependencies=[Depends(query_budget(3))])
+async def patch_profile(
+    profile_id: str,
+    data: ProfilePatch,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    service: ProfileService = Depends(ProfileService),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Ruta protegida para modificar solo algunos campos del perfil (superusuario o dueño).
+    Con If-Match solo se aplica si el perfil sigue en esa versión.
+    """
+    update_data = data.model_dump(exclude_unset=True)
+    if not update_data:
+        raise HTTPException(status_code=400, detail="No hay campos para actualizar")
+    if "name" in update_data and update_data["name"] is None:
+        raise HTTPException(status_code=400, detail="El nombre no puede estar vacío")
+
     try:
-        return service.get_profile_by_id(profile_id)
+        profile = service.patch_profile(
+            profile_id,
+            update_data,
+            expected_version=_parse_if_match(if_match),
+            owner_id=None if current_user.is_superuser else current_user.id
+        )
+    except VersionConflictError as e:
+        raise HTTPException(status_code=412, detail=str(e))
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    response.headers["ETag"] = _etag(profile.version)
+    return profile
 
-@router.put("/me", response_model=ProfileResponse)
+@router.put("/me", response_model=ProfileResponse, dependencies=[Depends(query_budget(5))])
 async def update_my_profile(
     name: str = Form(...),
     description: Optional[str] = Form(None),
@@ -62,18 +239,13 @@ async def update_my_profile(
     image_1: Optional[UploadFile] = File(None),
     image_2: Optional[UploadFile] = File(None),
     image_3: Optional[UploadFile] = File(None),
-    current_user: User = Depends(get_current_user),
+    profile: Profile = Depends(get_current_profile),
     service: ProfileService = Depends(ProfileService)
 ):
     """
     Ruta protegida para actualizar el perfil propio
     """
     try:
-        # Obtener el perfil existente
-        profile = service.db.query(Profile).filter(Profile.user_id == current_user.id).first()
-        if not profile:
-            raise ValueError(f"No se encontró el perfil para el usuario {current_user.username}")
-        
         # Crear objeto ProfileUpdate con los datos del formulario
         profile_data = ProfileUpdate(
             name=name,
@@ -82,23 +254,56 @@ async def update_my_profile(
             facebook_link=facebook_link
         )
         
-        # Procesar las imágenes si se proporcionaron
-        if cover_image:
-            profile_data.cover_image = await service.process_image(cover_image)
-        if image_1:
-            profile_data.image_1 = await service.process_image(image_1)
-        if image_2:
-            profile_data.image_2 = await service.process_image(image_2)
-        if image_3:
-            profile_data.image_3 = await service.process_image(image_3)
+        # Guardar las imágenes si se proporcionaron
+        await service.store_images(profile_data, {
+            "cover_image": cover_image,
+            "image_1": image_1,
+            "image_2": image_2,
+            "image_3": image_3,
+        })
             
         # Actualizar el perfil
         result = await service.update_profile(profile.id, profile_data)
         return result
+    except ImageTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except VersionConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/me/images/{image_type}/upload-url", response_model=ImageUploadUrlResponse)
+async def create_my_image_upload(
+    image_type: str,
+    content_type: str,
+    profile: Profile = Depends(get_current_profile),
+    service: ProfileService = Depends(ProfileService)
+):
+    """
+    Ruta protegida que entrega una URL firmada para subir una imagen del perfil
+    directamente al almacenamiento, sin pasar los bytes por la API
+    """
+    try:
+        return service.create_image_upload(profile.id, image_type, content_type)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.put("/me/images/{image_type}", response_model=ProfileResponse)
+async def confirm_my_image_upload(
+    image_type: str,
+    upload: ImageUploadConfirm,
+    profile: Profile = Depends(get_current_profile),
+    service: ProfileService = Depends(ProfileService)
+):
+    """
+    Ruta protegida para asociar al perfil una imagen ya subida con la URL firmada
+    """
+    try:
+        return await service.confirm_image_upload(profile.id, image_type, upload.key, upload.upload_token)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-@router.put("/{profile_id}", response_model=ProfileResponse)
+@router.put("/{profile_id}", response_model=ProfileResponse, dependencies=[Depends(query_budget(4))])
 async def update_profile(
     profile_id: str,
     name: str = Form(...),
@@ -136,18 +341,20 @@ async def update_profile(
             facebook_link=facebook_link
         )
         
-        # Procesar las imágenes si se proporcionaron
-        if cover_image:
-            profile_data.cover_image = await service.process_image(cover_image)
-        if image_1:
-            profile_data.image_1 = await service.process_image(image_1)
-        if image_2:
-            profile_data.image_2 = await service.process_image(image_2)
-        if image_3:
-            profile_data.image_3 = await service.process_image(image_3)
+        # Guardar las imágenes si se proporcionaron
+        await service.store_images(profile_data, {
+            "cover_image": cover_image,
+            "image_1": image_1,
+            "image_2": image_2,
+            "image_3": image_3,
+        })
             
         result = await service.update_profile(profile_id, profile_data)
         return result
+    except ImageTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except VersionConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
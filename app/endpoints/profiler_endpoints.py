@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import PlainTextResponse
+from app.models.user_model import User
+from app.dependencies.auth_dependencies import check_superuser
+from app.services.profiler_service import list_profiles, read_profile
+
+router = APIRouter(prefix="/profiler", tags=["profiler"])
+
+@router.get("/samples")
+async def get_profiles(
+    _: User = Depends(check_superuser)
+):
+    """
+    Perfiles guardados, del más reciente al más antiguo (solo superusuario)
+    """
+    return list_profiles()
+
+@router.get("/samples/{profile_id}", response_class=PlainTextResponse)
+async def get_profile_samples(
+    profile_id: str,
+    _: User = Depends(check_superuser)
+):
+    """
+    Pilas en formato collapsed, listas para flamegraph.pl o speedscope (solo superusuario)
+    """
+    try:
+        return read_profile(profile_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
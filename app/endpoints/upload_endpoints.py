@@ -0,0 +1,55 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import RedirectResponse
+from starlette.concurrency import run_in_threadpool
+from app.services.image_service import ImageService
+from app.services.storage_service import get_storage, verify_signature
+import tempfile
+import time
+
+router = APIRouter(prefix="/uploads", tags=["uploads"])
+
+# Router sin prefijo /api: sirve /uploads/{key} cuando las imágenes no están en disco local
+public_router = APIRouter(tags=["uploads"])
+
+@router.put("/{key:path}")
+async def upload_with_signature(
+    key: str,
+    expires: int,
+    signature: str,
+    request: Request
+):
+    """
+    Destino de las URLs de subida firmadas del almacenamiento local
+    """
+    if expires < time.time() or not verify_signature(f"PUT:{key}:{expires}", signature):
+        raise HTTPException(status_code=403, detail="Firma de subida no válida o expirada")
+
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type not in ImageService.CONTENT_TYPES:
+        raise HTTPException(status_code=400, detail="Tipo de archivo no permitido")
+
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > ImageService.MAX_SIZE:
+        raise HTTPException(status_code=413, detail="La imagen supera el tamaño máximo permitido")
+
+    with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as buffer:
+        received = 0
+        async for chunk in request.stream():
+            # Comprobar el formato real con los primeros bytes
+            if received == 0 and chunk and ImageService.sniff_extension(chunk) != ImageService.CONTENT_TYPES[content_type]:
+                raise HTTPException(status_code=400, detail="El contenido no coincide con el tipo de imagen indicado")
+            received += len(chunk)
+            if received > ImageService.MAX_SIZE:
+                raise HTTPException(status_code=413, detail="La imagen supera el tamaño máximo permitido")
+            buffer.write(chunk)
+        buffer.seek(0)
+        await run_in_threadpool(get_storage().save, key, buffer, content_type)
+
+    return {"key": key, "size": received}
+
+@public_router.get("/uploads/{key:path}", include_in_schema=False)
+async def download_redirect(key: str):
+    """
+    Redirige al cliente a una URL firmada para que descargue la imagen directamente
+    """
+    return RedirectResponse(get_storage().presigned_download_url(key), status_code=307)
@@ -1,35 +1,81 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import EmailStr
+from starlette.concurrency import run_in_threadpool
+from typing import Optional
 from app.services.user_service import UserService
-from app.schemas.user_schema import UserCreate,SuperUserCreate, UserResponse,AllUsersResponse, UserUpdate, ChangePassword
+from app.schemas.user_schema import UserCreate,SuperUserCreate, UserResponse,AllUsersResponse, UserUpdate, ChangePassword, BulkDeleteRequest, BulkDeleteResponse, DeleteJobResponse, AvailabilityResponse
 from app.models.user_model import User
+from app.middleware.query_budget_middleware import query_budget
 from app.dependencies.auth_dependencies import get_current_user, check_superuser, check_superuser_or_owner
 
 
 router = APIRouter(prefix="/users", tags=["users"])
 
-@router.post("/create_superuser", response_model=UserResponse)
+@router.post("/create_superuser", response_model=UserResponse, dependencies=[Depends(query_budget(5))])
 async def create_superuser(
     user: SuperUserCreate,
     service: UserService = Depends(UserService)
 ):
     try:
-        return service.create_superuser(user)
+        return await run_in_threadpool(service.create_superuser, user)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 
-@router.post("/", response_model=UserResponse)
+@router.post("/", response_model=UserResponse, dependencies=[Depends(query_budget(5))])
 async def create_user(
     user: UserCreate,
     service: UserService = Depends(UserService),
     _: User = Depends(check_superuser)  # Solo superusuario puede crear usuarios
 ):
     try:
-        return service.create_user(user)
+        return await run_in_threadpool(service.create_user, user)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@router.post("/bulk-delete", response_model=BulkDeleteResponse, status_code=202)
+async def bulk_delete_users(
+    data: BulkDeleteRequest,
+    service: UserService = Depends(UserService),
+    current_user: User = Depends(check_superuser)  # Solo superusuario puede eliminar usuarios
+):
+    """
+    Elimina varios usuarios a la vez; las imágenes se borran en segundo plano
+    """
+    try:
+        return service.delete_users(data.user_ids, current_user.id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/bulk-delete/{job_id}", response_model=DeleteJobResponse)
+async def get_bulk_delete_job(
+    job_id: str,
+    service: UserService = Depends(UserService),
+    _: User = Depends(check_superuser)
+):
+    """
+    Estado de la limpieza de imágenes de un borrado masivo
+    """
+    try:
+        return service.get_delete_job(job_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@router.get("/availability", response_model=AvailabilityResponse, dependencies=[Depends(query_budget(2))])
+async def check_availability(
+    username: Optional[str] = Query(None, min_length=3, max_length=50),
+    email: Optional[EmailStr] = Query(None),
+    service: UserService = Depends(UserService)
+):
+    """
+    Ruta pública para los formularios de registro: indica si el username y/o el
+    email están libres. La mayoría de valores libres se responden sin consultar la base.
+    """
+    if username is None and email is None:
+        raise HTTPException(status_code=400, detail="Indica username, email o ambos")
+    return service.check_availability(username, email)
+
 @router.get("/{user_id}", response_model=UserResponse)
 async def get_user(
     
@@ -53,7 +99,8 @@ async def get_all_users(
 ):
     return service.get_all_users()
 
-@router.put("/{user_id}", response_model=UserResponse)
+# 4 consultas, más la revocación de tokens y su lectura si cambia el username o el email
+@router.put("/{user_id}", response_model=UserResponse, dependencies=[Depends(query_budget(6))])
 async def update_user(
     user_id: str,
     user_data: UserUpdate,
@@ -75,7 +122,7 @@ async def change_password(
     # Verificar permisos después de tener el usuario
     await check_superuser_or_owner(current_user, user_id)
     try:
-        return service.change_password(user_id, password_data)
+        return await run_in_threadpool(service.change_password, user_id, password_data)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -0,0 +1,90 @@
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.database.connection import SessionLocal
+from app.database.statements import USER_IS_SUPERUSER
+from app.dependencies.auth_dependencies import get_token_payload
+from app.services.profiler_service import StackSampler, matches_rule, new_profile_id, profiled_request, save_profile
+from typing import Optional
+import sys
+import logging
+
+logger = logging.getLogger("app")
+
+
+def _bearer_token(scope: Scope) -> Optional[str]:
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() != "bearer" or not token:
+                return None
+            return token
+    return None
+
+
+def _is_superuser(user_id: Optional[str]) -> bool:
+    if not user_id:
+        return False
+    db = SessionLocal()
+    try:
+        return bool(db.execute(USER_IS_SUPERUSER, {"user_id": user_id}).scalar())
+    finally:
+        db.close()
+
+
+async def _is_superuser_token(scope: Scope) -> bool:
+    """
+    Misma verificación que get_current_user (firma, caducidad y revocaciones);
+    además se comprueba en la base que el usuario sigue siendo superusuario
+    """
+    token = _bearer_token(scope)
+    if token is None:
+        return False
+    try:
+        payload = await get_token_payload(token)
+    except HTTPException:
+        return False
+    return await run_in_threadpool(_is_superuser, payload.get("id"))
+
+
+class ProfilingMiddleware:
+    """
+    Perfila una petición bajo demanda: con la cabecera X-Profile: 1 y un token
+    de superusuario, o por las reglas PROFILE_SAMPLE_RULES (ruta y porcentaje).
+    El resultado se guarda en formato collapsed y su id va en X-Profile-Id.
+    Solo se muestrean los hilos mientras ejecutan esta petición (ver StackSampler).
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def _should_profile(self, scope: Scope) -> bool:
+        if (b"x-profile", b"1") in scope["headers"]:
+            if await _is_superuser_token(scope):
+                return True
+            logger.warning("Se pidió perfilar una petición sin token de superusuario")
+        return matches_rule(scope["method"], scope["path"])
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not await self._should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = new_profile_id()
+        sampler = StackSampler(root=f"{scope['method']} {scope['path']}")
+
+        async def tagging_send(message: Message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-id", profile_id.encode("latin-1")))
+                message["headers"] = headers
+            await send(message)
+
+        token = profiled_request.set(sampler)
+        sampler.start(request_frame=sys._getframe())
+        try:
+            await self.app(scope, receive, tagging_send)
+        finally:
+            sampler.stop()
+            profiled_request.reset(token)
+            await run_in_threadpool(save_profile, profile_id, sampler)
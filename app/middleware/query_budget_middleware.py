@@ -0,0 +1,96 @@
+from contextvars import ContextVar
+from dataclasses import dataclass
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from dotenv import load_dotenv
+from typing import Optional
+import os
+import logging
+
+logger = logging.getLogger("app")
+
+env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
+load_dotenv(env_path)
+
+# Los presupuestos se comprueban en tests/test_query_budgets.py; el middleware
+# solo ayuda en desarrollo a ver cuántas consultas hace cada petición.
+# off: no se cuentan las consultas
+# warn: cabecera X-Query-Count y aviso en el log si una ruta supera su presupuesto
+# strict: además lanza un error
+QUERY_BUDGET_MODE = os.getenv("QUERY_BUDGET_MODE", "off")
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@dataclass
+class QueryStats:
+    count: int = 0
+    budget: Optional[int] = None
+    status: int = 0
+
+
+# El objeto se comparte con los hilos del threadpool (copian el contexto, no el valor)
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.count += 1
+
+
+def query_budget(limit: int):
+    """
+    Dependencia que declara el máximo de consultas SQL de una ruta:
+    @router.get(..., dependencies=[Depends(query_budget(2))])
+    Las pruebas leen el límite de la dependencia (set_budget.limit).
+    """
+    def set_budget():
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.budget = limit
+    set_budget.limit = limit
+    return set_budget
+
+
+class QueryBudgetMiddleware:
+    """
+    Cuenta las consultas SQL de cada petición y las compara con el presupuesto
+    declarado por la ruta con query_budget()
+    """
+
+    def __init__(self, app: ASGIApp, mode: str = QUERY_BUDGET_MODE):
+        self.app = app
+        self.mode = mode
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or self.mode == "off":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = _current_stats.set(stats)
+
+        async def counting_send(message: Message):
+            if message["type"] == "http.response.start":
+                stats.status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-query-count", str(stats.count).encode("latin-1")))
+                message["headers"] = headers
+            await send(message)
+
+        try:
+            await self.app(scope, receive, counting_send)
+        finally:
+            _current_stats.reset(token)
+
+        # Los caminos de error pueden hacer consultas extra para explicar el fallo
+        if stats.budget is not None and stats.status < 400 and stats.count > stats.budget:
+            detail = f"{scope['method']} {scope['path']}: {stats.count} consultas (presupuesto {stats.budget})"
+            if self.mode == "strict":
+                raise QueryBudgetExceeded(detail)
+            logger.warning(f"Presupuesto de consultas superado: {detail}")
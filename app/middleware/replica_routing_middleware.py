@@ -0,0 +1,103 @@
+from http.cookies import SimpleCookie
+from jose import jwt
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.database.connection import db_router
+from app.services.auth_service import SECRET_KEY
+import hashlib
+import hmac
+import math
+import time
+
+# Marca "leer del primario hasta": cookie para los navegadores del mismo sitio y
+# cabecera para el resto (el frontend la guarda y la reenvía en sus peticiones)
+PRIMARY_COOKIE = "db_primary_until"
+PRIMARY_HEADER = "x-db-primary-until"
+
+
+def _sign(until: str) -> str:
+    return hmac.new(SECRET_KEY.encode(), f"primary:{until}".encode(), hashlib.sha256).hexdigest()[:32]
+
+
+def make_primary_marker(until: float) -> str:
+    """
+    Marca firmada con el instante (ms) hasta el que el cliente debe leer del primario
+    """
+    value = str(int(until * 1000))
+    return f"{value}.{_sign(value)}"
+
+
+def primary_marker_valid(marker: str) -> bool:
+    value, _, signature = marker.partition(".")
+    if not value.isdigit() or not hmac.compare_digest(_sign(value), signature):
+        return False
+    return int(value) / 1000 > time.time()
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Marca las peticiones GET/HEAD para que lean de una réplica, salvo que el
+    cliente haya escrito hace poco o su token sea recién emitido (lectura de
+    sus propias escrituras). Tras una escritura correcta entrega al cliente una
+    marca firmada (cookie y cabecera X-DB-Primary-Until) que se comprueba aquí;
+    como va con el cliente, funciona aunque la siguiente lectura llegue a otro worker.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    @staticmethod
+    def _token_claims(scope: Scope) -> dict:
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                scheme, _, token = value.decode("latin-1").partition(" ")
+                if scheme.lower() != "bearer" or not token:
+                    return {}
+                try:
+                    # Solo se usa para enrutar; la verificación la hace get_current_user
+                    return jwt.get_unverified_claims(token)
+                except Exception:
+                    return {}
+        return {}
+
+    @staticmethod
+    def _recent_write(scope: Scope) -> bool:
+        for name, value in scope["headers"]:
+            if name == PRIMARY_HEADER.encode() and primary_marker_valid(value.decode("latin-1")):
+                return True
+            if name == b"cookie":
+                cookies = SimpleCookie()
+                try:
+                    cookies.load(value.decode("latin-1"))
+                except Exception:
+                    continue
+                morsel = cookies.get(PRIMARY_COOKIE)
+                if morsel is not None and primary_marker_valid(morsel.value):
+                    return True
+        return False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not db_router.replicas:
+            await self.app(scope, receive, send)
+            return
+
+        if scope["method"] in ("GET", "HEAD"):
+            issued_at = self._token_claims(scope).get("iat") or 0
+            fresh_token = time.time() - issued_at < db_router.sticky_seconds
+            scope.setdefault("state", {})["read_replica"] = not (fresh_token or self._recent_write(scope))
+            await self.app(scope, receive, send)
+            return
+
+        async def tracking_send(message: Message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                marker = make_primary_marker(time.time() + db_router.sticky_seconds).encode("latin-1")
+                cookie = (
+                    f"{PRIMARY_COOKIE}={marker.decode('latin-1')}; Max-Age={math.ceil(db_router.sticky_seconds)}; "
+                    "Path=/; HttpOnly; SameSite=Lax"
+                )
+                headers = list(message.get("headers", []))
+                headers.append((PRIMARY_HEADER.encode(), marker))
+                headers.append((b"set-cookie", cookie.encode("latin-1")))
+                message["headers"] = headers
+            await send(message)
+
+        await self.app(scope, receive, tracking_send)
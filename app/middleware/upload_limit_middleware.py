@@ -0,0 +1,66 @@
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.services.image_service import ImageService
+
+# Cuatro imágenes de perfil más los campos de texto del formulario
+MAX_REQUEST_SIZE = 4 * ImageService.MAX_SIZE + 1024 * 1024
+
+class UploadLimitMiddleware:
+    """
+    Rechaza peticiones demasiado grandes antes de que se procese el cuerpo:
+    primero por Content-Length y después contando los bytes mientras llegan.
+    """
+
+    def __init__(self, app: ASGIApp, max_size: int = MAX_REQUEST_SIZE):
+        self.app = app
+        self.max_size = max_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] in ("GET", "HEAD", "OPTIONS"):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length")
+        if content_length is not None:
+            try:
+                too_large = int(content_length) > self.max_size
+            except ValueError:
+                too_large = True
+            if too_large:
+                await self._reject(scope, receive, send)
+                return
+
+        received = 0
+        response_started = False
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_size:
+                    raise HTTPException(status_code=413, detail="La petición supera el tamaño máximo permitido")
+            return message
+
+        async def tracking_send(message: Message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except HTTPException as e:
+            if e.status_code != 413 or response_started:
+                raise
+            await self._reject(scope, receive, send)
+
+    async def _reject(self, scope: Scope, receive: Receive, send: Send):
+        response = JSONResponse(
+            status_code=413,
+            content={"detail": "La petición supera el tamaño máximo permitido"},
+            headers={"Connection": "close"}
+        )
+        await response(scope, receive, send)
@@ -1,10 +1,20 @@
 from app.models.base_model import Base
 from app.models.user_model import User
 from app.models.profile_model import Profile
+from app.models.image_job_model import ImageJob
+from app.models.cache_invalidation_model import CacheInvalidation
+from app.models.outbox_event_model import OutboxEvent, OutboxCheckpoint, OutboxFailure
+from app.models.token_revocation_model import TokenRevocation
 
 # Esta lista es opcional, pero útil para referencia
 __all__ = [
     'Base',   
     'User',
     'Profile',
+    'ImageJob',
+    'CacheInvalidation',
+    'OutboxEvent',
+    'OutboxCheckpoint',
+    'OutboxFailure',
+    'TokenRevocation',
 ] 
\ No newline at end of file
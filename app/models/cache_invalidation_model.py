@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy.sql import func
+from app.models.base_model import Base
+
+class CacheInvalidation(Base):
+    """
+    Eventos de invalidación de caché para bases sin LISTEN/NOTIFY (SQLite, MySQL).
+    Usa un id autoincremental para que cada worker lea solo lo nuevo.
+    """
+    __tablename__ = "cache_invalidations"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    entity = Column(String(50), nullable=False)
+    entity_id = Column(String(32), nullable=False)
+    origin = Column(String(32), nullable=False)
+    created_at = Column(DateTime, server_default=func.now(), index=True)
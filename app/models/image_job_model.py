@@ -0,0 +1,20 @@
+from sqlalchemy import Column, String, Integer, JSON
+from app.models.base_model import BaseModel
+
+class ImageJob(BaseModel):
+    __tablename__ = "image_jobs"
+
+    # Tipo de trabajo (process: optimizar una imagen, delete: borrar imágenes)
+    # y estado: pending, processing, done, failed
+    kind = Column(String(20), nullable=False, default="process")
+    status = Column(String(20), nullable=False, default="pending", index=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(String(500), nullable=True)
+
+    # Imagen a procesar
+    profile_id = Column(String(32), nullable=True, index=True)
+    field = Column(String(20), nullable=True)
+    source_key = Column(String(255), nullable=True)
+
+    # Datos extra del trabajo, p. ej. {"keys": [...]} para los trabajos delete
+    payload = Column(JSON, nullable=True)
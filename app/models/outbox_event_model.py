@@ -0,0 +1,53 @@
+from sqlalchemy import Column, Integer, String, DateTime, JSON
+from sqlalchemy.sql import func
+from app.models.base_model import Base
+
+class OutboxEvent(Base):
+    """
+    Cambios de usuarios y perfiles, escritos en la misma transacción que el cambio.
+    El id autoincremental da el orden de entrega a los suscriptores.
+    """
+    __tablename__ = "outbox_events"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    topic = Column(String(50), nullable=False)
+    entity_id = Column(String(32), nullable=False)
+    # created, updated, deleted
+    action = Column(String(20), nullable=False)
+    # Datos extra, p. ej. {"fields": ["name", "cover_image"]}
+    payload = Column(JSON, nullable=True)
+    created_at = Column(DateTime, server_default=func.now(), index=True)
+
+
+class OutboxCheckpoint(Base):
+    """
+    Último evento entregado a cada consumidor del outbox
+    """
+    __tablename__ = "outbox_checkpoints"
+
+    consumer = Column(String(50), primary_key=True)
+    last_id = Column(Integer, nullable=False, default=0)
+    # Ids anteriores a last_id que faltaban al avanzar: {"id": epoch en que se saltó}.
+    # Se vuelven a leer hasta que aparecen o pasa OUTBOX_SKIPPED_HORIZON
+    skipped_ids = Column(JSON, nullable=True)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+class OutboxFailure(Base):
+    """
+    Eventos que un consumidor no pudo entregar tras OUTBOX_MAX_ATTEMPTS intentos.
+    Se guardan aquí en lugar de perderse; python -m app.commands.outbox_failures
+    los muestra y los vuelve a encolar.
+    """
+    __tablename__ = "outbox_failures"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    consumer = Column(String(50), nullable=False, index=True)
+    event_id = Column(Integer, nullable=False)
+    topic = Column(String(50), nullable=False)
+    entity_id = Column(String(32), nullable=False)
+    action = Column(String(20), nullable=False)
+    payload = Column(JSON, nullable=True)
+    attempts = Column(Integer, nullable=False)
+    error = Column(String(500), nullable=True)
+    failed_at = Column(DateTime, server_default=func.now())
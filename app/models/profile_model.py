@@ -1,5 +1,5 @@
-from sqlalchemy import Column, String, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, String, ForeignKey, JSON, Integer, Index, func
+from sqlalchemy.orm import column_property, relationship
 from app.models.base_model import BaseModel
 
 class Profile(BaseModel):
@@ -17,6 +17,32 @@ class Profile(BaseModel):
     whatsapp_link = Column(String(255), nullable=True)
     facebook_link = Column(String(255), nullable=True)
     
+    # Estado del procesamiento de cada imagen: {"cover_image": "pending" | "processing" | "ready" | "failed"}
+    image_status = Column(JSON, nullable=True)
+
+    # Dimensiones y miniatura de cada imagen, calculadas al procesarla:
+    # {"cover_image": {"width": 1280, "height": 720, "placeholder": "data:image/webp;base64,..."}}
+    image_meta = Column(JSON, nullable=True)
+    
+    # Versión del perfil para la concurrencia optimista (ETag / If-Match)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+
     # Relación con el usuario
-    user_id = Column(String(32), ForeignKey('users.id'), unique=True)
-    user = relationship("User", back_populates="profile") 
\ No newline at end of file
+    user_id = Column(String(32), ForeignKey('users.id', ondelete='CASCADE'), unique=True)
+    user = relationship("User", back_populates="profile")
+
+    # El ORM incrementa la versión en cada UPDATE y falla si otra petición la cambió antes;
+    # updated_at vuelve con el propio UPDATE (RETURNING) en lugar de un SELECT posterior
+    __mapper_args__ = {"version_id_col": version, "eager_defaults": True}
+
+
+# Metadatos solo de la portada, para el listado (se leen de la base sin el resto de image_meta)
+Profile.cover_meta = column_property(Profile.image_meta["cover_image"].label("cover_meta"), deferred=True)
+
+# Última actividad del perfil: updated_at es nulo hasta la primera edición
+last_activity = func.coalesce(Profile.updated_at, Profile.created_at)
+
+# Un índice compuesto por cada orden del listado público (ver ProfileService.SORTS)
+Index("ix_profiles_created_at_id", Profile.created_at, Profile.id)
+Index("ix_profiles_last_activity_id", last_activity, Profile.id)
+Index("ix_profiles_name_id", Profile.name, Profile.id)
@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, String, DateTime, Float
+from sqlalchemy.sql import func
+from app.models.base_model import Base
+
+class TokenRevocation(Base):
+    """
+    Tokens revocados: uno concreto (kind="token", value=jti) o todos los de un
+    usuario emitidos antes de not_before (kind="user", value=id del usuario).
+    El id autoincremental permite a cada worker leer solo lo nuevo.
+    """
+    __tablename__ = "token_revocations"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    kind = Column(String(10), nullable=False)
+    value = Column(String(32), nullable=False)
+    # Marca de tiempo (segundos epoch) antes de la cual los tokens del usuario no valen
+    not_before = Column(Float, nullable=True)
+    # A partir de aquí ningún token afectado sigue vigente y la fila se puede borrar
+    expires_at = Column(Float, nullable=False, index=True)
+    created_at = Column(DateTime, server_default=func.now())
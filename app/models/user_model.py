@@ -10,7 +10,11 @@ class User(BaseModel):
     is_superuser = Column(Boolean, default=False)
     
     # Nueva relación con el perfil
-    profile = relationship("Profile", back_populates="user", uselist=False)
+    # El perfil se borra con el usuario (también en la base de datos: ondelete CASCADE)
+    profile = relationship("Profile", back_populates="user", uselist=False, cascade="all, delete-orphan", passive_deletes=True)
+
+    # updated_at vuelve con el propio UPDATE (RETURNING) en lugar de un SELECT posterior
+    __mapper_args__ = {"eager_defaults": True}
     
     
    
@@ -1,5 +1,6 @@
 from app.schemas.base_schema import BaseConfigModel
 from pydantic import Field
+from typing import Optional
 
 class AuthResponse(BaseConfigModel):
     id: str = Field(..., example="a1b2c3d4e5f6...")
@@ -9,4 +10,13 @@ class AuthResponse(BaseConfigModel):
     
 class AuthLogin(BaseConfigModel):
     username_or_email: str = Field(..., example="admin")
-    password: str =Field(..., min_length=6, example="secret123")
\ No newline at end of file
+    password: str =Field(..., min_length=6, example="secret123")
+
+class TokenPrincipal(BaseConfigModel):
+    """
+    Usuario autenticado según los datos del token (sin consultar la base)
+    """
+    id: str
+    username: str
+    email: Optional[str] = None
+    is_superuser: bool = False
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, HttpUrl
-from typing import Optional
+from pydantic import BaseModel, HttpUrl, Field
+from typing import Dict, Optional
 from datetime import datetime
 
 class ProfileBase(BaseModel):
@@ -12,23 +12,62 @@ class ProfileBase(BaseModel):
     whatsapp_link: Optional[str] = None
     facebook_link: Optional[str] = None
 
+class ImageMeta(BaseModel):
+    # Dimensiones de la imagen guardada y miniatura WebP en línea (data URI)
+    width: int
+    height: int
+    placeholder: str
+
 class AllProfilesResponse(BaseModel):
     id: str
     name: str
     cover_image: Optional[str] = None
+    cover_meta: Optional[ImageMeta] = None
     
 
+class ProfileListingResponse(BaseModel):
+    items: list
+    total: int
+    facets: Optional[Dict[str, int]] = None  # Cuántos resultados tienen portada, WhatsApp, Facebook (solo con ?facets=true)
+    limit: int
+    offset: int
+
 class ProfileCreate(ProfileBase):
     pass
 
 class ProfileUpdate(ProfileBase):
     name: Optional[str] = None
 
+class ProfilePatch(BaseModel):
+    # Solo se actualizan los campos enviados; las imágenes tienen sus propias rutas
+    name: Optional[str] = Field(None, min_length=1, max_length=100)
+    description: Optional[str] = Field(None, max_length=500)
+    whatsapp_link: Optional[str] = Field(None, max_length=255)
+    facebook_link: Optional[str] = Field(None, max_length=255)
+
+    class Config:
+        extra = "forbid"
+
 class ProfileResponse(ProfileBase):
     id: str
     user_id: str
+    image_status: Optional[Dict[str, str]] = None
+    image_meta: Optional[Dict[str, ImageMeta]] = None
+    version: Optional[int] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
 
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True 
+
+class ImageUploadUrlResponse(BaseModel):
+    key: str
+    upload_token: str
+    url: str
+    method: str
+    headers: Dict[str, str] = {}
+    expires_in: int
+
+class ImageUploadConfirm(BaseModel):
+    key: str
+    upload_token: str
@@ -1,6 +1,6 @@
 from pydantic import  EmailStr, Field
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 from app.schemas.base_schema import BaseConfigModel
 
 # Esquema para crear un usuario (Request)
@@ -34,9 +34,26 @@ class UserUpdate(BaseConfigModel):
     username: str | None = None 
     email: EmailStr | None = None
     
+class AvailabilityResponse(BaseConfigModel):
+    # True si está libre; None si no se preguntó por ese campo
+    username: Optional[bool] = Field(None, example=True)
+    email: Optional[bool] = Field(None, example=False)
+
 class ChangePassword(BaseConfigModel):
     old_password: str = Field(..., example="secret123")
     new_password: str = Field(..., example="secret1234")
 
+class BulkDeleteRequest(BaseConfigModel):
+    user_ids: List[str] = Field(..., min_length=1, example=["a1b2c3d4e5f6..."])
 
+class BulkDeleteResponse(BaseConfigModel):
+    deleted: int = Field(..., example=10)
+    job_id: str = Field(..., example="a1b2c3d4e5f6...")  # Trabajo de limpieza de imágenes
+    status: str = Field(..., example="pending")
 
+class DeleteJobResponse(BaseConfigModel):
+    id: str = Field(..., example="a1b2c3d4e5f6...")
+    status: str = Field(..., example="done")  # pending, processing, done, failed
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: Optional[datetime] = None
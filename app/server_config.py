@@ -0,0 +1,95 @@
+"""
+Configuración del servidor de producción (python -m app.commands.serve) y
+tamaño de los recursos de cada worker. El número de workers se decide aquí y
+de él salen las conexiones a la base, los hilos de bcrypt y los de imágenes de
+cada proceso, para que el total no dependa de cuántos workers se arranquen.
+Cualquier valor se puede fijar con su variable de entorno.
+"""
+from dataclasses import dataclass, asdict
+from dotenv import load_dotenv
+from typing import Optional
+import importlib.util
+import os
+
+env_path = os.path.join(os.path.dirname(__file__), '.env')
+load_dotenv(env_path)
+
+
+def available_cpus() -> int:
+    # Núcleos que puede usar este proceso (respeta taskset / cpuset del contenedor)
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+@dataclass
+class ServerConfig:
+    workers: int
+    host: str
+    port: int
+    # Bucle de eventos y parser HTTP de uvicorn
+    loop: str
+    http: str
+    backlog: int
+    keep_alive: int
+    graceful_timeout: int
+    # Peticiones simultáneas por worker antes de responder 503 (0 = sin límite)
+    limit_concurrency: int
+    access_log: bool
+    # Recursos de cada worker
+    db_pool_size: int
+    db_max_overflow: int
+    db_pool_timeout: int
+    password_hash_concurrency: int
+    image_concurrency: int
+    threadpool_size: int
+
+    @classmethod
+    def from_env(cls, workers: Optional[int] = None) -> "ServerConfig":
+        cpus = available_cpus()
+        # WEB_CONCURRENCY es la variable que usan Render, Heroku y gunicorn
+        workers = max(1, workers or _env_int("WEB_CONCURRENCY", cpus))
+        # Conexiones al primario para todo el servidor, repartidas entre los workers
+        db_pool_size = _env_int("DB_POOL_SIZE", max(2, _env_int("DB_MAX_CONNECTIONS", 20) // workers))
+        db_max_overflow = _env_int("DB_POOL_MAX_OVERFLOW", 2)
+        # bcrypt y Pillow liberan el GIL: como mucho un hilo por núcleo entre todos los workers
+        per_worker_cpus = max(1, cpus // workers)
+        password_hash_concurrency = _env_int("PASSWORD_HASH_CONCURRENCY", per_worker_cpus)
+        image_concurrency = _env_int("IMAGE_QUEUE_CONCURRENCY", per_worker_cpus)
+        # Hilos para el código síncrono: los que pueden tener conexión más los de CPU
+        threadpool_size = _env_int(
+            "THREADPOOL_SIZE", max(8, db_pool_size + db_max_overflow + password_hash_concurrency + image_concurrency)
+        )
+        uvloop_installed = importlib.util.find_spec("uvloop") is not None
+        return cls(
+            workers=workers,
+            host=os.getenv("SERVER_HOST", "0.0.0.0"),
+            # PORT es la variable que fija Render
+            port=_env_int("PORT", 8000),
+            loop=os.getenv("SERVER_LOOP", "uvloop" if uvloop_installed else "asyncio"),
+            http=os.getenv("SERVER_HTTP", "httptools"),
+            backlog=_env_int("SERVER_BACKLOG", 2048),
+            # Mayor que el tiempo de inactividad del balanceador (60 s en la mayoría)
+            keep_alive=_env_int("SERVER_KEEP_ALIVE", 75),
+            graceful_timeout=_env_int("SERVER_GRACEFUL_TIMEOUT", 30),
+            limit_concurrency=_env_int("SERVER_LIMIT_CONCURRENCY", 0),
+            access_log=os.getenv("SERVER_ACCESS_LOG", "false").lower() in ("1", "true", "yes"),
+            db_pool_size=db_pool_size,
+            db_max_overflow=db_max_overflow,
+            db_pool_timeout=_env_int("DB_POOL_TIMEOUT", 10),
+            password_hash_concurrency=password_hash_concurrency,
+            image_concurrency=image_concurrency,
+            threadpool_size=threadpool_size,
+        )
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+server_config = ServerConfig.from_env()
@@ -7,7 +7,11 @@ from passlib.context import CryptContext
 from jose import jwt
 from datetime import datetime, timedelta
 from typing import Optional
-from sqlalchemy import or_
+import threading
+import time
+import uuid
+from app.database.statements import USER_BY_LOGIN
+from app.server_config import server_config
 from fastapi.security import OAuth2PasswordRequestForm
 
 
@@ -18,28 +22,66 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt ocupa un núcleo ~0,2 s por llamada: se limitan las simultáneas por worker
+# para que un pico de logins no deje sin CPU al resto de peticiones
+password_hash_slots = threading.BoundedSemaphore(server_config.password_hash_concurrency)
+
+
+def hash_password(password: str) -> str:
+    with password_hash_slots:
+        return pwd_context.hash(password)
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    with password_hash_slots:
+        return pwd_context.verify(plain_password, hashed_password)
+
+
 class AuthService:
     def __init__(self, db: Session = Depends(get_db)):
         self.db = db
 
     def verify_password(self, plain_password: str, hashed_password: str) -> bool:
-        return pwd_context.verify(plain_password, hashed_password)
+        return verify_password(plain_password, hashed_password)
 
     def get_user_by_username_or_email(self, username_or_email: str) -> User | None:
-        return self.db.query(User).filter(
-            or_(
-                User.username == username_or_email,
-                User.email == username_or_email
-            )
-        ).first()
+        return self.db.execute(USER_BY_LOGIN, {"login": username_or_email}).scalars().first()
 
     def create_access_token(self, data: dict) -> str:
         to_encode = data.copy()
-        expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-        to_encode.update({"exp": expire})
+        now = datetime.utcnow()
+        expire = now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        # iat con decimales para compararlo con las revocaciones "emitidos antes de";
+        # jti identifica el token para poder revocarlo
+        to_encode.update({"exp": expire, "iat": time.time(), "jti": uuid.uuid4().hex})
         encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
         return encoded_jwt
 
+    def _token_claims(self, user: User) -> dict:
+        # Datos suficientes para identificar al usuario sin consultar la base en cada petición
+        return {
+            "sub": user.username,
+            "email": user.email,
+            "id": user.id,  # Importante: incluir el ID
+            "su": bool(user.is_superuser)
+        }
+
+    def logout(self, payload: dict, everywhere: bool = False):
+        """
+        Revoca el token actual o, con everywhere, todos los tokens del usuario
+        """
+        # Import local: revocation_service usa las constantes de este módulo
+        from app.services.revocation_service import revocation_list, revoke_token, revoke_user_tokens
+
+        if everywhere:
+            revoke_user_tokens(self.db, payload["id"])
+        elif payload.get("jti"):
+            revoke_token(self.db, payload["jti"], float(payload["exp"]))
+        else:
+            raise ValueError("Este token no se puede revocar individualmente")
+        self.db.commit()
+        revocation_list.after_commit()
+
     def login_oauth(self, form_data: OAuth2PasswordRequestForm) -> AuthResponse:
         """
         Método para autenticación OAuth2 (usado por Swagger/OpenAPI)
@@ -52,13 +94,7 @@ class AuthService:
             raise ValueError("Credenciales incorrectas")
         
         # Asegurarnos de incluir el ID en el token
-        access_token = self.create_access_token(
-            data={
-                "sub": user.username,
-                "email": user.email,
-                "id": user.id  # Importante: incluir el ID
-            }
-        )
+        access_token = self.create_access_token(data=self._token_claims(user))
         
         return AuthResponse(
             id=user.id,
@@ -78,13 +114,7 @@ class AuthService:
         if not self.verify_password(login_data.password, user.password):
             raise ValueError("Credenciales incorrectas")
         
-        access_token = self.create_access_token(
-            data={
-                "sub": user.username,
-                "email": user.email,
-                "id": user.id
-            }
-        )
+        access_token = self.create_access_token(data=self._token_claims(user))
         
         return AuthResponse(
             id=user.id,
@@ -0,0 +1,158 @@
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.database.connection import SessionLocal
+from app.models.user_model import User
+from app.services.invalidation_service import invalidation_bus
+from dotenv import load_dotenv
+from typing import Optional, Set
+import hashlib
+import math
+import os
+import threading
+import time
+import logging
+
+logger = logging.getLogger("app")
+
+env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
+load_dotenv(env_path)
+
+AVAILABILITY_FILTER_ENABLED = os.getenv("AVAILABILITY_FILTER_ENABLED", "true").lower() in ("1", "true", "yes")
+# Proporción de "puede estar ocupado" para valores libres (cada uno cuesta una consulta)
+AVAILABILITY_FILTER_ERROR_RATE = float(os.getenv("AVAILABILITY_FILTER_ERROR_RATE", "0.01"))
+# Se reconstruye cada cierto tiempo para olvidar los nombres y emails que ya no se usan
+AVAILABILITY_FILTER_MAX_AGE = float(os.getenv("AVAILABILITY_FILTER_MAX_AGE", "3600"))
+# Capacidad mínima en valores (dos por usuario); al construir se reserva sitio para el doble de los actuales
+AVAILABILITY_FILTER_MIN_CAPACITY = 20_000
+
+
+class BloomFilter:
+    """
+    Conjunto probabilístico: "no está" es seguro, "puede estar" se equivoca con
+    una probabilidad de error_rate mientras no se superen `capacity` valores.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.size = max(64, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value: str):
+        # Doble hash (Kirsch-Mitzenmacher): k posiciones a partir de un solo digest
+        digest = hashlib.blake2b(value.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, value: str):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class AvailabilityFilter:
+    """
+    Filtro de Bloom con los username y emails en uso, para responder "libre" sin
+    consultar la base. Los usuarios creados o modificados (en este worker o en
+    otros, a través del bus) se apuntan y se añaden en la siguiente comprobación;
+    los borrados y nombres antiguos siguen dentro hasta la próxima reconstrucción,
+    lo que solo cuesta alguna consulta de más.
+    """
+
+    def __init__(self, error_rate: float = AVAILABILITY_FILTER_ERROR_RATE, max_age: float = AVAILABILITY_FILTER_MAX_AGE):
+        self.error_rate = error_rate
+        self.max_age = max_age
+        self._filter: Optional[BloomFilter] = None
+        self._built_at = 0.0
+        self._dirty: Set[str] = set()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return AVAILABILITY_FILTER_ENABLED
+
+    @property
+    def ready(self) -> bool:
+        return self._filter is not None
+
+    def mark_dirty(self, user_id: str):
+        # Se llama desde el bus de invalidación: solo se apunta el usuario
+        self._dirty.add(user_id)
+
+    def build(self):
+        """
+        Construye el filtro con todos los usuarios (calentamiento al arrancar)
+        """
+        if not self.enabled:
+            return
+        db = SessionLocal()
+        try:
+            with self._lock:
+                self._build(db)
+        finally:
+            db.close()
+
+    def _build(self, db: Session):
+        # Lo que cambie durante la lectura queda apuntado y se aplica en la siguiente comprobación
+        self._dirty.clear()
+        rows = db.execute(select(User.username, User.email)).all()
+        bloom = BloomFilter(max(AVAILABILITY_FILTER_MIN_CAPACITY, len(rows) * 4), self.error_rate)
+        for row in rows:
+            bloom.add(f"u:{row.username}")
+            bloom.add(f"e:{row.email}")
+        # Se sustituye de una vez: las comprobaciones en curso usan el anterior
+        self._filter = bloom
+        self._built_at = time.monotonic()
+        logger.info(f"Filtro de disponibilidad construido: {len(rows)} usuarios, {len(bloom.bits)} bytes")
+
+    def _apply_dirty(self, db: Session):
+        dirty = set(self._dirty)
+        self._dirty -= dirty
+        for row in db.execute(select(User.username, User.email).where(User.id.in_(dirty))):
+            self._filter.add(f"u:{row.username}")
+            self._filter.add(f"e:{row.email}")
+
+    def refresh(self, db: Session):
+        """
+        Aplica los cambios pendientes (una consulta) o reconstruye el filtro si ya
+        es antiguo o está lleno. Si otra petición lo está haciendo, no espera.
+        """
+        if not self.enabled:
+            return
+        stale = (
+            self._filter is None
+            or time.monotonic() - self._built_at > self.max_age
+            or self._filter.count > self._filter.capacity
+        )
+        if not stale and not self._dirty:
+            return
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            if stale:
+                self._build(db)
+            elif self._dirty:
+                self._apply_dirty(db)
+        except Exception as e:
+            logger.error(f"Error al actualizar el filtro de disponibilidad: {str(e)}")
+        finally:
+            self._lock.release()
+
+    def might_exist(self, kind: str, value: str) -> bool:
+        """
+        False solo si el valor seguro que no está en uso (kind: "u" o "e").
+        Sin filtro construido siempre hay que consultar la base.
+        """
+        bloom = self._filter
+        return bloom is None or f"{kind}:{value}" in bloom
+
+
+availability_filter = AvailabilityFilter()
+
+# Usuarios creados, renombrados o borrados en cualquier worker
+invalidation_bus.subscribe("user", availability_filter.mark_dirty)
@@ -0,0 +1,255 @@
+from dataclasses import dataclass
+from datetime import datetime
+from sqlalchemy import DateTime, func, insert, select, union
+from sqlalchemy.exc import IntegrityError
+from app.database.connection import engine
+from app.models.outbox_event_model import OutboxEvent
+from app.models.profile_model import Profile
+from app.models.user_model import User
+from app.services.storage_service import get_storage, key_from_path
+from typing import BinaryIO, Iterator, List, Union
+import json
+import time
+import zipfile
+import logging
+
+logger = logging.getLogger("app")
+
+EXPORT_FORMAT = 1
+EXPORT_BATCH_SIZE = 1000
+# Tamaño de los trozos que se envían al cliente
+CHUNK_SIZE = 256 * 1024
+
+IMAGE_FIELDS = ("cover_image", "image_1", "image_2", "image_3")
+IMAGES_PREFIX = "images/"
+
+# Tablas en orden de importación (los perfiles dependen de los usuarios)
+TABLES = (("users.ndjson", User.__table__), ("profiles.ndjson", Profile.__table__))
+
+
+class _StreamSink:
+    """
+    Destino de escritura del zip sin seek: zipfile escribe cada entrada con
+    descriptor de datos y los bytes se van entregando según se generan
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+        self.pending = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        self.pending += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        self.pending = 0
+        return data
+
+
+def _encode_row(row) -> bytes:
+    record = {key: value.isoformat() if isinstance(value, datetime) else value for key, value in row._mapping.items()}
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+def _image_keys_query():
+    # UNION elimina las imágenes repetidas (p. ej. compartidas entre perfiles) en la base
+    image_paths = union(*[
+        select(getattr(Profile, field_name).label("path")).where(getattr(Profile, field_name).isnot(None))
+        for field_name in IMAGE_FIELDS
+    ]).subquery()
+    return select(image_paths.c.path).order_by(image_paths.c.path)
+
+
+def export_directory(batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    """
+    Genera el zip de copia de seguridad a trozos: manifest.json, users.ndjson,
+    profiles.ndjson e images/<clave>. Las filas se leen con un cursor del lado
+    del servidor y las imágenes de una en una, así que la memoria no crece con
+    el tamaño del directorio (solo el índice final del zip, unos cientos de bytes por archivo).
+    """
+    sink = _StreamSink()
+    storage = get_storage()
+    missing = 0
+    with engine.connect() as connection:
+        streaming = connection.execution_options(stream_results=True, yield_per=batch_size)
+        with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            manifest = {
+                "format": EXPORT_FORMAT,
+                "exported_at": datetime.utcnow().isoformat(),
+                "users": connection.execute(select(func.count()).select_from(User)).scalar(),
+                "profiles": connection.execute(select(func.count()).select_from(Profile)).scalar(),
+            }
+            archive.writestr("manifest.json", json.dumps(manifest, indent=2))
+            yield sink.drain()
+
+            for name, table in TABLES:
+                with archive.open(name, "w", force_zip64=True) as entry:
+                    for row in streaming.execute(select(table).order_by(table.c.id)):
+                        entry.write(_encode_row(row))
+                        if sink.pending >= CHUNK_SIZE:
+                            yield sink.drain()
+                yield sink.drain()
+
+            for (image_path,) in streaming.execute(_image_keys_query()):
+                key = key_from_path(image_path)
+                if not key:
+                    continue
+                try:
+                    source = storage.open(key)
+                except (FileNotFoundError, ValueError):
+                    missing += 1
+                    continue
+                # Las imágenes ya van comprimidas (JPEG/PNG/WebP): se guardan tal cual
+                info = zipfile.ZipInfo(f"{IMAGES_PREFIX}{key}", date_time=time.localtime()[:6])
+                info.compress_type = zipfile.ZIP_STORED
+                with source, archive.open(info, "w", force_zip64=True) as entry:
+                    while True:
+                        data = source.read(CHUNK_SIZE)
+                        if not data:
+                            break
+                        entry.write(data)
+                        if sink.pending >= CHUNK_SIZE:
+                            yield sink.drain()
+                yield sink.drain()
+    # Índice central del zip, escrito al cerrar el archivo
+    yield sink.drain()
+    if missing:
+        logger.warning(f"Exportación: {missing} imágenes referenciadas no están en el almacenamiento")
+
+
+@dataclass
+class ImportReport:
+    users: int = 0
+    profiles: int = 0
+    images: int = 0
+    # Ya presentes (importación repetida o reanudada)
+    skipped: int = 0
+    # Filas con username/email repetido o sin usuario, e imágenes no válidas
+    conflicts: int = 0
+    seconds: float = 0.0
+
+
+def _decode_row(table, record: dict) -> dict:
+    row = {}
+    for column in table.c:
+        if column.name not in record:
+            continue
+        value = record[column.name]
+        if value is not None and isinstance(column.type, DateTime):
+            value = datetime.fromisoformat(value)
+        row[column.name] = value
+    return row
+
+
+def _outbox_rows(table, rows: List[dict]) -> List[dict]:
+    topic = "user" if table is User.__table__ else "profile"
+    return [{"topic": topic, "entity_id": row["id"], "action": "created", "payload": None} for row in rows]
+
+
+def _import_batch(table, rows: List[dict], report: ImportReport) -> int:
+    """
+    Inserta las filas que aún no existen. Cada lote se confirma por separado:
+    si la importación se corta, al repetirla se saltan los lotes ya guardados.
+    """
+    ids = [row["id"] for row in rows]
+    with engine.begin() as connection:
+        existing = set(connection.execute(select(table.c.id).where(table.c.id.in_(ids))).scalars())
+        new_rows = [row for row in rows if row["id"] not in existing]
+        report.skipped += len(rows) - len(new_rows)
+        if table is Profile.__table__ and new_rows:
+            # Perfiles cuyo usuario no se importó (p. ej. por un conflicto); no todas las bases lo impiden
+            user_ids = {row["user_id"] for row in new_rows}
+            known = set(connection.execute(select(User.id).where(User.id.in_(user_ids))).scalars())
+            orphaned = [row for row in new_rows if row["user_id"] not in known]
+            for row in orphaned:
+                logger.warning(f"Importación: el perfil {row['id']} no tiene usuario, se omite")
+            report.conflicts += len(orphaned)
+            new_rows = [row for row in new_rows if row["user_id"] in known]
+        if not new_rows:
+            return 0
+        try:
+            with connection.begin_nested():
+                connection.execute(insert(table), new_rows)
+                connection.execute(insert(OutboxEvent), _outbox_rows(table, new_rows))
+            return len(new_rows)
+        except IntegrityError:
+            pass
+
+        # Algún duplicado de username/email o perfil sin usuario: fila a fila
+        imported = 0
+        for row in new_rows:
+            try:
+                with connection.begin_nested():
+                    connection.execute(insert(table), [row])
+                    connection.execute(insert(OutboxEvent), _outbox_rows(table, [row]))
+                imported += 1
+            except IntegrityError:
+                report.conflicts += 1
+                logger.warning(f"Importación: fila {row['id']} de {table.name} en conflicto, se omite")
+        return imported
+
+
+def _import_images(archive: zipfile.ZipFile, report: ImportReport):
+    storage = get_storage()
+    for info in archive.infolist():
+        if not info.filename.startswith(IMAGES_PREFIX) or info.is_dir():
+            continue
+        key = info.filename[len(IMAGES_PREFIX):]
+        try:
+            stored = storage.stat(key)
+            if stored is not None and stored.size == info.file_size:
+                report.skipped += 1
+                continue
+            with archive.open(info) as source:
+                storage.save(key, source)
+            report.images += 1
+        except ValueError as e:
+            # Clave fuera del almacenamiento (p. ej. con "..")
+            report.conflicts += 1
+            logger.warning(f"Importación: imagen {key} no válida: {str(e)}")
+
+
+def import_directory(source: Union[str, BinaryIO], batch_size: int = EXPORT_BATCH_SIZE) -> ImportReport:
+    """
+    Importa un zip generado por export_directory. Primero las imágenes, para que
+    ningún perfil importado apunte a una imagen que aún no existe, y después
+    usuarios y perfiles por lotes. Es reanudable: lo ya importado se salta.
+    """
+    report = ImportReport()
+    started = time.monotonic()
+    with zipfile.ZipFile(source) as archive:
+        manifest = json.loads(archive.read("manifest.json"))
+        if manifest.get("format") != EXPORT_FORMAT:
+            raise ValueError(f"Formato de exportación no soportado: {manifest.get('format')}")
+
+        _import_images(archive, report)
+
+        for name, table in TABLES:
+            batch = []
+            with archive.open(name) as entry:
+                for line in entry:
+                    if not line.strip():
+                        continue
+                    batch.append(_decode_row(table, json.loads(line)))
+                    if len(batch) >= batch_size:
+                        imported = _import_batch(table, batch, report)
+                        batch = []
+                        setattr(report, table.name, getattr(report, table.name) + imported)
+                if batch:
+                    imported = _import_batch(table, batch, report)
+                    setattr(report, table.name, getattr(report, table.name) + imported)
+            logger.info(f"Importación de {table.name}: {getattr(report, table.name)} filas nuevas")
+
+    report.seconds = time.monotonic() - started
+    return report
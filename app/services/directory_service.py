@@ -0,0 +1,144 @@
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.models.profile_model import Profile
+from app.services.invalidation_service import invalidation_bus
+from dotenv import load_dotenv
+from datetime import datetime
+from typing import Dict, Optional, Set, Tuple
+import hashlib
+import json
+import os
+import threading
+import time
+import logging
+
+logger = logging.getLogger("app")
+
+env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
+load_dotenv(env_path)
+
+# Antigüedad máxima del directorio precalculado (0 = desactivado, siempre se consulta la base)
+DIRECTORY_SNAPSHOT_MAX_AGE = float(os.getenv("DIRECTORY_SNAPSHOT_MAX_AGE", "30"))
+
+DIRECTORY_FIELDS = (Profile.id, Profile.name, Profile.cover_image, Profile.cover_meta, Profile.created_at)
+
+# Orden del directorio; el mismo que el del listado completo (ProfileService.get_all_profiles)
+DIRECTORY_ORDER = (Profile.created_at, Profile.id)
+
+
+def _sort_key(row) -> tuple:
+    return (row.created_at or datetime.min, row.id)
+
+
+def _encode_entry(row) -> bytes:
+    # Mismo formato que JSONResponse: sin espacios y sin escapar caracteres no ASCII
+    return json.dumps(
+        {"id": row.id, "name": row.name, "cover_image": row.cover_image, "cover_meta": row.cover_meta},
+        ensure_ascii=False,
+        separators=(",", ":")
+    ).encode("utf-8")
+
+
+class DirectorySnapshot:
+    """
+    Listado público de perfiles ya serializado (bytes + ETag). Cada perfil
+    modificado se vuelve a leer y codificar por separado; el listado completo
+    solo se reconstruye al arrancar o cuando supera DIRECTORY_SNAPSHOT_MAX_AGE,
+    lo que acota el retraso si se pierde algún evento de otro worker.
+    """
+
+    def __init__(self, max_age: float = DIRECTORY_SNAPSHOT_MAX_AGE):
+        self.max_age = max_age
+        self._entries: Dict[str, bytes] = {}
+        self._keys: Dict[str, tuple] = {}
+        self._body: Optional[bytes] = None
+        self._etag: Optional[str] = None
+        self._built_at = 0.0
+        self._dirty: Set[str] = set()
+        # _lock protege la reconstrucción; _dirty_lock solo el conjunto de pendientes,
+        # que el hilo del bus de invalidación modifica mientras tanto
+        self._lock = threading.Lock()
+        self._dirty_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_age > 0
+
+    def mark_dirty(self, profile_id: str):
+        # Se llama desde el bus de invalidación: solo se apunta el perfil
+        with self._dirty_lock:
+            self._dirty.add(profile_id)
+
+    def _take_dirty(self) -> Set[str]:
+        with self._dirty_lock:
+            dirty, self._dirty = self._dirty, set()
+        return dirty
+
+    def _publish(self):
+        body = b"[" + b",".join(self._entries.values()) + b"]"
+        self._body = body
+        self._etag = f'"{hashlib.md5(body).hexdigest()}"'
+
+    def _rebuild(self, db: Session):
+        self._take_dirty()
+        rows = db.execute(select(*DIRECTORY_FIELDS).order_by(*DIRECTORY_ORDER)).all()
+        self._entries = {row.id: _encode_entry(row) for row in rows}
+        self._keys = {row.id: _sort_key(row) for row in rows}
+        self._built_at = time.monotonic()
+        self._publish()
+
+    def _apply_dirty(self, db: Session):
+        dirty = self._take_dirty()
+        query = select(*DIRECTORY_FIELDS).where(Profile.id.in_(dirty)).order_by(*DIRECTORY_ORDER)
+        try:
+            rows = {row.id: row for row in db.execute(query)}
+        except Exception:
+            # Se vuelven a apuntar para el siguiente intento
+            with self._dirty_lock:
+                self._dirty |= dirty
+            raise
+        for profile_id in dirty - rows.keys():
+            self._entries.pop(profile_id, None)
+            self._keys.pop(profile_id, None)
+        last_key = max(self._keys.values(), default=None)
+        in_order = True
+        # rows llega ordenado por (created_at, id): los perfiles nuevos se añaden en ese orden
+        for profile_id, row in rows.items():
+            if profile_id not in self._entries and last_key is not None and _sort_key(row) < last_key:
+                in_order = False
+            self._entries[profile_id] = _encode_entry(row)
+            self._keys[profile_id] = _sort_key(row)
+        if not in_order:
+            # Algún perfil nuevo va antes del último (p. ej. relojes distintos entre workers)
+            self._entries = {
+                profile_id: self._entries[profile_id]
+                for profile_id in sorted(self._entries, key=self._keys.__getitem__)
+            }
+        self._publish()
+
+    def get(self, db: Session) -> Tuple[bytes, str]:
+        """
+        Devuelve el listado serializado y su ETag. Sin cambios pendientes no toca la base.
+        """
+        stale = self._body is None or time.monotonic() - self._built_at > self.max_age
+        if stale or self._dirty:
+            # Si otra petición ya está actualizando, se sirve la versión anterior
+            blocking = self._body is None
+            if self._lock.acquire(blocking=blocking):
+                try:
+                    if self._body is None or time.monotonic() - self._built_at > self.max_age:
+                        self._rebuild(db)
+                    elif self._dirty:
+                        self._apply_dirty(db)
+                except Exception as e:
+                    logger.error(f"Error al actualizar el directorio de perfiles: {str(e)}")
+                    if self._body is None:
+                        raise
+                finally:
+                    self._lock.release()
+        return self._body, self._etag
+
+
+directory_snapshot = DirectorySnapshot()
+
+invalidation_bus.subscribe("profile", directory_snapshot.mark_dirty)
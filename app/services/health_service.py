@@ -0,0 +1,152 @@
+from dataclasses import dataclass, field
+from jose import jwt
+from sqlalchemy import select, text
+from sqlalchemy.orm import undefer
+from app.database.connection import SessionLocal, engine, replica_engines
+from app.models.profile_model import Profile
+from app.schemas.profile_schema import AllProfilesResponse, ProfileResponse
+from app.services.auth_service import AuthService, ALGORITHM, SECRET_KEY, pwd_context
+from app.services.directory_service import directory_snapshot
+from app.services.availability_service import availability_filter
+from dotenv import load_dotenv
+from typing import Dict, List, Optional
+import os
+import threading
+import time
+import logging
+
+logger = logging.getLogger("app")
+
+env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
+load_dotenv(env_path)
+
+# Segundos entre reintentos de los pasos que fallan (se duplica hasta WARMUP_RETRY_MAX_SECONDS)
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "2"))
+WARMUP_RETRY_MAX_SECONDS = float(os.getenv("WARMUP_RETRY_MAX_SECONDS", "30"))
+# Intentos de los pasos opcionales; los necesarios se reintentan hasta que funcionen
+WARMUP_OPTIONAL_ATTEMPTS = int(os.getenv("WARMUP_OPTIONAL_ATTEMPTS", "5"))
+
+
+@dataclass
+class WarmupState:
+    ready: bool = False
+    running: bool = False
+    # Duración de cada paso en milisegundos
+    steps: Dict[str, float] = field(default_factory=dict)
+    # Último error de los pasos que todavía no han funcionado
+    errors: Dict[str, str] = field(default_factory=dict)
+    attempts: Dict[str, int] = field(default_factory=dict)
+    total_ms: Optional[float] = None
+
+
+warmup_state = WarmupState()
+_warmup_stop = threading.Event()
+
+
+def _open_pool_connections():
+    # Abrir a la vez tantas conexiones como admite el pool y devolverlas: quedan listas para reutilizar
+    for target in [engine, *replica_engines]:
+        size = target.pool.size() if hasattr(target.pool, "size") else 1
+        connections = []
+        try:
+            for _ in range(max(size, 1)):
+                connection = target.connect()
+                connection.execute(text("SELECT 1"))
+                connections.append(connection)
+        finally:
+            for connection in connections:
+                connection.close()
+
+
+def _prime_profile_listing():
+    db = SessionLocal()
+    try:
+        if directory_snapshot.enabled:
+            directory_snapshot.get(db)
+        else:
+            rows = db.execute(select(Profile).options(undefer(Profile.cover_meta)).limit(50)).scalars().all()
+            [AllProfilesResponse.model_validate(row, from_attributes=True) for row in rows]
+        # Validador del detalle de perfil
+        profile = db.execute(select(Profile).limit(1)).scalars().first()
+        if profile is not None:
+            ProfileResponse.model_validate(profile)
+    finally:
+        db.close()
+
+
+def _password_round_trip():
+    # Carga el backend de bcrypt, que passlib inicializa en el primer uso
+    password_hash = pwd_context.hash("warmup-password")
+    pwd_context.verify("warmup-password", password_hash)
+
+
+def _jwt_round_trip():
+    token = AuthService(db=None).create_access_token({"sub": "warmup", "id": "warmup"})
+    jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+
+
+WARMUP_STEPS = [
+    ("database", _open_pool_connections),
+    ("profile_listing", _prime_profile_listing),
+    ("availability_filter", availability_filter.build),
+    ("password_hash", _password_round_trip),
+    ("jwt", _jwt_round_trip),
+]
+
+# Sin estos pasos la instancia no puede atender el tráfico: /ready sigue en 503
+REQUIRED_STEPS = {"database", "profile_listing"}
+
+
+def _run_step(name: str, step) -> bool:
+    step_started = time.perf_counter()
+    warmup_state.attempts[name] = warmup_state.attempts.get(name, 0) + 1
+    try:
+        step()
+        warmup_state.errors.pop(name, None)
+        ok = True
+    except Exception as e:
+        warmup_state.errors[name] = str(e)
+        logger.error(f"Error en el calentamiento ({name}, intento {warmup_state.attempts[name]}): {str(e)}")
+        ok = False
+    warmup_state.steps[name] = round((time.perf_counter() - step_started) * 1000, 1)
+    logger.info(f"Calentamiento {name}: {warmup_state.steps[name]} ms")
+    return ok
+
+
+def run_warmup(steps: List = WARMUP_STEPS, required: set = REQUIRED_STEPS) -> WarmupState:
+    """
+    Ejecuta los pasos de calentamiento y mide cada uno. La instancia se marca
+    como lista cuando los pasos necesarios (base de datos y listado) han
+    funcionado; los que fallan se reintentan con espera creciente, los
+    necesarios hasta que funcionen y los opcionales hasta WARMUP_OPTIONAL_ATTEMPTS.
+    """
+    _warmup_stop.clear()
+    warmup_state.running = True
+    started = time.perf_counter()
+    pending = list(steps)
+    delay = WARMUP_RETRY_SECONDS
+    while pending:
+        failed = [(name, step) for name, step in pending if not _run_step(name, step)]
+        if not warmup_state.ready and not any(name in required for name, _ in failed):
+            warmup_state.total_ms = round((time.perf_counter() - started) * 1000, 1)
+            warmup_state.ready = True
+            logger.info(f"Calentamiento completado en {warmup_state.total_ms} ms")
+        pending = [
+            (name, step) for name, step in failed
+            if name in required or warmup_state.attempts[name] < WARMUP_OPTIONAL_ATTEMPTS
+        ]
+        if pending:
+            logger.warning(f"Se reintentará el calentamiento de {', '.join(name for name, _ in pending)} en {delay} s")
+            if _warmup_stop.wait(delay):
+                break
+            delay = min(delay * 2, WARMUP_RETRY_MAX_SECONDS)
+
+    warmup_state.running = False
+    return warmup_state
+
+
+def stop_warmup():
+    """
+    Interrumpe los reintentos del calentamiento (al apagar la instancia)
+    """
+    _warmup_stop.set()
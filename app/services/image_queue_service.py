@@ -0,0 +1,335 @@
+from sqlalchemy import or_, update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
+from starlette.concurrency import run_in_threadpool
+from app.database.connection import SessionLocal
+from app.models.image_job_model import ImageJob
+from app.models.profile_model import Profile
+from app.services.image_service import ImageService
+from app.services.storage_service import get_storage, key_from_path, path_for_key
+from app.services.invalidation_service import invalidation_bus
+from app.services.outbox_service import outbox_dispatcher, record_event
+from app.server_config import server_config
+from dotenv import load_dotenv
+from typing import List, Optional, Tuple
+import asyncio
+import os
+import time
+import uuid
+import logging
+
+logger = logging.getLogger("app")
+
+env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
+load_dotenv(env_path)
+
+# inprocess: trabajador asyncio dentro de la API
+# worker: la API solo registra los trabajos y los procesa `python -m app.commands.image_worker`
+IMAGE_QUEUE_MODE = os.getenv("IMAGE_QUEUE_MODE", "inprocess")
+# Trabajos simultáneos por worker (por defecto, núcleos / workers: ver app/server_config.py)
+IMAGE_QUEUE_CONCURRENCY = server_config.image_concurrency
+
+
+def set_image_state(
+    db: Session,
+    profile_id: str,
+    field: str,
+    status: str,
+    new_path: Optional[str] = None,
+    expected_path: Optional[str] = None,
+    clear: bool = False,
+    meta: Optional[dict] = None
+) -> bool:
+    """
+    Actualiza el estado de una imagen del perfil (y opcionalmente su ruta y sus
+    metadatos). Si se indica expected_path, solo se modifica cuando el campo
+    todavía apunta a esa ruta; así una subida más reciente nunca se sobrescribe.
+    """
+    profile = db.query(Profile).filter(Profile.id == profile_id).with_for_update().populate_existing().first()
+    if not profile:
+        return False
+    if expected_path is not None and getattr(profile, field) != expected_path:
+        return False
+
+    if new_path is not None or clear:
+        setattr(profile, field, new_path)
+    if meta is not None or new_path is not None or clear:
+        set_image_meta(profile, field, meta)
+    image_status = dict(profile.image_status or {})
+    image_status[field] = status
+    profile.image_status = image_status
+    return True
+
+
+def set_image_meta(profile: Profile, field: str, meta: Optional[dict]):
+    """
+    Guarda (o quita, con None) las dimensiones y la miniatura de una imagen del perfil
+    """
+    image_meta = dict(profile.image_meta or {})
+    if meta is None:
+        if field not in image_meta:
+            return
+        image_meta.pop(field)
+    else:
+        image_meta[field] = meta
+    profile.image_meta = image_meta or None
+
+
+def create_process_job(db: Session, profile: Profile, field: str, image_path: str) -> ImageJob:
+    """
+    Registra el trabajo de optimización de una imagen recién subida (sin hacer commit)
+    """
+    job = ImageJob(
+        id=uuid.uuid4().hex,
+        kind="process",
+        profile_id=profile.id,
+        field=field,
+        source_key=key_from_path(image_path)
+    )
+    db.add(job)
+    image_status = dict(profile.image_status or {})
+    image_status[field] = "pending"
+    profile.image_status = image_status
+    # Los metadatos de la imagen anterior ya no valen; los nuevos llegan con el procesado
+    set_image_meta(profile, field, None)
+    return job
+
+
+def create_delete_job(db: Session, keys: List[str]) -> ImageJob:
+    """
+    Registra el borrado en segundo plano de un conjunto de imágenes (sin hacer commit)
+    """
+    job = ImageJob(id=uuid.uuid4().hex, kind="delete", payload={"keys": keys})
+    db.add(job)
+    return job
+
+
+def _run_delete_job(db: Session, job: ImageJob) -> None:
+    storage = get_storage()
+    failed = 0
+    for key in (job.payload or {}).get("keys", []):
+        try:
+            storage.delete(key)
+        except Exception as e:
+            # El archivo queda huérfano; lo recogerá el GC de uploads
+            failed += 1
+            logger.error(f"Error al eliminar la imagen {key}: {str(e)}")
+    job.status = "done"
+    if failed:
+        job.error = f"No se pudieron eliminar {failed} imágenes"
+    db.commit()
+
+
+def process_image_job(job_id: str) -> None:
+    """
+    Ejecuta un trabajo de imagen. Puede llamarse desde varios trabajadores a la
+    vez: solo el que consigue pasar el trabajo de pending a processing lo ejecuta.
+    """
+    db = SessionLocal()
+    try:
+        claimed = db.execute(
+            update(ImageJob)
+            .where(ImageJob.id == job_id, ImageJob.status == "pending")
+            .values(status="processing", attempts=ImageJob.attempts + 1)
+        ).rowcount
+        db.commit()
+        if not claimed:
+            return
+
+        job = db.query(ImageJob).filter(ImageJob.id == job_id).first()
+        if job.kind == "delete":
+            _run_delete_job(db, job)
+            return
+
+        source_path = path_for_key(job.source_key)
+        if set_image_state(db, job.profile_id, job.field, "processing", expected_path=source_path):
+            db.commit()
+            invalidation_bus.publish("profile", job.profile_id)
+        else:
+            # La imagen ya fue reemplazada por otra subida
+            job.status = "done"
+            db.commit()
+            return
+
+        storage = get_storage()
+        try:
+            new_key, meta = ImageService.process_stored_image(job.source_key)
+        except Exception as e:
+            logger.error(f"Error al procesar la imagen {job.source_key}: {str(e)}")
+            db.rollback()
+            job.status = "failed"
+            job.error = str(e)[:500]
+            if set_image_state(db, job.profile_id, job.field, "failed", expected_path=source_path, clear=True):
+                record_event(db, "profile", job.profile_id, "updated", {"fields": [job.field]})
+            db.commit()
+            outbox_dispatcher.after_commit("profile", job.profile_id)
+            storage.delete(job.source_key)
+            return
+
+        if set_image_state(db, job.profile_id, job.field, "ready", new_path=path_for_key(new_key), expected_path=source_path, meta=meta):
+            job.status = "done"
+            # La ruta definitiva y los metadatos llegan también al stream de perfiles
+            record_event(db, "profile", job.profile_id, "updated", {"fields": [job.field]})
+            db.commit()
+            outbox_dispatcher.after_commit("profile", job.profile_id)
+            storage.delete(job.source_key)
+        else:
+            job.status = "done"
+            db.commit()
+            storage.delete(new_key)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error inesperado en el trabajo de imagen {job_id}: {str(e)}")
+        db.execute(
+            update(ImageJob).where(ImageJob.id == job_id).values(status="failed", error=str(e)[:500])
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def pending_job_ids(db: Session, limit: int = 100) -> List[str]:
+    rows = db.query(ImageJob.id).filter(
+        ImageJob.status == "pending"
+    ).order_by(ImageJob.created_at).limit(limit).all()
+    return [row.id for row in rows]
+
+
+def backfill_image_meta(batch_size: int = 100, max_attempts: int = 3) -> Tuple[int, int]:
+    """
+    Calcula las dimensiones y la miniatura de las imágenes guardadas antes de que
+    existieran image_meta. Solo se leen las imágenes que aún no las tienen.
+    Si otro proceso modifica un perfil del lote, el lote se vuelve a leer desde
+    el mismo punto (hasta max_attempts veces) para no dejarlo a medias.
+    Retorna (imágenes actualizadas, imágenes que no se pudieron leer).
+    """
+    image_fields = ("cover_image", "image_1", "image_2", "image_3")
+    storage = get_storage()
+    updated = failed = 0
+    last_id = ""
+    attempts = 0
+    while True:
+        db = SessionLocal()
+        try:
+            profiles = db.query(Profile).filter(
+                Profile.id > last_id,
+                or_(*[getattr(Profile, field).isnot(None) for field in image_fields])
+            ).order_by(Profile.id).limit(batch_size).all()
+            if not profiles:
+                return updated, failed
+
+            changed = {}
+            unreadable = 0
+            for profile in profiles:
+                for field in image_fields:
+                    key = key_from_path(getattr(profile, field))
+                    if not key or field in (profile.image_meta or {}):
+                        continue
+                    ext = "." + key.rsplit(".", 1)[-1].lower()
+                    ext = ".jpg" if ext == ".jpeg" else ext
+                    try:
+                        with storage.open(key) as source:
+                            meta = ImageService.read_image_meta(source, ext)
+                    except Exception as e:
+                        unreadable += 1
+                        logger.warning(f"No se pudieron leer los metadatos de {key}: {str(e)}")
+                        continue
+                    set_image_meta(profile, field, meta)
+                    changed.setdefault(profile.id, []).append(field)
+            for profile_id, fields in changed.items():
+                record_event(db, "profile", profile_id, "updated", {"fields": fields})
+            try:
+                db.commit()
+            except StaleDataError:
+                # Algún perfil cambió mientras tanto: se repite el lote con los datos nuevos
+                db.rollback()
+                attempts += 1
+                if attempts >= max_attempts:
+                    raise RuntimeError(
+                        f"Perfiles modificados durante el cálculo de metadatos después de {last_id or 'el inicio'}; "
+                        "vuelve a ejecutar el comando para completarlo"
+                    )
+                logger.warning(f"Perfiles modificados durante el cálculo de metadatos: se repite el lote (intento {attempts + 1})")
+                continue
+            # El cursor solo avanza cuando el lote está guardado
+            last_id = profiles[-1].id
+            attempts = 0
+            failed += unreadable
+            updated += sum(len(fields) for fields in changed.values())
+            for profile_id in changed:
+                outbox_dispatcher.after_commit("profile", profile_id)
+        finally:
+            db.close()
+
+
+class ImageJobQueue:
+    """
+    Cola de trabajos de imagen dentro del proceso de la API. Los trabajos se
+    guardan en la tabla image_jobs, así que los pendientes se recuperan al arrancar.
+    """
+
+    def __init__(self, concurrency: int = IMAGE_QUEUE_CONCURRENCY):
+        self.concurrency = concurrency
+        self.queue: Optional[asyncio.Queue] = None
+        self.tasks: List[asyncio.Task] = []
+
+    @property
+    def running(self) -> bool:
+        return self.queue is not None
+
+    async def start(self):
+        self.queue = asyncio.Queue()
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+        # Recuperar trabajos que quedaron pendientes en un reinicio
+        def load_pending():
+            db = SessionLocal()
+            try:
+                return pending_job_ids(db, limit=10000)
+            finally:
+                db.close()
+        for job_id in await run_in_threadpool(load_pending):
+            self.queue.put_nowait(job_id)
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        self.queue = None
+
+    def enqueue(self, job_id: str):
+        # En modo worker el trabajo ya está en la tabla y lo recoge el otro proceso
+        if self.running:
+            self.queue.put_nowait(job_id)
+
+    async def _worker(self):
+        while True:
+            job_id = await self.queue.get()
+            try:
+                await run_in_threadpool(process_image_job, job_id)
+            except Exception as e:
+                logger.error(f"Error en la cola de imágenes: {str(e)}")
+            finally:
+                self.queue.task_done()
+
+
+def run_worker(poll_interval: float = 1.0, batch_size: int = 50):
+    """
+    Bucle del proceso trabajador independiente (IMAGE_QUEUE_MODE=worker)
+    """
+    logger.info("Trabajador de imágenes iniciado")
+    while True:
+        db = SessionLocal()
+        try:
+            job_ids = pending_job_ids(db, limit=batch_size)
+        finally:
+            db.close()
+
+        for job_id in job_ids:
+            process_image_job(job_id)
+        if not job_ids:
+            time.sleep(poll_interval)
+
+
+image_queue = ImageJobQueue()
@@ -1,61 +1,308 @@
 from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+from app.services.storage_service import get_storage, key_from_path, new_image_key, path_for_key
+from contextlib import contextmanager
+from dotenv import load_dotenv
+from typing import BinaryIO, Optional, Tuple
+import base64
+import io
+import math
 import os
-import uuid
-from PIL import Image
-import shutil
+import tempfile
+import threading
+import warnings
+from PIL import Image, ImageOps
+import logging
+
+logger = logging.getLogger("app")
+
+env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
+load_dotenv(env_path)
+
+# Límite de píxeles para Pillow: por encima se considera una bomba de descompresión
+MAX_IMAGE_PIXELS = 40_000_000
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+# Píxeles decodificados a la vez en todo el proceso (~4 bytes por píxel en RGB(A))
+IMAGE_PIXEL_BUDGET = int(os.getenv("IMAGE_PIXEL_BUDGET", "100000000"))
+
+# Tamaño máximo de las imágenes guardadas y etiqueta EXIF de orientación
+MAX_WIDTH, MAX_HEIGHT = 1920, 1080
+EXIF_ORIENTATION = 0x0112
+
+# Lado mayor y calidad de la miniatura que se envía en línea mientras carga la imagen
+PLACEHOLDER_SIZE = int(os.getenv("IMAGE_PLACEHOLDER_SIZE", "16"))
+PLACEHOLDER_QUALITY = 40
+
+
+class PixelBudget:
+    """
+    Limita los píxeles decodificados en memoria a la vez entre todos los hilos.
+    Una imagen que por sí sola supera el presupuesto espera a que no haya otras.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_use = 0
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def reserve(self, pixels: int):
+        with self._condition:
+            while self.in_use and self.in_use + pixels > self.limit:
+                self._condition.wait()
+            self.in_use += pixels
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.in_use -= pixels
+                self._condition.notify_all()
+
+
+pixel_budget = PixelBudget(IMAGE_PIXEL_BUDGET)
+
+class ImageTooLargeError(ValueError):
+    """La imagen supera el tamaño o la resolución máxima permitida"""
+    pass
 
 class ImageService:
-    UPLOAD_DIR = "uploads"
     ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif"}
+    CONTENT_TYPES = {
+        "image/jpeg": ".jpg",
+        "image/png": ".png",
+        "image/gif": ".gif",
+    }
+    # Firmas (magic bytes) de los formatos permitidos
+    SIGNATURES = [
+        (b"\xff\xd8\xff", ".jpg"),
+        (b"\x89PNG\r\n\x1a\n", ".png"),
+        (b"GIF87a", ".gif"),
+        (b"GIF89a", ".gif"),
+    ]
+    PILLOW_FORMATS = {".jpg": "JPEG", ".png": "PNG", ".gif": "GIF"}
     MAX_SIZE = 5 * 1024 * 1024  # 5MB
+    CHUNK_SIZE = 64 * 1024
+    # Bytes necesarios para reconocer cualquiera de las firmas
+    SNIFF_SIZE = max(len(signature) for signature, _ in SIGNATURES)
+
+    @staticmethod
+    def content_type_for(ext: str) -> str:
+        if ext in (".jpg", ".jpeg"):
+            return "image/jpeg"
+        return f"image/{ext.lstrip('.')}"
+
+    @staticmethod
+    def sniff_extension(header: bytes) -> Optional[str]:
+        """
+        Detecta el formato de la imagen a partir de sus primeros bytes
+        """
+        for signature, ext in ImageService.SIGNATURES:
+            if header.startswith(signature):
+                return ext
+        return None
 
     @staticmethod
-    async def save_image(file: UploadFile) -> str:
+    async def read_upload(file: UploadFile) -> Tuple[BinaryIO, str]:
         """
-        Guarda una imagen y retorna su URL relativa
+        Lee la subida por bloques, validando el formato con el primer bloque
+        y cortando en cuanto se supera MAX_SIZE. Retorna el archivo y su extensión.
         """
-        # Verificar extensión
-        ext = os.path.splitext(file.filename)[1].lower()
-        if ext not in ImageService.ALLOWED_EXTENSIONS:
+        if file.size is not None and file.size > ImageService.MAX_SIZE:
+            raise ImageTooLargeError("La imagen supera el tamaño máximo permitido")
+
+        header = await file.read(ImageService.CHUNK_SIZE)
+        ext = ImageService.sniff_extension(header)
+        if not ext:
             raise ValueError("Tipo de archivo no permitido")
 
-        # Generar nombre único
-        filename = f"{uuid.uuid4().hex}{ext}"
-        filepath = os.path.join(ImageService.UPLOAD_DIR, filename)
+        buffer = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+        received = len(header)
+        buffer.write(header)
+        while True:
+            chunk = await file.read(ImageService.CHUNK_SIZE)
+            if not chunk:
+                break
+            received += len(chunk)
+            if received > ImageService.MAX_SIZE:
+                buffer.close()
+                raise ImageTooLargeError("La imagen supera el tamaño máximo permitido")
+            buffer.write(chunk)
+        buffer.seek(0)
+        return buffer, ext
 
-        # Guardar archivo
-        with open(filepath, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+    @staticmethod
+    def open_image(source: BinaryIO, ext: str) -> Image.Image:
+        """
+        Abre la imagen con el decodificador del formato detectado y rechaza
+        resoluciones excesivas antes de decodificar los píxeles
+        """
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", Image.DecompressionBombWarning)
+            try:
+                img = Image.open(source, formats=[ImageService.PILLOW_FORMATS[ext]])
+            except (Image.DecompressionBombError, Image.DecompressionBombWarning):
+                raise ImageTooLargeError("La resolución de la imagen es demasiado grande")
+        if img.size[0] * img.size[1] > MAX_IMAGE_PIXELS:
+            img.close()
+            raise ImageTooLargeError("La resolución de la imagen es demasiado grande")
+        return img
 
-        # Optimizar imagen
-        try:
-            with Image.open(filepath) as img:
+    @staticmethod
+    def placeholder(img: Image.Image) -> str:
+        """
+        Miniatura WebP de unos cientos de bytes como data URI, para mostrarla
+        (desenfocada) mientras se descarga la imagen
+        """
+        small = img.copy()
+        small.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+        has_alpha = small.mode in ("RGBA", "LA") or (small.mode == "P" and "transparency" in small.info)
+        small = small.convert("RGBA" if has_alpha else "RGB")
+        output = io.BytesIO()
+        small.save(output, format="WEBP", quality=PLACEHOLDER_QUALITY, method=6)
+        return "data:image/webp;base64," + base64.b64encode(output.getvalue()).decode("ascii")
+
+    @staticmethod
+    def image_meta(img: Image.Image) -> dict:
+        """
+        Dimensiones y miniatura de una imagen ya decodificada y orientada
+        """
+        return {"width": img.size[0], "height": img.size[1], "placeholder": ImageService.placeholder(img)}
+
+    @staticmethod
+    def optimize_image(source: BinaryIO, ext: str) -> bytes:
+        """
+        Redimensiona y recomprime una imagen, retornando los bytes resultantes
+        """
+        return ImageService.optimize_image_with_meta(source, ext)[0]
+
+    @staticmethod
+    def optimize_image_with_meta(source: BinaryIO, ext: str) -> Tuple[bytes, dict]:
+        """
+        Redimensiona y recomprime una imagen, retornando los bytes resultantes y
+        sus metadatos (ver image_meta), calculados con la misma decodificación.
+        Los JPEG se decodifican ya reducidos (1/2, 1/4 o 1/8) cuando siguen
+        cubriendo el tamaño final, y la orientación EXIF se aplica al final.
+        """
+        with ImageService.open_image(source, ext) as img:
+            image_format = img.format
+            # La orientación se lee de la cabecera; con giro de 90° el límite va traspuesto
+            orientation = img.getexif().get(EXIF_ORIENTATION, 1)
+            box = (MAX_HEIGHT, MAX_WIDTH) if orientation in (5, 6, 7, 8) else (MAX_WIDTH, MAX_HEIGHT)
+            if image_format == "JPEG":
+                # Tamaño final conservando la proporción: basta con decodificar algo mayor
+                scale = min(box[0] / img.size[0], box[1] / img.size[1], 1)
+                img.draft(None, (math.ceil(img.size[0] * scale), math.ceil(img.size[1] * scale)))
+
+            with pixel_budget.reserve(img.size[0] * img.size[1]):
+                img.load()
                 # Redimensionar si es muy grande
-                if img.size[0] > 1920 or img.size[1] > 1080:
-                    img.thumbnail((1920, 1080))
-                # Guardar con compresión
-                img.save(filepath, optimize=True, quality=85)
+                if img.size[0] > box[0] or img.size[1] > box[1]:
+                    img.thumbnail(box)
+                if orientation != 1:
+                    img = ImageOps.exif_transpose(img)
+                # Guardar con compresión (sin EXIF: la orientación ya está aplicada)
+                output = io.BytesIO()
+                img.save(output, format=image_format, optimize=True, quality=85)
+                return output.getvalue(), ImageService.image_meta(img)
+
+    @staticmethod
+    def read_image_meta(source: BinaryIO, ext: str) -> dict:
+        """
+        Metadatos de una imagen ya guardada (p. ej. anterior a que se calcularan).
+        Los JPEG se decodifican a la menor escala posible.
+        """
+        with ImageService.open_image(source, ext) as img:
+            orientation = img.getexif().get(EXIF_ORIENTATION, 1)
+            width, height = img.size
+            if orientation in (5, 6, 7, 8):
+                width, height = height, width
+            if img.format == "JPEG":
+                img.draft(None, (PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+            with pixel_budget.reserve(img.size[0] * img.size[1]):
+                img.load()
+                if orientation != 1:
+                    img = ImageOps.exif_transpose(img)
+                return {"width": width, "height": height, "placeholder": ImageService.placeholder(img)}
+
+    @staticmethod
+    def check_image(source: BinaryIO, ext: str) -> None:
+        """
+        Valida la cabecera y la resolución de la imagen sin decodificar los píxeles
+        """
+        try:
+            with ImageService.open_image(source, ext):
+                pass
+        except ImageTooLargeError:
+            raise
         except Exception:
-            # Si falla la optimización, mantener el archivo original
-            pass
+            raise ValueError("El archivo no es una imagen válida")
+        finally:
+            source.seek(0)
 
-        return f"/uploads/{filename}"
+    @staticmethod
+    def process_stored_image(key: str) -> Tuple[str, dict]:
+        """
+        Optimiza una imagen ya guardada en el almacenamiento y guarda el resultado
+        con una clave nueva. Retorna la clave y los metadatos de la imagen.
+        La original no se modifica.
+        """
+        ext = "." + key.rsplit(".", 1)[-1].lower()
+        if ext == ".jpeg":
+            ext = ".jpg"
+        if ext not in ImageService.PILLOW_FORMATS:
+            raise ValueError("Tipo de archivo no permitido")
+
+        storage = get_storage()
+        with storage.open(key) as source:
+            contents, meta = ImageService.optimize_image_with_meta(source, ext)
+
+        new_key = new_image_key(ext)
+        storage.save(new_key, io.BytesIO(contents), ImageService.content_type_for(ext))
+        return new_key, meta
+
+    @staticmethod
+    async def save_image(file: UploadFile) -> Tuple[str, Optional[dict]]:
+        """
+        Guarda una imagen y retorna su URL relativa y sus metadatos
+        (None si no se pudo optimizar)
+        """
+        # Validar tamaño y formato real del archivo
+        source, ext = await ImageService.read_upload(file)
+
+        # Generar nombre único
+        filename = new_image_key(ext)
+
+        with source:
+            # Optimizar imagen
+            meta = None
+            try:
+                contents, meta = await run_in_threadpool(ImageService.optimize_image_with_meta, source, ext)
+            except ImageTooLargeError:
+                raise
+            except Exception:
+                # Si falla la optimización, mantener el archivo original
+                source.seek(0)
+                contents = source.read()
+
+            await run_in_threadpool(
+                get_storage().save, filename, io.BytesIO(contents), ImageService.content_type_for(ext)
+            )
+        return path_for_key(filename), meta
 
     @staticmethod
     async def delete_image(image_path: str) -> bool:
         """
-        Elimina una imagen del sistema de archivos
+        Elimina una imagen del almacenamiento
         """
-        if not image_path:
+        key = key_from_path(image_path)
+        if not key:
             return True
 
-        # Obtener ruta real del archivo
-        filepath = image_path.replace("/uploads/", "")
-        full_path = os.path.join(ImageService.UPLOAD_DIR, filepath)
-
         try:
-            if os.path.exists(full_path):
-                os.remove(full_path)
+            await run_in_threadpool(get_storage().delete, key)
             return True
-        except Exception:
-            return False 
\ No newline at end of file
+        except Exception as e:
+            # El archivo queda huérfano; lo recogerá el GC de uploads
+            logger.error(f"Error al eliminar imagen {image_path}: {str(e)}")
+            return False
@@ -0,0 +1,206 @@
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, insert, select, text
+from app.database.connection import engine
+from app.models.cache_invalidation_model import CacheInvalidation
+from dotenv import load_dotenv
+from typing import Any, Callable, Dict, List, Optional
+import json
+import os
+import select as select_module
+import threading
+import time
+import uuid
+import logging
+
+logger = logging.getLogger("app")
+
+env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
+load_dotenv(env_path)
+
+# Las cachés por worker solo se activan si se pide explícitamente
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "60"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+INVALIDATION_POLL_INTERVAL = float(os.getenv("INVALIDATION_POLL_INTERVAL", "1"))
+
+NOTIFY_CHANNEL = "cache_invalidation"
+
+
+class TTLCache:
+    """
+    Caché en memoria de un worker, con caducidad y tamaño máximo (LRU)
+    """
+
+    def __init__(self, ttl_seconds: float = CACHE_TTL_SECONDS, max_entries: int = CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class InvalidationBus:
+    """
+    Reparte eventos "la entidad X cambió" entre todos los workers.
+    En PostgreSQL usa LISTEN/NOTIFY; en otras bases, la tabla cache_invalidations
+    consultada periódicamente. Los suscriptores del propio worker se avisan al momento.
+    """
+
+    def __init__(self, poll_interval: float = INVALIDATION_POLL_INTERVAL):
+        self.origin = uuid.uuid4().hex
+        self.poll_interval = poll_interval
+        self.use_notify = engine.dialect.name == "postgresql"
+        self._subscribers: Dict[str, List[Callable[[str], None]]] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def subscribe(self, entity: str, callback: Callable[[str], None]):
+        self._subscribers.setdefault(entity, []).append(callback)
+
+    def dispatch_local(self, entity: str, entity_id: str):
+        """
+        Avisa solo a los suscriptores de este worker
+        """
+        for callback in self._subscribers.get(entity, []):
+            try:
+                callback(entity_id)
+            except Exception as e:
+                logger.error(f"Error en un suscriptor de invalidación ({entity}): {str(e)}")
+
+    def publish(self, entity: str, entity_id: str):
+        """
+        Publica el cambio de una entidad. Llamar después del commit.
+        """
+        self.dispatch_local(entity, entity_id)
+        try:
+            with engine.begin() as connection:
+                if self.use_notify:
+                    payload = json.dumps({"entity": entity, "id": entity_id, "origin": self.origin})
+                    connection.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": NOTIFY_CHANNEL, "payload": payload})
+                else:
+                    connection.execute(insert(CacheInvalidation).values(entity=entity, entity_id=entity_id, origin=self.origin))
+        except Exception as e:
+            # Los demás workers se pondrán al día por la caducidad de sus cachés
+            logger.error(f"No se pudo publicar la invalidación de {entity} {entity_id}: {str(e)}")
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        target = self._listen_notify if self.use_notify else self._poll_table
+        self._thread = threading.Thread(target=target, name="invalidation-bus", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _handle_remote(self, entity: str, entity_id: str, origin: str):
+        if origin != self.origin:
+            self.dispatch_local(entity, entity_id)
+
+    def _listen_notify(self):
+        while not self._stop.is_set():
+            try:
+                raw = engine.raw_connection()
+                try:
+                    dbapi_connection = raw.dbapi_connection
+                    dbapi_connection.autocommit = True
+                    cursor = dbapi_connection.cursor()
+                    cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+                    while not self._stop.is_set():
+                        if select_module.select([dbapi_connection], [], [], 1.0) == ([], [], []):
+                            continue
+                        dbapi_connection.poll()
+                        while dbapi_connection.notifies:
+                            notify = dbapi_connection.notifies.pop(0)
+                            message = json.loads(notify.payload)
+                            self._handle_remote(message["entity"], message["id"], message["origin"])
+                finally:
+                    # No devolver al pool una conexión en modo LISTEN
+                    raw.invalidate()
+            except Exception as e:
+                logger.error(f"Error escuchando invalidaciones: {str(e)}")
+                self._stop.wait(self.poll_interval)
+
+    def _poll_table(self):
+        # Se inicializa dentro del bucle: si la base no responde al arrancar, se reintenta
+        last_id = None
+        # Los ids se asignan al insertar pero pueden confirmarse fuera de orden:
+        # se vuelve a leer una ventana pequeña y se ignoran los ya vistos
+        lookback = 100
+        seen = deque(maxlen=5000)
+        seen_set = set()
+        last_cleanup = time.monotonic()
+
+        while not self._stop.wait(self.poll_interval):
+            try:
+                with engine.connect() as connection:
+                    if last_id is None:
+                        last_id = connection.execute(select(func.max(CacheInvalidation.id))).scalar() or 0
+                    rows = connection.execute(
+                        select(CacheInvalidation)
+                        .where(CacheInvalidation.id > last_id - lookback)
+                        .order_by(CacheInvalidation.id)
+                        .limit(1000)
+                    ).all()
+                for row in rows:
+                    if row.id in seen_set:
+                        continue
+                    if len(seen) == seen.maxlen:
+                        seen_set.discard(seen[0])
+                    seen.append(row.id)
+                    seen_set.add(row.id)
+                    last_id = max(last_id, row.id)
+                    self._handle_remote(row.entity, row.entity_id, row.origin)
+
+                # Borrar de vez en cuando los eventos antiguos
+                if time.monotonic() - last_cleanup > 600:
+                    last_cleanup = time.monotonic()
+                    with engine.begin() as connection:
+                        connection.execute(
+                            delete(CacheInvalidation).where(
+                                CacheInvalidation.created_at < datetime.utcnow() - timedelta(hours=1)
+                            )
+                        )
+            except Exception as e:
+                logger.error(f"Error consultando invalidaciones: {str(e)}")
+
+
+invalidation_bus = InvalidationBus()
+
+# Cachés por worker, vaciadas por el bus cuando otra parte modifica la entidad
+principal_cache = TTLCache()
+profile_cache = TTLCache()
+
+invalidation_bus.subscribe("user", principal_cache.invalidate)
+invalidation_bus.subscribe("profile", profile_cache.invalidate)
@@ -0,0 +1,298 @@
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.database.connection import engine
+from app.models.outbox_event_model import OutboxCheckpoint, OutboxEvent, OutboxFailure
+from app.services.invalidation_service import invalidation_bus
+from dotenv import load_dotenv
+from typing import Callable, Dict, List, Optional
+import os
+import threading
+import time
+import logging
+
+logger = logging.getLogger("app")
+
+env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
+load_dotenv(env_path)
+
+OUTBOX_DISPATCHER = os.getenv("OUTBOX_DISPATCHER", "true").lower() in ("1", "true", "yes")
+# Nombre del consumidor: los workers con el mismo nombre se reparten la entrega (una vez por evento)
+OUTBOX_CONSUMER = os.getenv("OUTBOX_CONSUMER", "api")
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "500"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "1"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+# Tiempo que se espera un id que falta antes de saltarlo y seguir con los siguientes
+OUTBOX_GAP_TIMEOUT = float(os.getenv("OUTBOX_GAP_TIMEOUT", "5"))
+# Los ids saltados se releen hasta que aparecen (transacción larga) o pasa este tiempo (rollback)
+OUTBOX_SKIPPED_HORIZON = float(os.getenv("OUTBOX_SKIPPED_HORIZON", "3600"))
+OUTBOX_RETENTION_HOURS = float(os.getenv("OUTBOX_RETENTION_HOURS", "24"))
+
+
+def record_event(db: Session, topic: str, entity_id: str, action: str, payload: Optional[dict] = None):
+    """
+    Añade un evento al outbox dentro de la transacción de la sesión: se guarda
+    con el commit del cambio o se descarta con su rollback
+    """
+    db.add(OutboxEvent(topic=topic, entity_id=entity_id, action=action, payload=payload))
+
+
+def record_events(db: Session, events: List[dict]):
+    """
+    Varios eventos con un solo INSERT (p. ej. en el borrado masivo)
+    """
+    if events:
+        db.execute(insert(OutboxEvent), [{"payload": None, **event} for event in events])
+
+
+class OutboxDispatcher:
+    """
+    Entrega los eventos del outbox a los suscriptores del proceso, por lotes y
+    en orden de id. El último id entregado se guarda por consumidor en
+    outbox_checkpoints después de cada lote, así que un evento puede entregarse
+    más de una vez (al menos una vez) pero nunca se pierde. Los suscriptores
+    deben ser idempotentes. Un evento cuyo suscriptor falla OUTBOX_MAX_ATTEMPTS
+    veces se aparta en outbox_failures (con el checkpoint) para no bloquear a
+    los siguientes; desde ahí se puede revisar y volver a encolar.
+
+    Los ids se asignan al insertar pero se ven al hacer commit: un hueco puede
+    ser una transacción que aún no ha terminado. Pasado OUTBOX_GAP_TIMEOUT el
+    checkpoint avanza, pero los ids del hueco se guardan con él (skipped_ids) y
+    se releen en cada lote; si aparecen se entregan fuera de orden.
+    """
+
+    def __init__(
+        self,
+        consumer: str = OUTBOX_CONSUMER,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        poll_interval: float = OUTBOX_POLL_INTERVAL
+    ):
+        self.consumer = consumer
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._subscribers: Dict[str, List[Callable]] = {}
+        self._attempts: Dict[int, int] = {}
+        # Ids que faltan en la secuencia y desde cuándo (pueden ser transacciones sin confirmar)
+        self._gaps: Dict[int, float] = {}
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_cleanup = 0.0
+
+    def subscribe(self, topic: str, callback: Callable):
+        """
+        El callback recibe la fila del evento (id, topic, entity_id, action, payload)
+        """
+        self._subscribers.setdefault(topic, []).append(callback)
+
+    def after_commit(self, topic: str, entity_id: str):
+        """
+        Llamar después del commit: las cachés de este worker se invalidan al momento
+        (lee sus propias escrituras) y el dispatcher se despierta sin esperar al sondeo
+        """
+        invalidation_bus.dispatch_local(topic, entity_id)
+        self._wake.set()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._ensure_checkpoint()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="outbox-dispatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _ensure_checkpoint(self):
+        try:
+            with engine.begin() as connection:
+                exists = connection.execute(
+                    select(OutboxCheckpoint.consumer).where(OutboxCheckpoint.consumer == self.consumer)
+                ).first()
+                if exists is None:
+                    connection.execute(insert(OutboxCheckpoint).values(consumer=self.consumer, last_id=0))
+        except IntegrityError:
+            # Otro worker lo creó a la vez
+            pass
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                delivered = self.dispatch_batch()
+            except Exception as e:
+                logger.error(f"Error entregando eventos del outbox: {str(e)}")
+                delivered = 0
+            try:
+                self._cleanup()
+            except Exception as e:
+                logger.error(f"Error limpiando el outbox: {str(e)}")
+            # Con un lote lleno se sigue sin esperar
+            if delivered < self.batch_size:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def _deliver(self, connection, event) -> bool:
+        """
+        Entrega el evento a sus suscriptores. False si hay que reintentarlo; tras
+        OUTBOX_MAX_ATTEMPTS fallos se guarda en outbox_failures (en la misma
+        transacción que el checkpoint) y se da por entregado.
+        """
+        for callback in self._subscribers.get(event.topic, []) + self._subscribers.get("*", []):
+            try:
+                callback(event)
+            except Exception as e:
+                attempts = self._attempts.get(event.id, 0) + 1
+                self._attempts[event.id] = attempts
+                if attempts < OUTBOX_MAX_ATTEMPTS:
+                    logger.error(f"Error en un suscriptor del outbox (evento {event.id}, intento {attempts}): {str(e)}")
+                    return False
+                logger.error(f"Evento {event.id} apartado en outbox_failures tras {attempts} intentos: {str(e)}")
+                connection.execute(insert(OutboxFailure).values(
+                    consumer=self.consumer,
+                    event_id=event.id,
+                    topic=event.topic,
+                    entity_id=event.entity_id,
+                    action=event.action,
+                    payload=event.payload,
+                    attempts=attempts,
+                    error=str(e)[:500]
+                ))
+                break
+        self._attempts.pop(event.id, None)
+        return True
+
+    def dispatch_batch(self) -> int:
+        """
+        Entrega los eventos saltados que ya han aparecido y el siguiente lote, y
+        avanza el checkpoint. Devuelve los eventos entregados.
+        """
+        with engine.begin() as connection:
+            # El checkpoint bloqueado hace que solo un worker entregue cada lote
+            checkpoint = connection.execute(
+                select(OutboxCheckpoint.last_id, OutboxCheckpoint.skipped_ids)
+                .where(OutboxCheckpoint.consumer == self.consumer)
+                .with_for_update(skip_locked=True)
+            ).first()
+            if checkpoint is None:
+                return 0
+            last_id = checkpoint.last_id
+            skipped = {int(event_id): seen for event_id, seen in (checkpoint.skipped_ids or {}).items()}
+            delivered, skipped_changed = self._deliver_skipped(connection, skipped)
+
+            events = connection.execute(
+                select(OutboxEvent).where(OutboxEvent.id > last_id).order_by(OutboxEvent.id).limit(self.batch_size)
+            ).all()
+            now = time.monotonic()
+            advanced = False
+            for event in events:
+                expected = last_id + 1
+                if event.id != expected:
+                    # Un id anterior puede pertenecer a una transacción que aún no ha
+                    # hecho commit: se espera un poco antes de saltarlo
+                    first_seen = self._gaps.setdefault(expected, now)
+                    if now - first_seen < OUTBOX_GAP_TIMEOUT:
+                        break
+                    missing = list(range(expected, event.id))
+                    logger.warning(f"Outbox ({self.consumer}): se saltan los ids {missing}, se volverán a leer")
+                    skipped.update({missing_id: time.time() for missing_id in missing})
+                    skipped_changed = True
+                if not self._deliver(connection, event):
+                    break
+                last_id = event.id
+                delivered += 1
+                advanced = True
+
+            if advanced or skipped_changed:
+                self._gaps = {gap_id: seen for gap_id, seen in self._gaps.items() if gap_id > last_id}
+                connection.execute(
+                    update(OutboxCheckpoint)
+                    .where(OutboxCheckpoint.consumer == self.consumer)
+                    .values(
+                        last_id=last_id,
+                        skipped_ids={str(event_id): seen for event_id, seen in skipped.items()} or None,
+                        updated_at=func.now()
+                    )
+                )
+        return delivered
+
+    def _deliver_skipped(self, connection, skipped: Dict[int, float]):
+        """
+        Entrega los eventos saltados que ya han hecho commit y olvida los que
+        superan OUTBOX_SKIPPED_HORIZON. Modifica `skipped`; devuelve
+        (eventos entregados, si cambió).
+        """
+        if not skipped:
+            return 0, False
+        delivered = 0
+        changed = False
+        late_events = connection.execute(
+            select(OutboxEvent).where(OutboxEvent.id.in_(list(skipped))).order_by(OutboxEvent.id)
+        ).all()
+        for event in late_events:
+            if not self._deliver(connection, event):
+                break
+            logger.info(f"Outbox ({self.consumer}): entregado el evento saltado {event.id}")
+            del skipped[event.id]
+            delivered += 1
+            changed = True
+
+        expired_before = time.time() - OUTBOX_SKIPPED_HORIZON
+        expired = sorted(event_id for event_id, seen in skipped.items() if seen < expired_before)
+        if expired:
+            logger.warning(f"Outbox ({self.consumer}): ids {expired} no aparecieron en {OUTBOX_SKIPPED_HORIZON} s, se descartan")
+            for event_id in expired:
+                del skipped[event_id]
+            changed = True
+        return delivered, changed
+
+    def _cleanup(self):
+        # Borrar cada 10 minutos los eventos ya entregados a todos los consumidores
+        if time.monotonic() - self._last_cleanup < 600:
+            return
+        self._last_cleanup = time.monotonic()
+        with engine.begin() as connection:
+            delivered_id = connection.execute(select(func.min(OutboxCheckpoint.last_id))).scalar()
+            if delivered_id:
+                connection.execute(
+                    delete(OutboxEvent).where(
+                        OutboxEvent.id <= delivered_id,
+                        OutboxEvent.created_at < datetime.utcnow() - timedelta(hours=OUTBOX_RETENTION_HOURS)
+                    )
+                )
+
+
+def replay_failures(consumer: Optional[str] = None, failure_ids: Optional[List[int]] = None) -> int:
+    """
+    Vuelve a encolar los eventos apartados en outbox_failures como eventos
+    nuevos (todos los consumidores los reciben otra vez) y los quita de la lista.
+    Retorna cuántos se encolaron.
+    """
+    with engine.begin() as connection:
+        query = select(OutboxFailure).order_by(OutboxFailure.id)
+        if consumer is not None:
+            query = query.where(OutboxFailure.consumer == consumer)
+        if failure_ids is not None:
+            query = query.where(OutboxFailure.id.in_(failure_ids))
+        failures = connection.execute(query).all()
+        if not failures:
+            return 0
+        rows = [
+            {"topic": row.topic, "entity_id": row.entity_id, "action": row.action, "payload": row.payload}
+            for row in failures
+        ]
+        connection.execute(insert(OutboxEvent), rows)
+        connection.execute(delete(OutboxFailure).where(OutboxFailure.id.in_([row.id for row in failures])))
+    return len(failures)
+
+
+outbox_dispatcher = OutboxDispatcher()
+
+# Cachés de todos los workers y directorio precalculado (a través del bus de invalidación)
+outbox_dispatcher.subscribe("user", lambda event: invalidation_bus.publish("user", event.entity_id))
+outbox_dispatcher.subscribe("profile", lambda event: invalidation_bus.publish("profile", event.entity_id))
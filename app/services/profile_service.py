@@ -1,32 +1,161 @@
 from fastapi import Depends, UploadFile
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, case, func, or_, select, update
+from sqlalchemy.orm import Session, undefer
+from sqlalchemy.orm.exc import StaleDataError
 from app.database.connection import get_db
-from app.models.profile_model import Profile
+from app.database.statements import PROFILE_BY_USER_ID
+from app.models.profile_model import Profile, last_activity
 from app.models.user_model import User
-from app.schemas.profile_schema import ProfileUpdate
+from app.schemas.profile_schema import ProfileResponse, ProfileUpdate
 from app.services.image_service import ImageService
-from typing import List
+from app.services.storage_service import get_storage, new_image_key, path_for_key, sign_value, verify_signature
+from app.services.image_queue_service import create_process_job, image_queue, set_image_meta
+from app.services.outbox_service import outbox_dispatcher, record_event
+from starlette.concurrency import run_in_threadpool
+from typing import Dict, List, Optional
 import os
-import uuid
-from PIL import Image
-import shutil
 import logging
 
 logger = logging.getLogger("app")
 
+
+class VersionConflictError(ValueError):
+    """El perfil cambió desde la versión que tenía el cliente"""
+
+
 class ProfileService:
-    UPLOAD_DIR = "uploads"
-    ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif"}
-    MAX_SIZE = 5 * 1024 * 1024  # 5MB
+    IMAGE_FIELDS = ["cover_image", "image_1", "image_2", "image_3"]
+    MAX_SIZE = ImageService.MAX_SIZE
+    # Campos que se pueden pedir con ?fields=
+    SELECTABLE_FIELDS = [
+        "id", "user_id", "name", "cover_image", "image_1", "image_2", "image_3",
+        "description", "whatsapp_link", "facebook_link", "image_status",
+        "image_meta", "cover_meta", "version", "created_at", "updated_at",
+    ]
+    LISTING_FIELDS = ["id", "name", "cover_image", "cover_meta"]
+    MAX_BATCH_IDS = 100
+    # Órdenes del listado; cada uno tiene su índice compuesto en profile_model
+    SORTS = {
+        "newest": (Profile.created_at.desc(), Profile.id.desc()),
+        "updated": (last_activity.desc(), Profile.id.desc()),
+        "name": (Profile.name, Profile.id),
+    }
+    # Filtros "tiene / no tiene" del listado
+    FACETS = {
+        "has_cover": Profile.cover_image,
+        "has_whatsapp": Profile.whatsapp_link,
+        "has_facebook": Profile.facebook_link,
+    }
+    MAX_PAGE_SIZE = 100
 
     def __init__(self, db: Session = Depends(get_db)):
         self.db = db
-        # Crear directorio de uploads si no existe
-        if not os.path.exists(self.UPLOAD_DIR):
-            os.makedirs(self.UPLOAD_DIR)
 
     def get_all_profiles(self) -> List[Profile]:
-        return self.db.query(Profile).all()
+        # cover_meta es diferida: se carga en la misma consulta. Mismo orden que el directorio precalculado
+        return (
+            self.db.query(Profile)
+            .options(undefer(Profile.cover_meta))
+            .order_by(Profile.created_at, Profile.id)
+            .all()
+        )
+
+    @classmethod
+    def parse_fields(cls, fields: Optional[str]) -> Optional[List[str]]:
+        """
+        Convierte "name,cover_image" en la lista de columnas a consultar (siempre incluye id)
+        """
+        if not fields:
+            return None
+        requested = ["id"]
+        for field_name in fields.split(","):
+            field_name = field_name.strip()
+            if not field_name or field_name in requested:
+                continue
+            if field_name not in cls.SELECTABLE_FIELDS:
+                raise ValueError(f"Campo no válido: {field_name}")
+            requested.append(field_name)
+        return requested
+
+    @classmethod
+    def parse_ids(cls, ids: Optional[str]) -> Optional[List[str]]:
+        if ids is None:
+            return None
+        id_list = list(dict.fromkeys(i.strip() for i in ids.split(",") if i.strip()))
+        if len(id_list) > cls.MAX_BATCH_IDS:
+            raise ValueError(f"Se pueden pedir como máximo {cls.MAX_BATCH_IDS} perfiles a la vez")
+        return id_list
+
+    def select_profiles(self, fields: List[str], ids: Optional[List[str]] = None) -> List[dict]:
+        """
+        Consulta solo las columnas pedidas, opcionalmente para un conjunto de
+        IDs en una única consulta IN. Respeta el orden de los IDs recibidos.
+        """
+        query = select(*[getattr(Profile, field_name) for field_name in fields])
+        if ids is not None:
+            if not ids:
+                return []
+            query = query.where(Profile.id.in_(ids))
+        rows = [dict(row) for row in self.db.execute(query).mappings()]
+        if ids is None:
+            return rows
+        by_id = {row["id"]: row for row in rows}
+        return [by_id[profile_id] for profile_id in ids if profile_id in by_id]
+
+    def search_profiles(
+        self,
+        fields: List[str],
+        sort: Optional[str] = None,
+        filters: Optional[Dict[str, bool]] = None,
+        limit: int = 20,
+        offset: int = 0,
+        with_facets: bool = False
+    ) -> dict:
+        """
+        Listado filtrado y ordenado en el servidor. Devuelve solo la página pedida,
+        el total de resultados y, si se piden (with_facets), cuántos de ellos
+        cumplen cada filtro; los recuentos salen de una única consulta agregada.
+        """
+        if sort is not None and sort not in self.SORTS:
+            raise ValueError(f"Orden no válido: {sort}. Opciones: {', '.join(self.SORTS)}")
+        if limit > self.MAX_PAGE_SIZE:
+            raise ValueError(f"Se pueden pedir como máximo {self.MAX_PAGE_SIZE} perfiles por página")
+
+        def present(column):
+            return and_(column.isnot(None), column != "")
+
+        conditions = []
+        for name, wanted in (filters or {}).items():
+            if wanted is None:
+                continue
+            column = self.FACETS[name]
+            conditions.append(present(column) if wanted else or_(column.is_(None), column == ""))
+
+        query = (
+            select(*[getattr(Profile, field_name) for field_name in fields])
+            .where(*conditions)
+            .order_by(*self.SORTS[sort or "newest"])
+            .limit(limit)
+            .offset(offset)
+        )
+        items = [dict(row) for row in self.db.execute(query).mappings()]
+
+        # Los recuentos por filtro recorren todas las filas que cumplen los filtros:
+        # solo se calculan cuando el cliente los va a mostrar
+        facet_columns = [
+            func.sum(case((present(column), 1), else_=0)).label(name)
+            for name, column in self.FACETS.items()
+        ] if with_facets else []
+        counts = self.db.execute(
+            select(func.count().label("total"), *facet_columns).select_from(Profile).where(*conditions)
+        ).one()
+        return {
+            "items": items,
+            "total": counts.total,
+            "facets": {name: counts._mapping[name] or 0 for name in self.FACETS} if with_facets else None,
+            "limit": limit,
+            "offset": offset,
+        }
 
     def get_profile_by_user_id(self, user_id: str) -> Profile:
         """
@@ -35,7 +164,7 @@ class ProfileService:
         logger.info(f"Buscando perfil para user_id: {user_id}")
         
         # Intentar encontrar el perfil por user_id
-        profile = self.db.query(Profile).filter(Profile.user_id == user_id).first()
+        profile = self.db.execute(PROFILE_BY_USER_ID, {"user_id": user_id}).scalars().first()
         
         if profile:
             logger.info(f"Perfil encontrado - ID: {profile.id}, User ID: {profile.user_id}, Name: {profile.name}")
@@ -58,87 +187,207 @@ class ProfileService:
         return profile
 
     def get_profile_by_id(self, profile_id: str) -> Profile:
-        profile = self.db.query(Profile).filter(Profile.id == profile_id).first()
+        # Si el perfil ya está cargado en la sesión no se repite la consulta
+        profile = self.db.get(Profile, profile_id)
         if not profile:
             raise ValueError(f"No se encontró el perfil con ID {profile_id}")
         return profile
 
-    async def process_image(self, file: UploadFile) -> str:
+    async def store_image(self, file: UploadFile) -> str:
         """
-        Procesa y guarda una imagen, retornando su URL relativa
+        Valida y guarda la imagen subida tal cual, retornando su URL relativa.
+        La optimización se hace después en la cola de imágenes.
         """
-        # Verificar extensión
-        ext = os.path.splitext(file.filename)[1].lower()
-        if ext not in self.ALLOWED_EXTENSIONS:
-            raise ValueError("Tipo de archivo no permitido")
+        # Validar tamaño y formato real del archivo (magic bytes, no la extensión del nombre)
+        source, ext = await ImageService.read_upload(file)
 
         # Generar nombre único
-        filename = f"{uuid.uuid4().hex}{ext}"
-        filepath = os.path.join(self.UPLOAD_DIR, filename)
+        filename = new_image_key(ext)
 
-        # Guardar archivo
-        try:
-            contents = await file.read()
-            with open(filepath, "wb") as buffer:
-                buffer.write(contents)
-
-            # Optimizar imagen
-            with Image.open(filepath) as img:
-                # Redimensionar si es muy grande
-                if img.size[0] > 1920 or img.size[1] > 1080:
-                    img.thumbnail((1920, 1080))
-                # Guardar con compresión
-                img.save(filepath, optimize=True, quality=85)
-        except Exception as e:
-            # Si hay error, eliminar el archivo si se creó
-            if os.path.exists(filepath):
-                os.remove(filepath)
-            raise ValueError(f"Error al procesar la imagen: {str(e)}")
+        with source:
+            # Solo se leen las cabeceras: la decodificación completa queda para la cola
+            await run_in_threadpool(ImageService.check_image, source, ext)
+            try:
+                await run_in_threadpool(
+                    get_storage().save, filename, source, ImageService.content_type_for(ext)
+                )
+            except Exception as e:
+                raise ValueError(f"Error al guardar la imagen: {str(e)}")
 
-        return f"/uploads/{filename}"
+        return path_for_key(filename)
 
     async def delete_image(self, image_path: str) -> bool:
         """
-        Elimina una imagen del sistema de archivos
+        Elimina una imagen del almacenamiento
         """
-        if not image_path or not image_path.startswith("/uploads/"):
-            return True
-
-        filepath = image_path.replace("/uploads/", "")
-        full_path = os.path.join(self.UPLOAD_DIR, filepath)
+        return await ImageService.delete_image(image_path)
 
+    async def store_images(self, profile_data: ProfileUpdate, files: Dict[str, Optional[UploadFile]]) -> None:
+        """
+        Guarda las imágenes subidas y asigna sus rutas a profile_data.
+        Si alguna falla, se eliminan las que ya se habían guardado.
+        """
+        stored = []
         try:
-            if os.path.exists(full_path):
-                os.remove(full_path)
-            return True
+            for field_name, file in files.items():
+                if file:
+                    image_path = await self.store_image(file)
+                    stored.append(image_path)
+                    setattr(profile_data, field_name, image_path)
         except Exception:
-            logger.error(f"Error al eliminar imagen: {full_path}")
-            return False
+            for image_path in stored:
+                await self.delete_image(image_path)
+            raise
+
+    def create_image_upload(self, profile_id: str, image_type: str, content_type: str) -> dict:
+        """
+        Genera una URL firmada para que el cliente suba una imagen directamente al almacenamiento
+        """
+        if image_type not in self.IMAGE_FIELDS:
+            raise ValueError("Tipo de imagen no válido")
+        ext = ImageService.CONTENT_TYPES.get(content_type)
+        if not ext:
+            raise ValueError("Tipo de archivo no permitido")
+
+        key = new_image_key(ext)
+        upload = get_storage().presigned_upload(key, content_type)
+        return {
+            "key": key,
+            "upload_token": sign_value(f"{profile_id}:{image_type}:{key}"),
+            "url": upload.url,
+            "method": upload.method,
+            "headers": upload.headers,
+            "expires_in": upload.expires_in,
+        }
+
+    async def confirm_image_upload(self, profile_id: str, image_type: str, key: str, upload_token: str) -> ProfileResponse:
+        """
+        Asocia al perfil una imagen subida directamente con una URL firmada.
+        Solo se leen los metadatos del objeto y sus primeros bytes, para
+        comprobar que es una imagen del formato que se firmó.
+        """
+        if image_type not in self.IMAGE_FIELDS:
+            raise ValueError("Tipo de imagen no válido")
+        if not verify_signature(f"{profile_id}:{image_type}:{key}", upload_token):
+            raise ValueError("Token de subida no válido")
+
+        stored = await run_in_threadpool(get_storage().stat, key)
+        if stored is None:
+            raise ValueError("La imagen todavía no se ha subido")
+        if stored.size > self.MAX_SIZE:
+            await run_in_threadpool(get_storage().delete, key)
+            raise ValueError("La imagen supera el tamaño máximo permitido")
+        header = await run_in_threadpool(get_storage().read_head, key, ImageService.SNIFF_SIZE)
+        ext = ImageService.sniff_extension(header)
+        if ext is None or ext != os.path.splitext(key)[1]:
+            await run_in_threadpool(get_storage().delete, key)
+            raise ValueError("Tipo de archivo no permitido")
 
-    async def update_profile(self, profile_id: str, profile_data: ProfileUpdate) -> Profile:
         profile = self.get_profile_by_id(profile_id)
-        
-        # Lista de campos de imagen
-        image_fields = ['cover_image', 'image_1', 'image_2', 'image_3']
+        old_image = getattr(profile, image_type)
+        setattr(profile, image_type, path_for_key(key))
+        job_id = create_process_job(self.db, profile, image_type, path_for_key(key)).id
+        record_event(self.db, "profile", profile_id, "updated", {"fields": [image_type]})
+        self.db.flush()
+        response = ProfileResponse.model_validate(profile)
+        self.db.commit()
+        image_queue.enqueue(job_id)
+        outbox_dispatcher.after_commit("profile", profile_id)
+
+        if old_image and old_image != path_for_key(key):
+            await self.delete_image(old_image)
+        return response
+
+    async def update_profile(self, profile_id: str, profile_data: ProfileUpdate) -> ProfileResponse:
+        profile = self.get_profile_by_id(profile_id)
         
         # Procesar cada campo
         update_data = profile_data.model_dump(exclude_unset=True)
+        job_ids = []
+        new_images = []
+        old_images = []
         for field_name, value in update_data.items():
             # Si es un campo de imagen y tiene un valor nuevo
-            if field_name in image_fields and value is not None:
-                # Eliminar imagen anterior si existe
+            if field_name in self.IMAGE_FIELDS and value is not None:
+                # La imagen anterior se elimina cuando el cambio ya está guardado
                 old_image = getattr(profile, field_name)
-                if old_image:
-                    await self.delete_image(old_image)
+                if old_image and old_image != value:
+                    old_images.append(old_image)
+                new_images.append(value)
+                # La imagen nueva se optimiza en segundo plano
+                job_ids.append(create_process_job(self.db, profile, field_name, value).id)
+            elif field_name in self.IMAGE_FIELDS:
+                set_image_meta(profile, field_name, None)
             
             # Actualizar el campo
             setattr(profile, field_name, value)
+        record_event(self.db, "profile", profile_id, "updated", {"fields": sorted(update_data)})
         
+        try:
+            # Los valores generados por la base vuelven con el UPDATE: no hace falta refresh
+            self.db.flush()
+            response = ProfileResponse.model_validate(profile)
+            self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            for image_path in new_images:
+                await self.delete_image(image_path)
+            if isinstance(e, StaleDataError):
+                raise VersionConflictError("El perfil fue modificado por otra petición")
+            raise
+        for job_id in job_ids:
+            image_queue.enqueue(job_id)
+        outbox_dispatcher.after_commit("profile", profile_id)
+        for image_path in old_images:
+            await self.delete_image(image_path)
+        return response
+
+    def patch_profile(self, profile_id: str, data: dict, expected_version: Optional[int] = None, owner_id: Optional[str] = None):
+        """
+        Actualiza solo los campos indicados con un único UPDATE ... RETURNING.
+        Con expected_version solo se aplica si el perfil sigue en esa versión;
+        con owner_id, solo si el perfil pertenece a ese usuario.
+        """
+        conditions = [Profile.id == profile_id]
+        if expected_version is not None:
+            conditions.append(Profile.version == expected_version)
+        if owner_id is not None:
+            conditions.append(Profile.user_id == owner_id)
+
+        statement = (
+            update(Profile)
+            .where(*conditions)
+            .values(**data, version=Profile.version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        returning = self.db.get_bind().dialect.update_returning
+        if returning:
+            statement = statement.returning(*Profile.__table__.c)
+        result = self.db.execute(statement)
+        row = result.first() if returning else None
+        updated = row is not None if returning else result.rowcount == 1
+
+        if not updated:
+            self.db.rollback()
+            # Solo en el caso de fallo se consulta el motivo
+            current = self.db.execute(
+                select(Profile.user_id, Profile.version).where(Profile.id == profile_id)
+            ).first()
+            if current is None:
+                raise ValueError(f"No se encontró el perfil con ID {profile_id}")
+            if owner_id is not None and current.user_id != owner_id:
+                raise PermissionError("No tienes permisos para actualizar este perfil")
+            raise VersionConflictError("El perfil fue modificado por otra petición")
+
+        if not returning:
+            # Bases sin UPDATE ... RETURNING (MySQL): leer la fila en la misma transacción
+            row = self.db.execute(select(*Profile.__table__.c).where(Profile.id == profile_id)).first()
+        record_event(self.db, "profile", profile_id, "updated", {"fields": sorted(data)})
         self.db.commit()
-        self.db.refresh(profile)
-        return profile
+        outbox_dispatcher.after_commit("profile", profile_id)
+        return row
 
-    async def update_profile_image(self, profile_id: str, image_type: str, file: UploadFile) -> Profile:
+    async def update_profile_image(self, profile_id: str, image_type: str, file: UploadFile) -> ProfileResponse:
         """
         Actualiza una imagen del perfil (cover_image, image_1, image_2, image_3)
         """
@@ -147,8 +396,7 @@ class ProfileService:
             raise ValueError("Perfil no encontrado")
 
         # Verificar tipo de imagen válido
-        valid_types = ["cover_image", "image_1", "image_2", "image_3"]
-        if image_type not in valid_types:
+        if image_type not in self.IMAGE_FIELDS:
             raise ValueError("Tipo de imagen no válido")
 
         # Eliminar imagen anterior si existe
@@ -157,9 +405,13 @@ class ProfileService:
             await ImageService.delete_image(old_image)
 
         # Guardar nueva imagen
-        image_url = await ImageService.save_image(file)
+        image_url, meta = await ImageService.save_image(file)
         setattr(profile, image_type, image_url)
+        set_image_meta(profile, image_type, meta)
+        record_event(self.db, "profile", profile_id, "updated", {"fields": [image_type]})
 
+        self.db.flush()
+        response = ProfileResponse.model_validate(profile)
         self.db.commit()
-        self.db.refresh(profile)
-        return profile 
\ No newline at end of file
+        outbox_dispatcher.after_commit("profile", profile_id)
+        return response
\ No newline at end of file
@@ -0,0 +1,185 @@
+from collections import Counter
+from contextvars import ContextVar
+from dotenv import load_dotenv
+from typing import List, Optional, Tuple
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+import logging
+
+logger = logging.getLogger("app")
+
+env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
+load_dotenv(env_path)
+
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "flamegraphs")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "100"))
+# Reglas de muestreo automático: "GET /api/profiles=0.01,PUT /api/profiles/me=0.1"
+PROFILE_SAMPLE_RULES = os.getenv("PROFILE_SAMPLE_RULES", "")
+
+
+def parse_rules(rules: str) -> List[Tuple[str, str, float]]:
+    parsed = []
+    for rule in rules.split(","):
+        rule = rule.strip()
+        if not rule:
+            continue
+        target, _, rate = rule.rpartition("=")
+        method, _, path_prefix = target.strip().partition(" ")
+        parsed.append((method.upper(), path_prefix.strip(), float(rate)))
+    return parsed
+
+
+SAMPLE_RULES = parse_rules(PROFILE_SAMPLE_RULES)
+
+
+def matches_rule(method: str, path: str, rules: List[Tuple[str, str, float]] = SAMPLE_RULES) -> bool:
+    """
+    Decide si una petición se perfila por las reglas de muestreo (ruta y porcentaje)
+    """
+    for rule_method, path_prefix, rate in rules:
+        if rule_method in (method, "*") and path.startswith(path_prefix):
+            return random.random() < rate
+    return False
+
+
+# Petición que se está perfilando; anyio copia el contexto a los hilos del threadpool
+profiled_request: ContextVar[Optional["StackSampler"]] = ContextVar("profiled_request", default=None)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _is_idle(frame) -> bool:
+    # Hilos parados: el bucle de eventos esperando en select y los hilos del pool esperando trabajo
+    code = frame.f_code
+    filename = os.path.basename(code.co_filename)
+    if filename == "selectors.py" and code.co_name == "select":
+        return True
+    if filename == "threading.py" and code.co_name == "wait":
+        caller = frame.f_back
+        while caller is not None:
+            if os.path.basename(caller.f_code.co_filename) == "queue.py" and caller.f_code.co_name == "get":
+                return True
+            caller = caller.f_back
+    return False
+
+
+class StackSampler:
+    """
+    Toma muestras periódicas de las pilas de los hilos que ejecutan la petición
+    perfilada y las acumula en formato "collapsed" (hilo;marco;marco N) para
+    flamegraph.pl o speedscope. Las demás peticiones concurrentes y los hilos de
+    fondo (cola de imágenes, outbox...) no aparecen en el perfil.
+    """
+
+    def __init__(self, root: str = "", interval_ms: float = PROFILE_INTERVAL_MS):
+        # Marco raíz común (p. ej. "GET /api/profiles") para saber de qué petición es el perfil
+        self.root = root.replace(" ", "_").replace(";", ":")
+        self.interval = interval_ms / 1000
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._loop_thread: Optional[int] = None
+        self._request_frame = None
+
+    def start(self, request_frame=None):
+        """
+        Llamar desde la corrutina de la petición, en el hilo del bucle de eventos:
+        request_frame es su marco, con el que se reconocen sus muestras en ese hilo
+        """
+        self._loop_thread = threading.get_ident()
+        self._request_frame = request_frame
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _in_request(self, thread_id: int, frame) -> bool:
+        """
+        El hilo está ejecutando código de la petición: en el bucle de eventos, si
+        su corrutina está en la pila; en el threadpool, si anyio corre la función
+        con el contexto de la petición
+        """
+        while frame is not None:
+            if thread_id == self._loop_thread:
+                if frame is self._request_frame:
+                    return True
+            elif frame.f_code.co_name == "run" and "anyio" in frame.f_code.co_filename:
+                context = frame.f_locals.get("context")
+                return context is not None and context.get(profiled_request) is self
+            frame = frame.f_back
+        return False
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if _is_idle(frame) or not self._in_request(thread_id, frame):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)).replace(" ", "_"))
+                if self.root:
+                    stack.append(self.root)
+                self.samples[";".join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+def new_profile_id() -> str:
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+
+def _profile_path(profile_id: str) -> str:
+    # El id lo generamos nosotros; se filtra por si llega desde una URL
+    safe_id = "".join(ch for ch in profile_id if ch.isalnum() or ch == "-")
+    return os.path.join(PROFILE_DIR, f"{safe_id}.collapsed")
+
+
+def save_profile(profile_id: str, sampler: StackSampler) -> str:
+    """
+    Guarda las muestras en PROFILE_DIR y conserva solo los PROFILE_MAX_FILES más recientes
+    """
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    file_path = _profile_path(profile_id)
+    with open(file_path, "w", encoding="utf-8") as f:
+        f.write(sampler.collapsed())
+
+    files = sorted(list_profiles())
+    for old_id in files[:-PROFILE_MAX_FILES]:
+        try:
+            os.remove(_profile_path(old_id))
+        except OSError:
+            pass
+    logger.info(f"Perfil guardado: {file_path} ({sum(sampler.samples.values())} muestras)")
+    return file_path
+
+
+def list_profiles() -> List[str]:
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    return sorted(
+        (name[:-len(".collapsed")] for name in os.listdir(PROFILE_DIR) if name.endswith(".collapsed")),
+        reverse=True
+    )
+
+
+def read_profile(profile_id: str) -> str:
+    file_path = _profile_path(profile_id)
+    if not os.path.exists(file_path):
+        raise ValueError("Perfil no encontrado")
+    with open(file_path, "r", encoding="utf-8") as f:
+        return f.read()
@@ -0,0 +1,141 @@
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+from app.database.connection import engine
+from app.models.token_revocation_model import TokenRevocation
+from app.services.auth_service import ACCESS_TOKEN_EXPIRE_MINUTES
+from app.services.invalidation_service import invalidation_bus
+from dotenv import load_dotenv
+from typing import Dict, Optional
+import os
+import threading
+import time
+import logging
+
+logger = logging.getLogger("app")
+
+env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
+load_dotenv(env_path)
+
+# Cada cuánto se leen las revocaciones nuevas si no llega aviso por el bus
+REVOCATION_REFRESH_SECONDS = float(os.getenv("REVOCATION_REFRESH_SECONDS", "5"))
+
+
+def revoke_token(db: Session, jti: str, expires_at: float):
+    """
+    Revoca un token concreto. Se guarda con el commit de la sesión.
+    """
+    db.add(TokenRevocation(kind="token", value=jti, expires_at=expires_at))
+
+
+def revoke_user_tokens(db: Session, user_id: str):
+    """
+    Revoca todos los tokens del usuario emitidos hasta ahora (cambio de
+    contraseña, borrado del usuario...). Se guarda con el commit de la sesión.
+    """
+    now = time.time()
+    db.add(TokenRevocation(
+        kind="user",
+        value=user_id,
+        not_before=now,
+        expires_at=now + ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    ))
+
+
+class RevocationList:
+    """
+    Copia en memoria de token_revocations para comprobar cada petición sin ir a
+    la base: un conjunto de jti revocados y la marca "emitidos antes de" de cada
+    usuario. Se actualiza de forma incremental por id.
+    """
+
+    def __init__(self, refresh_seconds: float = REVOCATION_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self.last_id = 0
+        # jti -> caducidad; usuario -> marca not_before
+        self._tokens: Dict[str, float] = {}
+        self._users: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_cleanup = 0.0
+
+    def is_revoked(self, jti: Optional[str], user_id: Optional[str], issued_at: Optional[float]) -> bool:
+        if jti and jti in self._tokens:
+            return True
+        watermark = self._users.get(user_id) if user_id else None
+        return watermark is not None and (issued_at is None or issued_at < watermark)
+
+    def refresh(self):
+        """
+        Lee las revocaciones nuevas. Los ids pueden confirmarse fuera de orden:
+        se vuelve a leer una ventana pequeña (aplicarlas dos veces no cambia nada).
+        """
+        lookback = 100
+        now = time.time()
+        with engine.connect() as connection:
+            rows = connection.execute(
+                select(TokenRevocation)
+                .where(TokenRevocation.id > self.last_id - lookback, TokenRevocation.expires_at > now)
+                .order_by(TokenRevocation.id)
+            ).all()
+        with self._lock:
+            for row in rows:
+                if row.kind == "token":
+                    self._tokens[row.value] = row.expires_at
+                else:
+                    self._users[row.value] = max(self._users.get(row.value, 0), row.not_before)
+                self.last_id = max(self.last_id, row.id)
+            # Olvidar las entradas que ya no afectan a ningún token vigente
+            expired_before = now - ACCESS_TOKEN_EXPIRE_MINUTES * 60
+            self._tokens = {jti: expires_at for jti, expires_at in self._tokens.items() if expires_at > now}
+            self._users = {user_id: mark for user_id, mark in self._users.items() if mark > expired_before}
+
+    def after_commit(self):
+        """
+        Llamar después de guardar una revocación: el bus la aplica en este worker
+        al momento (suscriptor local) y avisa a los demás
+        """
+        invalidation_bus.publish("revocation", "")
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.refresh()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="revocations", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.refresh_seconds):
+            try:
+                self.refresh()
+                self._cleanup()
+            except Exception as e:
+                logger.error(f"Error actualizando las revocaciones de tokens: {str(e)}")
+
+    def _cleanup(self):
+        # Borrar cada 10 minutos las filas que ya no afectan a ningún token
+        if time.monotonic() - self._last_cleanup < 600:
+            return
+        self._last_cleanup = time.monotonic()
+        with engine.begin() as connection:
+            connection.execute(delete(TokenRevocation).where(TokenRevocation.expires_at < time.time()))
+
+
+revocation_list = RevocationList()
+
+
+def _on_revocation(_: str):
+    try:
+        revocation_list.refresh()
+    except Exception as e:
+        logger.error(f"Error actualizando las revocaciones de tokens: {str(e)}")
+
+
+invalidation_bus.subscribe("revocation", _on_revocation)
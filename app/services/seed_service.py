@@ -0,0 +1,173 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+from passlib.context import CryptContext
+from PIL import Image, ImageDraw
+from app.database.connection import engine
+from app.models.profile_model import Profile
+from app.models.user_model import User
+from app.services.storage_service import get_storage, new_image_key, path_for_key
+from typing import List, Optional
+import io
+import random
+import time
+import unicodedata
+import uuid
+import logging
+
+logger = logging.getLogger("app")
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+FIRST_NAMES = [
+    "María", "José", "Ana", "Luis", "Carmen", "Juan", "Laura", "Carlos", "Lucía", "Miguel",
+    "Sofía", "Javier", "Elena", "David", "Paula", "Daniel", "Marta", "Pablo", "Sara", "Andrés",
+    "Valentina", "Diego", "Camila", "Alejandro", "Isabel", "Fernando", "Rosa", "Manuel", "Julia", "Raúl",
+]
+LAST_NAMES = [
+    "García", "Rodríguez", "González", "Fernández", "López", "Martínez", "Sánchez", "Pérez", "Gómez", "Martín",
+    "Jiménez", "Ruiz", "Hernández", "Díaz", "Moreno", "Muñoz", "Álvarez", "Romero", "Alonso", "Gutiérrez",
+    "Navarro", "Torres", "Domínguez", "Vázquez", "Ramos", "Gil", "Ramírez", "Serrano", "Blanco", "Castro",
+]
+ORGANIZATIONS = [
+    "Fundación", "Comedor Solidario", "Asociación", "Banco de Alimentos", "Refugio", "Centro Comunitario",
+    "Red de Voluntarios", "Hogar", "Proyecto", "Colectivo",
+]
+CAUSES = [
+    "ayudamos a familias en situación vulnerable", "recogemos ropa y alimentos para el barrio",
+    "acompañamos a personas mayores que viven solas", "damos clases de apoyo a niños y niñas",
+    "rescatamos y damos en adopción animales abandonados", "ofrecemos orientación laboral gratuita",
+    "organizamos comidas calientes cada semana", "apoyamos a personas migrantes recién llegadas",
+]
+CALLS_TO_ACTION = [
+    "Buscamos voluntarios los fines de semana.", "Cualquier donación nos ayuda a seguir.",
+    "Escríbenos si quieres colaborar.", "Necesitamos manos para la próxima campaña.", "",
+]
+COLORS = ["#e57373", "#f06292", "#ba68c8", "#7986cb", "#4fc3f7", "#4db6ac", "#81c784", "#ffb74d", "#a1887f", "#90a4ae"]
+
+
+@dataclass
+class SeedReport:
+    users: int = 0
+    images: int = 0
+    seconds: float = 0.0
+
+
+def _ascii_slug(value: str) -> str:
+    normalized = unicodedata.normalize("NFKD", value).encode("ascii", "ignore").decode()
+    return "".join(ch for ch in normalized.lower() if ch.isalnum())
+
+
+def generate_placeholder_images(count: int, rng: random.Random) -> List[str]:
+    """
+    Crea imágenes de muestra en el almacenamiento y retorna sus claves. Son
+    plantillas: cada perfil recibe su propia copia (ver _copy_image), porque
+    al cambiar o borrar una imagen la aplicación borra el archivo.
+    """
+    storage = get_storage()
+    paths = []
+    for index in range(count):
+        image = Image.new("RGB", (800, 600), rng.choice(COLORS))
+        draw = ImageDraw.Draw(image)
+        for _ in range(6):
+            x, y = rng.randint(0, 700), rng.randint(0, 500)
+            size = rng.randint(40, 200)
+            draw.ellipse((x, y, x + size, y + size), fill=rng.choice(COLORS))
+        draw.text((20, 20), f"Muestra {index + 1}", fill="white")
+
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", quality=80, optimize=True)
+        buffer.seek(0)
+        key = new_image_key(".jpg")
+        storage.save(key, buffer, "image/jpeg")
+        paths.append(key)
+    return paths
+
+
+def _copy_image(templates: List[str], rng: random.Random) -> str:
+    # En local es un enlace duro: no ocupa más espacio
+    key = new_image_key(".jpg")
+    get_storage().copy(rng.choice(templates), key)
+    return path_for_key(key)
+
+
+def seed_profiles(
+    count: int,
+    batch_size: int = 5000,
+    image_count: int = 20,
+    password: str = "secret123",
+    seed: Optional[int] = None,
+    cover_ratio: float = 0.7,
+    contact_ratio: float = 0.5
+) -> SeedReport:
+    """
+    Inserta count usuarios con su perfil en lotes (un INSERT de varias filas por
+    tabla y lote), sin pasar por UserService: la contraseña se hashea una sola vez
+    y todos los usuarios generados la comparten. Las imágenes se copian de
+    image_count plantillas, un archivo por perfil y campo.
+    """
+    started = time.monotonic()
+    rng = random.Random(seed)
+    report = SeedReport()
+
+    password_hash = pwd_context.hash(password)
+    templates = generate_placeholder_images(image_count, rng) if image_count else []
+
+    # Sufijo de la ejecución para que los username y email no choquen con otras cargas
+    run = uuid.uuid4().hex[:6]
+    now = datetime.utcnow()
+
+    try:
+        for start in range(0, count, batch_size):
+            users, profiles = [], []
+            for index in range(start, min(start + batch_size, count)):
+                first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+                username = f"{_ascii_slug(first)}.{_ascii_slug(last)}.{run}{index}"
+                user_id = uuid.uuid4().hex
+                created_at = now - timedelta(seconds=rng.randint(0, 365 * 24 * 3600))
+                updated_at = created_at + timedelta(seconds=rng.randint(0, int((now - created_at).total_seconds()))) if rng.random() < 0.4 else None
+
+                cover = _copy_image(templates, rng) if templates and rng.random() < cover_ratio else None
+                gallery = [_copy_image(templates, rng) if templates and rng.random() < cover_ratio / 2 else None for _ in range(3)]
+                report.images += sum(1 for value in [cover, *gallery] if value)
+                image_status = {name: "ready" for name, value in zip(("cover_image", "image_1", "image_2", "image_3"), [cover, *gallery]) if value}
+
+                users.append({
+                    "id": user_id,
+                    "username": username,
+                    "email": f"{username}@seed.example.com",
+                    "password": password_hash,
+                    "is_superuser": False,
+                    "created_at": created_at,
+                    "updated_at": updated_at,
+                })
+                profiles.append({
+                    "id": user_id,
+                    "user_id": user_id,
+                    "name": f"{rng.choice(ORGANIZATIONS)} {first} {last}",
+                    "description": f"{rng.choice(CAUSES).capitalize()}. {rng.choice(CALLS_TO_ACTION)}".strip(),
+                    "cover_image": cover,
+                    "image_1": gallery[0],
+                    "image_2": gallery[1],
+                    "image_3": gallery[2],
+                    "image_status": image_status or None,
+                    "whatsapp_link": f"https://wa.me/34{rng.randint(600000000, 699999999)}" if rng.random() < contact_ratio else None,
+                    "facebook_link": f"https://facebook.com/{username}" if rng.random() < contact_ratio else None,
+                    "version": 1,
+                    "created_at": created_at,
+                    "updated_at": updated_at,
+                })
+
+            # Un lote por transacción: si se interrumpe, los lotes anteriores quedan guardados
+            with engine.begin() as connection:
+                connection.execute(insert(User.__table__), users)
+                connection.execute(insert(Profile.__table__), profiles)
+            report.users += len(users)
+            logger.info(f"Carga de datos: {report.users}/{count} usuarios")
+    finally:
+        # Las copias no dependen de las plantillas
+        for key in templates:
+            get_storage().delete(key)
+
+    report.seconds = time.monotonic() - started
+    return report
@@ -0,0 +1,441 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import BinaryIO, Iterator, Optional
+from urllib.parse import quote, urlencode, urlparse
+from xml.etree import ElementTree
+from dotenv import load_dotenv
+import hashlib
+import hmac
+import httpx
+import io
+import os
+import shutil
+import time
+import uuid
+import logging
+
+logger = logging.getLogger("app")
+
+env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
+load_dotenv(env_path)
+
+# Prefijo público con el que se guardan las rutas de imágenes en la base de datos
+PUBLIC_PREFIX = "/uploads/"
+
+# Configuración del almacenamiento
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+STORAGE_SIGNING_KEY = os.getenv("STORAGE_SIGNING_KEY") or os.getenv("SECRET_KEY", "tu_clave_secreta_aqui")
+PRESIGNED_EXPIRE_SECONDS = int(os.getenv("PRESIGNED_EXPIRE_SECONDS", "900"))
+
+S3_BUCKET = os.getenv("S3_BUCKET")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")  # Ej: http://localhost:9000 para MinIO
+S3_ACCESS_KEY = os.getenv("S3_ACCESS_KEY")
+S3_SECRET_KEY = os.getenv("S3_SECRET_KEY")
+S3_REGION = os.getenv("S3_REGION", "us-east-1")
+S3_PUBLIC_URL = os.getenv("S3_PUBLIC_URL")  # Opcional: URL pública (CDN o bucket público)
+
+
+def key_from_path(image_path: str) -> Optional[str]:
+    """
+    Convierte una ruta pública (/uploads/xxx) en la clave del almacenamiento
+    """
+    if not image_path or not image_path.startswith(PUBLIC_PREFIX):
+        return None
+    return image_path[len(PUBLIC_PREFIX):]
+
+
+def path_for_key(key: str) -> str:
+    """
+    Convierte una clave del almacenamiento en la ruta pública guardada en la base de datos
+    """
+    return f"{PUBLIC_PREFIX}{key}"
+
+
+def sharded_key(filename: str) -> str:
+    """
+    Reparte los archivos en subdirectorios según el hash del nombre: ab/cd/<nombre>
+    """
+    digest = hashlib.md5(filename.encode()).hexdigest()
+    return f"{digest[:2]}/{digest[2:4]}/{filename}"
+
+
+def new_image_key(ext: str) -> str:
+    """
+    Genera una clave única para una imagen nueva, ya repartida en subdirectorios
+    """
+    return sharded_key(f"{uuid.uuid4().hex}{ext}")
+
+
+def sign_value(value: str) -> str:
+    """
+    Firma un valor con HMAC-SHA256 usando la clave de firmado del almacenamiento
+    """
+    return hmac.new(STORAGE_SIGNING_KEY.encode(), value.encode(), hashlib.sha256).hexdigest()
+
+
+def verify_signature(value: str, signature: str) -> bool:
+    return hmac.compare_digest(sign_value(value), signature or "")
+
+
+@dataclass
+class StoredObject:
+    key: str
+    size: int
+    modified_at: datetime
+
+
+@dataclass
+class PresignedUpload:
+    url: str
+    method: str = "PUT"
+    headers: dict = field(default_factory=dict)
+    expires_in: int = PRESIGNED_EXPIRE_SECONDS
+
+
+class StorageBackend(ABC):
+    """
+    Interfaz común para los backends de almacenamiento de imágenes.
+    Las claves son rutas relativas (ej: "abc123.jpg"); en la base de datos
+    se guardan como rutas públicas "/uploads/<clave>".
+    """
+
+    @abstractmethod
+    def save(self, key: str, fileobj: BinaryIO, content_type: Optional[str] = None) -> int:
+        """Guarda el contenido y retorna el número de bytes escritos"""
+
+    @abstractmethod
+    def open(self, key: str) -> BinaryIO:
+        """Abre el objeto para lectura"""
+
+    @abstractmethod
+    def delete(self, key: str) -> bool:
+        """Elimina el objeto. Retorna False si no existía"""
+
+    @abstractmethod
+    def stat(self, key: str) -> Optional[StoredObject]:
+        """Retorna los metadatos del objeto o None si no existe"""
+
+    def exists(self, key: str) -> bool:
+        return self.stat(key) is not None
+
+    def read_head(self, key: str, length: int) -> bytes:
+        """Primeros `length` bytes del objeto (p. ej. para comprobar su formato)"""
+        with self.open(key) as source:
+            return source.read(length)
+
+    def copy(self, source_key: str, target_key: str) -> None:
+        """Copia un objeto dentro del mismo almacenamiento (con fecha de modificación actual)"""
+        content_type = None
+        if "." in source_key:
+            ext = source_key.rsplit(".", 1)[-1].lower()
+            content_type = "image/jpeg" if ext in ("jpg", "jpeg") else f"image/{ext}"
+        with self.open(source_key) as source:
+            self.save(target_key, source, content_type)
+
+    @abstractmethod
+    def iter_objects(self, prefix: str = "") -> Iterator[StoredObject]:
+        """Recorre los objetos almacenados sin cargarlos todos en memoria"""
+
+    @abstractmethod
+    def presigned_upload(self, key: str, content_type: str, expires_in: int = PRESIGNED_EXPIRE_SECONDS) -> PresignedUpload:
+        """URL firmada para que el cliente suba el archivo directamente"""
+
+    @abstractmethod
+    def presigned_download_url(self, key: str, expires_in: int = PRESIGNED_EXPIRE_SECONDS) -> str:
+        """URL firmada para que el cliente descargue el archivo directamente"""
+
+
+class LocalStorage(StorageBackend):
+    """
+    Almacenamiento en el sistema de archivos local. Las descargas se sirven con
+    StaticFiles en /uploads y las subidas firmadas llegan a PUT /api/uploads/{key}.
+    """
+
+    def __init__(self, root: str = UPLOAD_DIR, upload_base_url: str = "/api/uploads"):
+        self.root = root
+        self.upload_base_url = upload_base_url
+        if not os.path.exists(self.root):
+            os.makedirs(self.root)
+
+    def _full_path(self, key: str) -> str:
+        full_path = os.path.normpath(os.path.join(self.root, key))
+        # Evitar que una clave manipulada salga del directorio de uploads
+        if os.path.commonpath([os.path.abspath(full_path), os.path.abspath(self.root)]) != os.path.abspath(self.root):
+            raise ValueError("Clave de almacenamiento no válida")
+        return full_path
+
+    def save(self, key: str, fileobj: BinaryIO, content_type: Optional[str] = None) -> int:
+        full_path = self._full_path(key)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        # Escribir en un archivo temporal y renombrar para no exponer archivos a medias
+        tmp_path = f"{full_path}.part"
+        try:
+            with open(tmp_path, "wb") as buffer:
+                shutil.copyfileobj(fileobj, buffer)
+                written = buffer.tell()
+            os.replace(tmp_path, full_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return written
+
+    def open(self, key: str) -> BinaryIO:
+        return open(self._full_path(key), "rb")
+
+    def copy(self, source_key: str, target_key: str) -> None:
+        source_path = self._full_path(source_key)
+        target_path = self._full_path(target_key)
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        try:
+            # Un enlace duro evita copiar los bytes
+            os.link(source_path, target_path)
+        except FileExistsError:
+            pass
+        except OSError:
+            shutil.copyfile(source_path, target_path)
+        # La copia es un objeto nuevo para el GC de uploads: con el mtime del origen
+        # podría borrarse antes de que el perfil apunte a ella
+        os.utime(target_path)
+
+    def delete(self, key: str) -> bool:
+        full_path = self._full_path(key)
+        if not os.path.exists(full_path):
+            return False
+        os.remove(full_path)
+        return True
+
+    def stat(self, key: str) -> Optional[StoredObject]:
+        try:
+            st = os.stat(self._full_path(key))
+        except FileNotFoundError:
+            return None
+        return StoredObject(
+            key=key,
+            size=st.st_size,
+            modified_at=datetime.fromtimestamp(st.st_mtime, tz=timezone.utc)
+        )
+
+    def iter_objects(self, prefix: str = "") -> Iterator[StoredObject]:
+        stack = [self.root]
+        while stack:
+            current = stack.pop()
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                        continue
+                    if entry.name.endswith(".part"):
+                        continue
+                    key = os.path.relpath(entry.path, self.root).replace(os.sep, "/")
+                    if not key.startswith(prefix):
+                        continue
+                    st = entry.stat(follow_symlinks=False)
+                    yield StoredObject(
+                        key=key,
+                        size=st.st_size,
+                        modified_at=datetime.fromtimestamp(st.st_mtime, tz=timezone.utc)
+                    )
+
+    def presigned_upload(self, key: str, content_type: str, expires_in: int = PRESIGNED_EXPIRE_SECONDS) -> PresignedUpload:
+        expires = int(time.time()) + expires_in
+        signature = sign_value(f"PUT:{key}:{expires}")
+        query = urlencode({"expires": expires, "signature": signature})
+        return PresignedUpload(
+            url=f"{self.upload_base_url}/{quote(key)}?{query}",
+            headers={"Content-Type": content_type},
+            expires_in=expires_in
+        )
+
+    def presigned_download_url(self, key: str, expires_in: int = PRESIGNED_EXPIRE_SECONDS) -> str:
+        # Los archivos locales ya son públicos a través de StaticFiles
+        return path_for_key(key)
+
+
+class S3Storage(StorageBackend):
+    """
+    Almacenamiento compatible con S3 (AWS S3, MinIO, etc.).
+    Todas las peticiones se firman con AWS Signature V4 por query string, así
+    que el mismo mecanismo sirve para las URLs que se entregan al cliente.
+    """
+    S3_NS = "{http://s3.amazonaws.com/doc/2006-03-01/}"
+
+    def __init__(
+        self,
+        bucket: str,
+        access_key: str,
+        secret_key: str,
+        region: str = "us-east-1",
+        endpoint_url: Optional[str] = None,
+        public_url: Optional[str] = None
+    ):
+        if not bucket or not access_key or not secret_key:
+            raise ValueError("Faltan S3_BUCKET, S3_ACCESS_KEY o S3_SECRET_KEY para el almacenamiento S3")
+        self.bucket = bucket
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.endpoint_url = endpoint_url.rstrip("/") if endpoint_url else None
+        self.public_url = public_url.rstrip("/") if public_url else None
+        self.client = httpx.Client(timeout=30)
+
+    def _object_url(self, key: str = "") -> str:
+        if self.endpoint_url:
+            # Estilo path (MinIO y otros compatibles)
+            return f"{self.endpoint_url}/{self.bucket}/{key}"
+        return f"https://{self.bucket}.s3.{self.region}.amazonaws.com/{key}"
+
+    def _signing_key(self, datestamp: str) -> bytes:
+        key = ("AWS4" + self.secret_key).encode()
+        for part in (datestamp, self.region, "s3", "aws4_request"):
+            key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+        return key
+
+    def presign(
+        self,
+        method: str,
+        key: str = "",
+        expires_in: int = PRESIGNED_EXPIRE_SECONDS,
+        query: Optional[dict] = None,
+        now: Optional[datetime] = None
+    ) -> str:
+        """
+        Genera una URL firmada (SigV4, query string) para cualquier operación
+        """
+        now = now or datetime.now(timezone.utc)
+        amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+        datestamp = now.strftime("%Y%m%d")
+        scope = f"{datestamp}/{self.region}/s3/aws4_request"
+
+        url = urlparse(self._object_url(quote(key, safe="/~")))
+        params = dict(query or {})
+        params.update({
+            "X-Amz-Algorithm": "AWS4-HMAC-SHA256",
+            "X-Amz-Credential": f"{self.access_key}/{scope}",
+            "X-Amz-Date": amz_date,
+            "X-Amz-Expires": str(expires_in),
+            "X-Amz-SignedHeaders": "host",
+        })
+        canonical_query = "&".join(
+            f"{quote(str(k), safe='-_.~')}={quote(str(v), safe='-_.~')}"
+            for k, v in sorted(params.items())
+        )
+        canonical_request = "\n".join([
+            method,
+            url.path or "/",
+            canonical_query,
+            f"host:{url.netloc}\n",
+            "host",
+            "UNSIGNED-PAYLOAD",
+        ])
+        string_to_sign = "\n".join([
+            "AWS4-HMAC-SHA256",
+            amz_date,
+            scope,
+            hashlib.sha256(canonical_request.encode()).hexdigest(),
+        ])
+        signature = hmac.new(self._signing_key(datestamp), string_to_sign.encode(), hashlib.sha256).hexdigest()
+        return f"{url.scheme}://{url.netloc}{url.path}?{canonical_query}&X-Amz-Signature={signature}"
+
+    def save(self, key: str, fileobj: BinaryIO, content_type: Optional[str] = None) -> int:
+        data = fileobj.read()
+        headers = {"Content-Type": content_type} if content_type else {}
+        response = self.client.put(self.presign("PUT", key), content=data, headers=headers)
+        response.raise_for_status()
+        return len(data)
+
+    def open(self, key: str) -> BinaryIO:
+        response = self.client.get(self.presign("GET", key))
+        if response.status_code == 404:
+            raise FileNotFoundError(key)
+        response.raise_for_status()
+        return io.BytesIO(response.content)
+
+    def read_head(self, key: str, length: int) -> bytes:
+        # GET con Range: no se descarga el objeto entero
+        response = self.client.get(self.presign("GET", key), headers={"Range": f"bytes=0-{length - 1}"})
+        if response.status_code == 404:
+            raise FileNotFoundError(key)
+        response.raise_for_status()
+        return response.content[:length]
+
+    def delete(self, key: str) -> bool:
+        if not self.exists(key):
+            return False
+        response = self.client.delete(self.presign("DELETE", key))
+        response.raise_for_status()
+        return True
+
+    def stat(self, key: str) -> Optional[StoredObject]:
+        response = self.client.head(self.presign("HEAD", key))
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        last_modified = response.headers.get("Last-Modified")
+        return StoredObject(
+            key=key,
+            size=int(response.headers.get("Content-Length", 0)),
+            modified_at=parsedate_to_datetime(last_modified) if last_modified else datetime.now(timezone.utc)
+        )
+
+    def iter_objects(self, prefix: str = "") -> Iterator[StoredObject]:
+        continuation_token = None
+        while True:
+            query = {"list-type": "2", "prefix": prefix}
+            if continuation_token:
+                query["continuation-token"] = continuation_token
+            response = self.client.get(self.presign("GET", "", query=query))
+            response.raise_for_status()
+            root = ElementTree.fromstring(response.content)
+            for item in root.iter(f"{self.S3_NS}Contents"):
+                yield StoredObject(
+                    key=item.findtext(f"{self.S3_NS}Key"),
+                    size=int(item.findtext(f"{self.S3_NS}Size", "0")),
+                    modified_at=datetime.fromisoformat(
+                        item.findtext(f"{self.S3_NS}LastModified").replace("Z", "+00:00")
+                    )
+                )
+            if root.findtext(f"{self.S3_NS}IsTruncated") != "true":
+                break
+            continuation_token = root.findtext(f"{self.S3_NS}NextContinuationToken")
+
+    def presigned_upload(self, key: str, content_type: str, expires_in: int = PRESIGNED_EXPIRE_SECONDS) -> PresignedUpload:
+        return PresignedUpload(
+            url=self.presign("PUT", key, expires_in),
+            headers={"Content-Type": content_type},
+            expires_in=expires_in
+        )
+
+    def presigned_download_url(self, key: str, expires_in: int = PRESIGNED_EXPIRE_SECONDS) -> str:
+        if self.public_url:
+            return f"{self.public_url}/{quote(key, safe='/~')}"
+        return self.presign("GET", key, expires_in)
+
+
+_storage: Optional[StorageBackend] = None
+
+
+def get_storage() -> StorageBackend:
+    """
+    Retorna el backend de almacenamiento configurado (STORAGE_BACKEND=local|s3)
+    """
+    global _storage
+    if _storage is None:
+        if STORAGE_BACKEND == "s3":
+            _storage = S3Storage(
+                bucket=S3_BUCKET,
+                access_key=S3_ACCESS_KEY,
+                secret_key=S3_SECRET_KEY,
+                region=S3_REGION,
+                endpoint_url=S3_ENDPOINT_URL,
+                public_url=S3_PUBLIC_URL
+            )
+        elif STORAGE_BACKEND == "local":
+            _storage = LocalStorage(UPLOAD_DIR)
+        else:
+            raise ValueError(f"Backend de almacenamiento desconocido: {STORAGE_BACKEND}")
+        logger.info(f"Almacenamiento de imágenes: {STORAGE_BACKEND}")
+    return _storage
@@ -0,0 +1,224 @@
+from sqlalchemy import func, select
+from starlette.concurrency import run_in_threadpool
+from app.database.connection import engine
+from app.models.outbox_event_model import OutboxEvent
+from app.services.directory_service import DIRECTORY_FIELDS
+from app.services.invalidation_service import invalidation_bus
+from app.services.outbox_service import OUTBOX_GAP_TIMEOUT
+from app.models.profile_model import Profile
+from dotenv import load_dotenv
+from typing import Dict, List, Optional, Set, Tuple
+import asyncio
+import json
+import os
+import time
+import logging
+
+logger = logging.getLogger("app")
+
+env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
+load_dotenv(env_path)
+
+STREAM_ENABLED = os.getenv("STREAM_ENABLED", "true").lower() in ("1", "true", "yes")
+# Conexiones abiertas como máximo por worker
+STREAM_MAX_CLIENTS = int(os.getenv("STREAM_MAX_CLIENTS", "5000"))
+# Sondeo del outbox por worker (los cambios de este worker y los avisados por el bus llegan antes)
+STREAM_POLL_INTERVAL = float(os.getenv("STREAM_POLL_INTERVAL", "2"))
+STREAM_HEARTBEAT_SECONDS = float(os.getenv("STREAM_HEARTBEAT_SECONDS", "25"))
+# Eventos pendientes por cliente; un cliente más lento se desconecta y se reanuda con Last-Event-ID
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "500"))
+# Con más eventos perdidos que estos, el cliente recibe "reset" y recarga el directorio
+STREAM_REPLAY_LIMIT = int(os.getenv("STREAM_REPLAY_LIMIT", "1000"))
+
+RESET_MESSAGE = b"event: reset\ndata: {}\n\n"
+HEARTBEAT_MESSAGE = b": ping\n\n"
+
+
+class StreamFullError(Exception):
+    """
+    El worker ya tiene STREAM_MAX_CLIENTS conexiones abiertas
+    """
+    pass
+
+
+def encode_event(event_id: int, action: str, profile_id: str, row=None) -> bytes:
+    data = {"id": profile_id, "action": action}
+    if row is not None:
+        data["profile"] = {"id": row.id, "name": row.name, "cover_image": row.cover_image, "cover_meta": row.cover_meta}
+    payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    return f"id: {event_id}\nevent: profile\ndata: {payload}\n\n".encode("utf-8")
+
+
+def _max_event_id() -> int:
+    with engine.connect() as connection:
+        return connection.execute(select(func.max(OutboxEvent.id))).scalar() or 0
+
+
+def _encode_events(connection, events) -> List[Tuple[int, Optional[bytes]]]:
+    """
+    Convierte los eventos del outbox en mensajes SSE. Los perfiles que siguen
+    existiendo se leen con una sola consulta para incluir sus datos del directorio.
+    """
+    profile_ids = {event.entity_id for event in events if event.topic == "profile" and event.action != "deleted"}
+    rows = {}
+    if profile_ids:
+        rows = {row.id: row for row in connection.execute(select(*DIRECTORY_FIELDS).where(Profile.id.in_(profile_ids)))}
+    encoded = []
+    for event in events:
+        if event.topic != "profile":
+            # Los demás temas solo hacen avanzar la posición
+            encoded.append((event.id, None))
+            continue
+        row = rows.get(event.entity_id)
+        action = event.action if row is not None or event.action == "deleted" else "deleted"
+        encoded.append((event.id, encode_event(event.id, action, event.entity_id, row)))
+    return encoded
+
+
+def replay_events(after_id: int, up_to_id: int) -> Optional[List[bytes]]:
+    """
+    Mensajes entre after_id y up_to_id para un cliente que se reconecta.
+    Devuelve None si ya no se pueden reconstruir (eventos borrados o demasiados).
+    """
+    if after_id >= up_to_id:
+        return []
+    with engine.connect() as connection:
+        oldest = connection.execute(select(func.min(OutboxEvent.id))).scalar()
+        if oldest is None or oldest > after_id + 1:
+            return None
+        events = connection.execute(
+            select(OutboxEvent)
+            .where(OutboxEvent.id > after_id, OutboxEvent.id <= up_to_id)
+            .order_by(OutboxEvent.id)
+            .limit(STREAM_REPLAY_LIMIT + 1)
+        ).all()
+        if len(events) > STREAM_REPLAY_LIMIT:
+            return None
+        return [message for _, message in _encode_events(connection, events) if message is not None]
+
+
+class ProfileStreamBroker:
+    """
+    Reparte los cambios de perfiles a las conexiones SSE abiertas en este worker.
+    Una sola tarea por worker lee el outbox y codifica cada evento una vez; cada
+    conexión solo tiene una cola, así que miles de conexiones inactivas apenas cuestan.
+    """
+
+    def __init__(
+        self,
+        poll_interval: float = STREAM_POLL_INTERVAL,
+        max_clients: int = STREAM_MAX_CLIENTS,
+        queue_size: int = STREAM_QUEUE_SIZE
+    ):
+        self.poll_interval = poll_interval
+        self.max_clients = max_clients
+        self.queue_size = queue_size
+        self.last_id = 0
+        self._clients: Set[asyncio.Queue] = set()
+        self._gaps: Dict[int, float] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    @property
+    def client_count(self) -> int:
+        return len(self._clients)
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self.last_id = await run_in_threadpool(_max_event_id)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        # Los avisos del bus que lleguen después ya no tienen bucle al que despertar
+        self._loop = None
+        # Cerrar las conexiones abiertas para que el servidor pueda apagarse
+        for queue in list(self._clients):
+            self._close(queue)
+
+    def wake(self, profile_id: Optional[str] = None):
+        """
+        Se llama desde el bus de invalidación (cualquier hilo) cuando cambia un perfil
+        """
+        if self._loop is not None and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def subscribe(self) -> Tuple[asyncio.Queue, int]:
+        """
+        Registra una conexión y devuelve su cola y la posición desde la que recibirá eventos
+        """
+        if len(self._clients) >= self.max_clients:
+            raise StreamFullError("Demasiadas conexiones abiertas")
+        if not self._clients:
+            # Sin clientes no se lee el outbox: se salta lo que nadie estaba escuchando
+            self.last_id = max(self.last_id, await run_in_threadpool(_max_event_id))
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._clients.add(queue)
+        return queue, self.last_id
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._clients.discard(queue)
+
+    def _close(self, queue: asyncio.Queue):
+        self._clients.discard(queue)
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+    def _read(self, after_id: int) -> List[Tuple[int, Optional[bytes]]]:
+        with engine.connect() as connection:
+            events = connection.execute(
+                select(OutboxEvent).where(OutboxEvent.id > after_id).order_by(OutboxEvent.id).limit(1000)
+            ).all()
+            # Solo la parte contigua: un id que falta puede ser una transacción sin commit
+            ready = []
+            now = time.monotonic()
+            expected = after_id + 1
+            for event in events:
+                if event.id != expected:
+                    first_seen = self._gaps.setdefault(expected, now)
+                    if now - first_seen < OUTBOX_GAP_TIMEOUT:
+                        break
+                ready.append(event)
+                expected = event.id + 1
+            self._gaps = {gap_id: seen for gap_id, seen in self._gaps.items() if gap_id >= expected}
+            return _encode_events(connection, ready)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if not self._clients:
+                continue
+            try:
+                messages = await run_in_threadpool(self._read, self.last_id)
+            except Exception as e:
+                logger.error(f"Error leyendo el outbox para el stream de perfiles: {str(e)}")
+                continue
+            for event_id, message in messages:
+                self.last_id = event_id
+                if message is None:
+                    continue
+                for queue in list(self._clients):
+                    try:
+                        queue.put_nowait((event_id, message))
+                    except asyncio.QueueFull:
+                        logger.warning("Cliente del stream de perfiles demasiado lento: se desconecta")
+                        self._close(queue)
+
+
+profile_stream = ProfileStreamBroker()
+
+# Cambios de este worker (después del commit) y de otros workers (bus de invalidación)
+invalidation_bus.subscribe("profile", profile_stream.wake)
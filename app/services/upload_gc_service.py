@@ -0,0 +1,132 @@
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from app.database.connection import SessionLocal
+from app.models.image_job_model import ImageJob
+from app.models.profile_model import Profile
+from app.services.storage_service import StoredObject, get_storage, path_for_key
+from dotenv import load_dotenv
+from typing import Iterable, List, Set
+import asyncio
+import os
+import logging
+
+logger = logging.getLogger("app")
+
+env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
+load_dotenv(env_path)
+
+# 0 desactiva la tarea periódica
+UPLOAD_GC_INTERVAL_SECONDS = int(os.getenv("UPLOAD_GC_INTERVAL_SECONDS", "0"))
+UPLOAD_GC_GRACE_SECONDS = int(os.getenv("UPLOAD_GC_GRACE_SECONDS", "3600"))
+
+IMAGE_COLUMNS = [Profile.cover_image, Profile.image_1, Profile.image_2, Profile.image_3]
+
+
+@dataclass
+class GcReport:
+    scanned: int = 0
+    orphaned: int = 0
+    deleted: int = 0
+    reclaimed_bytes: int = 0
+    errors: List[str] = field(default_factory=list)
+
+
+def referenced_keys(db: Session, keys: List[str]) -> Set[str]:
+    """
+    Retorna cuáles de las claves siguen en uso, con una consulta por tabla
+    para todo el lote
+    """
+    paths = [path_for_key(key) for key in keys]
+    referenced = set()
+
+    rows = db.execute(
+        select(*IMAGE_COLUMNS).where(or_(*[column.in_(paths) for column in IMAGE_COLUMNS]))
+    )
+    for row in rows:
+        referenced.update(value for value in row if value)
+
+    # Subidas que todavía está procesando la cola de imágenes
+    rows = db.execute(
+        select(ImageJob.source_key).where(
+            ImageJob.source_key.in_(keys),
+            ImageJob.status.in_(["pending", "processing"])
+        )
+    )
+    referenced.update(path_for_key(row.source_key) for row in rows)
+
+    return {key for key in keys if path_for_key(key) in referenced}
+
+
+def _batches(objects: Iterable[StoredObject], size: int) -> Iterable[List[StoredObject]]:
+    batch = []
+    for obj in objects:
+        batch.append(obj)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def collect_orphaned_uploads(
+    grace_seconds: int = UPLOAD_GC_GRACE_SECONDS,
+    batch_size: int = 500,
+    dry_run: bool = False
+) -> GcReport:
+    """
+    Recorre el almacenamiento y elimina las imágenes que ningún perfil referencia.
+    Los archivos más recientes que el periodo de gracia se respetan porque
+    pueden pertenecer a una subida en curso.
+    """
+    report = GcReport()
+    storage = get_storage()
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=grace_seconds)
+
+    def candidates():
+        for obj in storage.iter_objects():
+            report.scanned += 1
+            if obj.modified_at < cutoff:
+                yield obj
+
+    db = SessionLocal()
+    try:
+        for batch in _batches(candidates(), batch_size):
+            in_use = referenced_keys(db, [obj.key for obj in batch])
+            # No mantener la transacción abierta mientras se borran archivos
+            db.rollback()
+            for obj in batch:
+                if obj.key in in_use:
+                    continue
+                report.orphaned += 1
+                if dry_run:
+                    report.reclaimed_bytes += obj.size
+                    continue
+                try:
+                    if storage.delete(obj.key):
+                        report.deleted += 1
+                        report.reclaimed_bytes += obj.size
+                except Exception as e:
+                    report.errors.append(f"{obj.key}: {str(e)}")
+    finally:
+        db.close()
+
+    logger.info(
+        f"GC de uploads: {report.scanned} revisados, {report.orphaned} huérfanos, "
+        f"{report.deleted} eliminados, {report.reclaimed_bytes} bytes recuperados"
+    )
+    return report
+
+
+async def run_periodic_gc(interval_seconds: int = UPLOAD_GC_INTERVAL_SECONDS):
+    """
+    Tarea en segundo plano que ejecuta el GC cada interval_seconds
+    """
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await run_in_threadpool(collect_orphaned_uploads)
+        except Exception as e:
+            logger.error(f"Error en el GC de uploads: {str(e)}")
@@ -0,0 +1,158 @@
+from dataclasses import dataclass, field
+from sqlalchemy import select, update
+from app.database.connection import SessionLocal
+from app.models.image_job_model import ImageJob
+from app.models.profile_model import Profile
+from app.services.storage_service import get_storage, key_from_path, path_for_key, sharded_key
+from app.services.outbox_service import outbox_dispatcher, record_event
+from typing import List, Optional
+import os
+import logging
+
+logger = logging.getLogger("app")
+
+IMAGE_FIELDS = ["cover_image", "image_1", "image_2", "image_3"]
+
+
+@dataclass
+class MigrationReport:
+    profiles: int = 0
+    moved: int = 0
+    skipped: int = 0
+    last_profile_id: Optional[str] = None
+    errors: List[str] = field(default_factory=list)
+
+
+def _read_checkpoint(checkpoint_path: str) -> Optional[str]:
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        with open(checkpoint_path, "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    return None
+
+
+def _write_checkpoint(checkpoint_path: str, profile_id: str):
+    if not checkpoint_path:
+        return
+    tmp_path = f"{checkpoint_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(profile_id)
+    os.replace(tmp_path, checkpoint_path)
+
+
+def migrate_to_sharded_layout(
+    batch_size: int = 500,
+    checkpoint_path: Optional[str] = "uploads_migration.checkpoint",
+    dry_run: bool = False
+) -> MigrationReport:
+    """
+    Mueve las imágenes guardadas en la raíz de uploads/ al esquema ab/cd/<nombre>
+    y reescribe las rutas de los perfiles por lotes, con la aplicación en marcha.
+
+    Para cada imagen: se copia a la ruta nueva, se actualiza la fila solo si
+    todavía apunta a la ruta antigua y, tras el commit, se borra la antigua.
+    El último perfil procesado se guarda en checkpoint_path para poder reanudar.
+    """
+    report = MigrationReport()
+    storage = get_storage()
+    last_id = _read_checkpoint(checkpoint_path)
+    if last_id:
+        logger.info(f"Reanudando la migración después del perfil {last_id}")
+
+    db = SessionLocal()
+    try:
+        while True:
+            query = select(Profile.id, *[getattr(Profile, name) for name in IMAGE_FIELDS]).order_by(Profile.id).limit(batch_size)
+            if last_id:
+                query = query.where(Profile.id > last_id)
+            rows = db.execute(query).all()
+            if not rows:
+                break
+
+            # Claves planas de este lote que todavía está procesando la cola de imágenes
+            flat_keys = [
+                key_from_path(value)
+                for row in rows for value in row[1:]
+                if value and key_from_path(value) and "/" not in key_from_path(value)
+            ]
+            busy = set()
+            if flat_keys:
+                busy = {
+                    job.source_key for job in db.execute(
+                        select(ImageJob.source_key).where(
+                            ImageJob.source_key.in_(flat_keys),
+                            ImageJob.status.in_(["pending", "processing"])
+                        )
+                    )
+                }
+
+            moves = []  # (profile_id, campo, clave antigua, clave nueva)
+            for row in rows:
+                report.profiles += 1
+                for field_name, value in zip(IMAGE_FIELDS, row[1:]):
+                    key = key_from_path(value)
+                    if not key or "/" in key or key in busy:
+                        continue
+                    new_key = sharded_key(key)
+                    try:
+                        if storage.exists(key):
+                            if not dry_run:
+                                storage.copy(key, new_key)
+                        elif not storage.exists(new_key):
+                            # Ni la ruta antigua ni la nueva existen: no hay nada que mover
+                            report.skipped += 1
+                            continue
+                    except Exception as e:
+                        report.errors.append(f"{key}: {str(e)}")
+                        continue
+                    moves.append((row.id, field_name, key, new_key))
+
+            if not dry_run:
+                applied = []
+                changed = {}
+                for profile_id, field_name, key, new_key in moves:
+                    column = getattr(Profile, field_name)
+                    result = db.execute(
+                        update(Profile)
+                        .where(Profile.id == profile_id, column == path_for_key(key))
+                        # Conservar updated_at: mover el archivo no es una edición del perfil.
+                        # La versión sí cambia: la ruta forma parte de lo que cubre el ETag
+                        .values({
+                            field_name: path_for_key(new_key),
+                            "updated_at": Profile.updated_at,
+                            "version": Profile.version + 1,
+                        })
+                        .execution_options(synchronize_session=False)
+                    )
+                    updated = result.rowcount == 1
+                    applied.append((profile_id, key, new_key, updated))
+                    if updated:
+                        changed.setdefault(profile_id, []).append(field_name)
+                for profile_id, fields in changed.items():
+                    record_event(db, "profile", profile_id, "updated", {"fields": fields})
+                db.commit()
+                for profile_id in changed:
+                    outbox_dispatcher.after_commit("profile", profile_id)
+
+                for profile_id, key, new_key, updated in applied:
+                    try:
+                        if updated:
+                            storage.delete(key)
+                            report.moved += 1
+                        else:
+                            # El perfil cambió de imagen mientras tanto
+                            storage.delete(new_key)
+                            report.skipped += 1
+                    except Exception as e:
+                        report.errors.append(f"{key}: {str(e)}")
+            else:
+                report.moved += len(moves)
+
+            last_id = rows[-1].id
+            report.last_profile_id = last_id
+            if not dry_run:
+                _write_checkpoint(checkpoint_path, last_id)
+            logger.info(f"Migración de uploads: {report.profiles} perfiles, {report.moved} imágenes movidas")
+    finally:
+        db.close()
+
+    return report
@@ -1,13 +1,26 @@
 from app.models.user_model import User  # Importa desde models/
 from app.models.profile_model import Profile
+from app.models.image_job_model import ImageJob
 from app.schemas.user_schema import UserCreate, SuperUserCreate, UserResponse, AllUsersResponse, UserUpdate, ChangePassword
 from app.database.connection import get_db
 from sqlalchemy.orm import Session
-from passlib.context import CryptContext
 from fastapi import Depends
+from sqlalchemy import delete, or_, select, update
 from sqlalchemy.exc import IntegrityError
+from app.services.storage_service import get_storage, key_from_path
+from app.database.statements import USER_BY_EMAIL, USER_BY_ID, USER_BY_USERNAME, USERNAME_OR_EMAIL_TAKEN
+from app.services.availability_service import availability_filter
+from app.services.outbox_service import outbox_dispatcher, record_event, record_events
+from app.services.revocation_service import revocation_list, revoke_user_tokens
+from app.services.auth_service import hash_password, verify_password
+from app.services.image_queue_service import create_delete_job, image_queue
+from typing import List, Optional
 from dotenv import load_dotenv
 import os
+import uuid
+import logging
+
+logger = logging.getLogger("app")
 
 
 env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
@@ -17,119 +30,119 @@ SUPERUSER_KEY = os.getenv("SUPERUSER_KEY")
 if not SUPERUSER_KEY:
     raise ValueError(f"No se pudo cargar SUPERUSER_KEY del archivo {env_path}")
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Máximo de usuarios por petición de borrado masivo
+MAX_BULK_DELETE = 1000
+
+IMAGE_FIELDS = ("cover_image", "image_1", "image_2", "image_3")
 
 class UserService:
     def __init__(self, db: Session = Depends(get_db)):
         self.db = db
 
     def get_user_by_username(self, username: str) -> User | None:
-        return self.db.query(User).filter(User.username == username).first()
+        return self.db.execute(USER_BY_USERNAME, {"username": username}).scalars().first()
 
     def get_user_by_email(self, email: str) -> User | None:
-        return self.db.query(User).filter(User.email == email).first()
+        return self.db.execute(USER_BY_EMAIL, {"email": email}).scalars().first()
     
     
 
 
-    def create_user(self, user: UserCreate) -> UserResponse:
-        # Verificar si el username ya existe
-        if self.get_user_by_username(user.username):
+    def check_availability(self, username: Optional[str], email: Optional[str], refresh: bool = True) -> dict:
+        """
+        Indica si el username y el email están libres (None si no se preguntó).
+        El filtro de disponibilidad descarta sin consultar la base los valores que
+        seguro están libres; el resto se comprueba con una sola consulta.
+        Con refresh=False no se aplican antes los cambios pendientes del filtro.
+        """
+        if refresh:
+            availability_filter.refresh(self.db)
+        result = {
+            "username": None if username is None else not availability_filter.might_exist("u", username),
+            "email": None if email is None else not availability_filter.might_exist("e", email),
+        }
+        # Solo se consultan los valores que el filtro no puede descartar
+        pending = {field: value for field, value in (("username", username), ("email", email))
+                   if value is not None and not result[field]}
+        if not pending:
+            return result
+        taken = self.db.execute(
+            USERNAME_OR_EMAIL_TAKEN, {"username": pending.get("username"), "email": pending.get("email")}
+        ).all()
+        for field, value in pending.items():
+            result[field] = not any(getattr(row, field) == value for row in taken)
+        return result
+
+    def _duplicate_field(self, username: str | None, email: str | None, exclude_id: str | None = None) -> str | None:
+        """
+        Tras un IntegrityError, averigua qué campo único está repetido.
+        Solo se consulta en el caso de error; el camino normal confía en las restricciones.
+        """
+        query = self.db.query(User.username, User.email).filter(or_(User.username == username, User.email == email))
+        if exclude_id:
+            query = query.filter(User.id != exclude_id)
+        existing = query.first()
+        if existing and username and existing.username == username:
+            return "username"
+        if existing and email and existing.email == email:
+            return "email"
+        return None
+
+    def _create_user_with_profile(self, user: UserCreate, is_superuser: bool) -> UserResponse:
+        """
+        Crea el usuario y su perfil en un solo flush: el id se genera aquí y las
+        fechas vuelven con el INSERT, así que no hacen falta consultas previas ni refresh.
+        Los duplicados se detectan por las restricciones únicas de la tabla; antes,
+        si el filtro de disponibilidad no puede descartarlos, se comprueban con una
+        consulta para no calcular el hash de la contraseña en balde.
+        """
+        availability = self.check_availability(user.username, user.email, refresh=False)
+        if not availability["username"]:
             raise ValueError(f"El usuario con username '{user.username}' ya existe")
-        
-        # Verificar si el email ya existe
-        if self.get_user_by_email(user.email):
+        if not availability["email"]:
             raise ValueError(f"El usuario con email '{user.email}' ya existe")
-        
 
-        
-        hashed_password = pwd_context.hash(user.password)
+        user_id = uuid.uuid4().hex
         new_user = User(
+            id=user_id,
             username=user.username,
             email=user.email,
-            password=hashed_password,
-            is_superuser=False
+            password=hash_password(user.password),
+            is_superuser=is_superuser,
+            updated_at=None  # Valor ya conocido: evita releerlo después del INSERT
         )
+        # El perfil se crea automáticamente con el mismo ID que el usuario
+        self.db.add_all([new_user, Profile(id=user_id, name=user.username, user_id=user_id, updated_at=None)])
+        record_event(self.db, "user", user_id, "created")
+        record_event(self.db, "profile", user_id, "created")
         try:
-            # Crear el usuario
-            self.db.add(new_user)
-            self.db.flush()  # Para obtener el ID del usuario
-            
-            # Crear el perfil automáticamente con el mismo ID
-            default_profile = Profile(
-                id=new_user.id,  # Usar el mismo ID que el usuario
-                name=user.username,
-                user_id=new_user.id
-            )
-            self.db.add(default_profile)
-            
+            self.db.flush()
+            response = UserResponse.model_validate(new_user)
             self.db.commit()
-            self.db.refresh(new_user)
-            return UserResponse(
-                id=new_user.id,
-                username=new_user.username,
-                email=new_user.email,
-                created_at=new_user.created_at,
-                updated_at=new_user.updated_at,
-                is_superuser=new_user.is_superuser
-            )
         except IntegrityError:
             self.db.rollback()
+            duplicate = self._duplicate_field(user.username, user.email)
+            if duplicate == "username":
+                raise ValueError(f"El usuario con username '{user.username}' ya existe")
+            if duplicate == "email":
+                raise ValueError(f"El usuario con email '{user.email}' ya existe")
             raise ValueError("Error al crear el usuario. Posible duplicado de username o email.")
+        outbox_dispatcher.after_commit("user", user_id)
+        outbox_dispatcher.after_commit("profile", user_id)
+        return response
+
+    def create_user(self, user: UserCreate) -> UserResponse:
+        return self._create_user_with_profile(user, is_superuser=False)
         
     def create_superuser(self, user: SuperUserCreate) -> UserResponse:
-        # Verificar si el username ya existe
-        if self.get_user_by_username(user.username):
-            raise ValueError(f"El usuario con username '{user.username}' ya existe")
-        
-        # Verificar si el email ya existe
-        if self.get_user_by_email(user.email):
-            raise ValueError(f"El usuario con email '{user.email}' ya existe")
         # Verificar si el usuario es superuser
-        if user.superuser_key == SUPERUSER_KEY:
-                is_superuser = True
-        else:
-                raise ValueError("La clave de superuser es incorrecta")
-
-        
-        hashed_password = pwd_context.hash(user.password)
-        new_user = User(
-            username=user.username,
-            email=user.email,
-            password=hashed_password,
-            is_superuser=True
-        )
-        
-        try:
-            # Crear el superusuario
-            self.db.add(new_user)
-            self.db.flush()
-            
-            # Crear el perfil automáticamente con el mismo ID
-            default_profile = Profile(
-                id=new_user.id,  # Usar el mismo ID que el usuario
-                name=user.username,
-                user_id=new_user.id
-            )
-            self.db.add(default_profile)
-            
-            self.db.commit()
-            self.db.refresh(new_user)
-            return UserResponse(
-                id=new_user.id,
-                username=new_user.username,
-                email=new_user.email,
-                created_at=new_user.created_at,
-                updated_at=new_user.updated_at,
-                is_superuser=new_user.is_superuser
-            )
-        except IntegrityError:
-            self.db.rollback()
-            raise ValueError("Error al crear el usuario. Posible duplicado de username o email.")
+        if user.superuser_key != SUPERUSER_KEY:
+            raise ValueError("La clave de superuser es incorrecta")
+        return self._create_user_with_profile(user, is_superuser=True)
     
     def get_user_by_id(self, user_id: str) -> UserResponse:
         """Obtiene un usuario por ID desde la base de datos"""
-        db_user = self.db.query(User).filter(User.id == user_id).first()
+        db_user = self.db.execute(USER_BY_ID, {"user_id": user_id}).scalars().first()
         if not db_user:
             raise ValueError("Usuario no encontrado")
 
@@ -147,72 +160,181 @@ class UserService:
         db_users = self.db.query(User).all()
         return [AllUsersResponse.from_orm(user) for user in db_users]
 
-    def update_user(self, user_id: str, user_data: UserUpdate) -> User:
+    def update_user(self, user_id: str, user_data: UserUpdate) -> UserResponse:
         # Primero verificamos si el usuario existe
-        db_user = self.db.query(User).filter(User.id == user_id).first()
+        db_user = self.db.execute(USER_BY_ID, {"user_id": user_id}).scalars().first()
         if not db_user:
             raise ValueError(f"Usuario con id {user_id} no encontrado")
         
-        # Si se va a actualizar el username, verificar que no exista
-        if user_data.username and user_data.username != db_user.username:
-            existing_user = self.db.query(User).filter(User.username == user_data.username).first()
-            if existing_user:
-                raise ValueError(f"El username {user_data.username} ya está en uso")
-        
-        # Si se va a actualizar el email, verificar que no exista
-        if user_data.email and user_data.email != db_user.email:
-            existing_user = self.db.query(User).filter(User.email == user_data.email).first()
-            if existing_user:
-                raise ValueError(f"El email {user_data.email} ya está en uso")
-        
-        # Actualizar los campos que vienen en la petición
+        # El username y el email van en el token (get_current_user no consulta la
+        # base): si cambian, los tokens emitidos con los datos anteriores dejan de valer
+        identity_changed = (
+            (user_data.username and user_data.username != db_user.username)
+            or (user_data.email and user_data.email != db_user.email)
+        )
+        # Actualizar los campos que vienen en la petición; los duplicados los
+        # detectan las restricciones únicas al hacer flush
         if user_data.username:
             db_user.username = user_data.username
         if user_data.email:
             db_user.email = user_data.email
+        record_event(self.db, "user", user_id, "updated", {"fields": sorted(user_data.model_dump(exclude_none=True))})
+        if identity_changed:
+            revoke_user_tokens(self.db, user_id)
         
         try:
+            self.db.flush()
+            response = UserResponse.model_validate(db_user)
             self.db.commit()
-            self.db.refresh(db_user)
-            return db_user
         except IntegrityError:
             self.db.rollback()
+            duplicate = self._duplicate_field(user_data.username, user_data.email, exclude_id=user_id)
+            if duplicate == "username":
+                raise ValueError(f"El username {user_data.username} ya está en uso")
+            if duplicate == "email":
+                raise ValueError(f"El email {user_data.email} ya está en uso")
             raise ValueError("Error al actualizar el usuario")
+        if identity_changed:
+            revocation_list.after_commit()
+        outbox_dispatcher.after_commit("user", user_id)
+        return response
     
-    def change_password(self, user_id: str, password_data: ChangePassword) -> User:
+    def change_password(self, user_id: str, password_data: ChangePassword) -> UserResponse:
         # Primero verificamos si el usuario existe
-        db_user = self.db.query(User).filter(User.id == user_id).first()
+        db_user = self.db.execute(USER_BY_ID, {"user_id": user_id}).scalars().first()
         if not db_user:
             raise ValueError(f"Usuario con id {user_id} no encontrado")
         # Verificar que la contraseña actual sea correcta
-        if not pwd_context.verify(password_data.old_password, db_user.password):
+        if not verify_password(password_data.old_password, db_user.password):
             raise ValueError("La contraseña actual es incorrecta")
         # Hashear y guardar la nueva contraseña
     # Hashear y guardar la nueva contraseña
-        db_user.password = pwd_context.hash(password_data.new_password)
+        db_user.password = hash_password(password_data.new_password)
+        record_event(self.db, "user", user_id, "updated", {"fields": ["password"]})
+        # Los tokens emitidos con la contraseña anterior dejan de valer
+        revoke_user_tokens(self.db, user_id)
     
         try:
+            self.db.flush()
+            response = UserResponse.model_validate(db_user)
             self.db.commit()
-            self.db.refresh(db_user)
-            return db_user
         except Exception:
             self.db.rollback()
             raise ValueError("Error al cambiar la contraseña")
+        revocation_list.after_commit()
+        outbox_dispatcher.after_commit("user", user_id)
+        return response
 
     def delete_user(self, user_id: str) -> bool:
         try:
             # Obtener el usuario
-            db_user = self.db.query(User).filter(User.id == user_id).first()
+            db_user = self.db.execute(USER_BY_ID, {"user_id": user_id}).scalars().first()
             if not db_user:
                 raise ValueError("Usuario no encontrado")
 
-            # El perfil se eliminará automáticamente debido a la relación CASCADE en la base de datos
+            # Guardar las imágenes del perfil para borrarlas después del commit
+            image_paths = []
+            profile_id = db_user.profile.id if db_user.profile else None
+            if db_user.profile:
+                image_paths = [
+                    getattr(db_user.profile, field_name)
+                    for field_name in IMAGE_FIELDS
+                    if getattr(db_user.profile, field_name)
+                ]
+
+            # El perfil se elimina en cascada con el usuario
             self.db.delete(db_user)
+            record_event(self.db, "user", user_id, "deleted")
+            revoke_user_tokens(self.db, user_id)
+            if profile_id:
+                record_event(self.db, "profile", profile_id, "deleted")
             self.db.commit()
-            return True
             
         except Exception as e:
             self.db.rollback()
             raise ValueError(f"Error al eliminar el usuario: {str(e)}")
-                
 
+        revocation_list.after_commit()
+        outbox_dispatcher.after_commit("user", user_id)
+        if profile_id:
+            outbox_dispatcher.after_commit("profile", profile_id)
+
+        storage = get_storage()
+        for image_path in image_paths:
+            try:
+                storage.delete(key_from_path(image_path))
+            except Exception as e:
+                # El archivo queda huérfano; lo recogerá el GC de uploads
+                logger.error(f"Error al eliminar imagen {image_path}: {str(e)}")
+        return True
+
+    def delete_users(self, user_ids: List[str], current_user_id: str) -> dict:
+        """
+        Elimina varios usuarios y sus perfiles con unas pocas sentencias DELETE.
+        Las imágenes se borran en segundo plano; se devuelve el trabajo de limpieza.
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        if not user_ids:
+            raise ValueError("Debes indicar al menos un usuario")
+        if len(user_ids) > MAX_BULK_DELETE:
+            raise ValueError(f"No se pueden eliminar más de {MAX_BULK_DELETE} usuarios por petición")
+        if current_user_id in user_ids:
+            raise ValueError("No puedes eliminar tu propio usuario")
+
+        try:
+            profiles = self.db.execute(
+                select(Profile.id, *[getattr(Profile, name) for name in IMAGE_FIELDS])
+                .where(Profile.user_id.in_(user_ids))
+            ).all()
+            profile_ids = [row.id for row in profiles]
+            keys = [key_from_path(value) for row in profiles for value in row[1:] if value and key_from_path(value)]
+
+            if profile_ids:
+                # Las subidas pendientes de optimizar también se borran
+                pending = ImageJob.profile_id.in_(profile_ids) & (ImageJob.status == "pending")
+                keys += [
+                    row.source_key
+                    for row in self.db.execute(select(ImageJob.source_key).where(pending))
+                    if row.source_key
+                ]
+                self.db.execute(update(ImageJob).where(pending).values(status="done"))
+
+            self.db.execute(delete(Profile).where(Profile.user_id.in_(user_ids)))
+            # Solo los que existían: los ids desconocidos no generan eventos ni revocaciones
+            statement = delete(User).where(User.id.in_(user_ids))
+            if self.db.get_bind().dialect.delete_returning:
+                deleted_ids = list(self.db.execute(statement.returning(User.id)).scalars())
+            else:
+                # Bases sin DELETE ... RETURNING (MySQL): leer los ids en la misma transacción
+                deleted_ids = list(self.db.execute(select(User.id).where(User.id.in_(user_ids))).scalars())
+                self.db.execute(statement)
+
+            job = create_delete_job(self.db, sorted(set(keys)))
+            job_id = job.id
+            record_events(
+                self.db,
+                [{"topic": "user", "entity_id": user_id, "action": "deleted"} for user_id in deleted_ids]
+                + [{"topic": "profile", "entity_id": profile_id, "action": "deleted"} for profile_id in profile_ids]
+            )
+            for user_id in deleted_ids:
+                revoke_user_tokens(self.db, user_id)
+            self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            raise ValueError(f"Error al eliminar los usuarios: {str(e)}")
+
+        image_queue.enqueue(job_id)
+        if deleted_ids:
+            revocation_list.after_commit()
+        for user_id in deleted_ids:
+            outbox_dispatcher.after_commit("user", user_id)
+        for profile_id in profile_ids:
+            outbox_dispatcher.after_commit("profile", profile_id)
+
+        return {"deleted": len(deleted_ids), "job_id": job_id, "status": "pending"}
+
+    def get_delete_job(self, job_id: str) -> ImageJob:
+        job = self.db.query(ImageJob).filter(ImageJob.id == job_id, ImageJob.kind == "delete").first()
+        if not job:
+            raise ValueError("Trabajo no encontrado")
+        return job
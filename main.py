@@ -1,10 +1,77 @@
 from app.endpoints.user_endpoints import router as user_router
 from app.endpoints.auth_endpoints import router as auth_router
 from app.endpoints.profile_endpoints import router as profile_router
+from app.endpoints.upload_endpoints import router as upload_router, public_router as upload_public_router
+from app.endpoints.health_endpoints import router as health_router
+from app.endpoints.profiler_endpoints import router as profiler_router
+from app.endpoints.backup_endpoints import router as backup_router
+from app.services.storage_service import get_storage, LocalStorage
+from app.middleware.upload_limit_middleware import UploadLimitMiddleware
+from app.middleware.replica_routing_middleware import ReplicaRoutingMiddleware
+from app.middleware.query_budget_middleware import QueryBudgetMiddleware
+from app.middleware.profiling_middleware import ProfilingMiddleware
+from app.database.connection import db_router
+from app.services.invalidation_service import invalidation_bus, CACHE_ENABLED
+from app.services.directory_service import directory_snapshot
+from app.services.availability_service import availability_filter
+from app.services.outbox_service import outbox_dispatcher, OUTBOX_DISPATCHER
+from app.services.stream_service import profile_stream, STREAM_ENABLED
+from app.services.revocation_service import revocation_list
+from app.services.image_queue_service import image_queue, IMAGE_QUEUE_MODE
+from app.services.upload_gc_service import run_periodic_gc, UPLOAD_GC_INTERVAL_SECONDS
+from app.services.health_service import run_warmup, stop_warmup
+from app.server_config import server_config
+from starlette.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
+import anyio.to_thread
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-import os
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Hilos para las rutas y servicios síncronos de este worker (ver app/server_config.py)
+    anyio.to_thread.current_default_thread_limiter().total_tokens = server_config.threadpool_size
+    # Calentamiento en segundo plano: /api/health/ready responde 503 hasta que
+    # funcionen la base de datos y el listado de perfiles (los pasos que fallan se reintentan)
+    warmup_task = asyncio.create_task(run_in_threadpool(run_warmup))
+    # Tokens revocados en memoria: se cargan antes de aceptar peticiones
+    await run_in_threadpool(revocation_list.start)
+    # Trabajador de la cola de imágenes dentro de la API (modo por defecto)
+    if IMAGE_QUEUE_MODE == "inprocess":
+        await image_queue.start()
+    # Recolector periódico de imágenes huérfanas (desactivado con 0)
+    gc_task = None
+    if UPLOAD_GC_INTERVAL_SECONDS > 0:
+        gc_task = asyncio.create_task(run_periodic_gc(UPLOAD_GC_INTERVAL_SECONDS))
+    # Comprobación periódica de las réplicas de lectura
+    replica_task = None
+    if db_router.replicas:
+        replica_task = asyncio.create_task(db_router.run_health_checks())
+    # Escuchar invalidaciones de otros workers para las cachés en memoria, el directorio
+    # y el filtro de disponibilidad de username/email
+    if CACHE_ENABLED or directory_snapshot.enabled or availability_filter.enabled:
+        invalidation_bus.start()
+    # Entrega de los eventos del outbox a los suscriptores (cachés, directorio...)
+    if OUTBOX_DISPATCHER:
+        await run_in_threadpool(outbox_dispatcher.start)
+    # Cambios de perfiles en directo para GET /api/profiles/stream
+    if STREAM_ENABLED:
+        await profile_stream.start()
+    yield
+    stop_warmup()
+    warmup_task.cancel()
+    await profile_stream.stop()
+    await run_in_threadpool(outbox_dispatcher.stop)
+    await run_in_threadpool(revocation_list.stop)
+    invalidation_bus.stop()
+    if gc_task:
+        gc_task.cancel()
+    if replica_task:
+        replica_task.cancel()
+    if image_queue.running:
+        await image_queue.stop()
 
 app = FastAPI(
     title="Conectando Corazones API",
@@ -13,16 +80,28 @@ app = FastAPI(
     # Configurar las rutas de documentación explícitamente
     docs_url="/api/docs",          # Cambiado de /docs a /api/docs
     redoc_url="/api/redoc",        # Cambiado de /redoc a /api/redoc
-    openapi_url="/api/openapi.json" # Cambiado de /openapi.json a /api/openapi.json
+    openapi_url="/api/openapi.json", # Cambiado de /openapi.json a /api/openapi.json
+    lifespan=lifespan
 )
 
-# Crear directorio para imágenes si no existe
-UPLOAD_DIR = "uploads"
-if not os.path.exists(UPLOAD_DIR):
-    os.makedirs(UPLOAD_DIR)
+# Montar directorio de archivos estáticos (o redirigir al almacenamiento externo)
+storage = get_storage()
+if isinstance(storage, LocalStorage):
+    app.mount("/uploads", StaticFiles(directory=storage.root), name="uploads")
+else:
+    app.include_router(upload_public_router)
+
+# Rechazar subidas demasiado grandes antes de procesar el formulario
+app.add_middleware(UploadLimitMiddleware)
+
+# Contar las consultas SQL por petición y vigilar los presupuestos de cada ruta
+app.add_middleware(QueryBudgetMiddleware)
+
+# Perfilado bajo demanda (cabecera X-Profile de superusuario o PROFILE_SAMPLE_RULES)
+app.add_middleware(ProfilingMiddleware)
 
-# Montar directorio de archivos estáticos
-app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
+# Enviar las lecturas a las réplicas cuando estén configuradas
+app.add_middleware(ReplicaRoutingMiddleware)
 
 # Configurar CORS
 app.add_middleware(
@@ -40,4 +119,8 @@ app.add_middleware(
 app.include_router(user_router, prefix="/api")
 app.include_router(auth_router, prefix="/api")
 app.include_router(profile_router, prefix="/api")
+app.include_router(upload_router, prefix="/api")
+app.include_router(health_router, prefix="/api")
+app.include_router(profiler_router, prefix="/api")
+app.include_router(backup_router, prefix="/api")
 
@@ -0,0 +1,106 @@
+"""
+Configuración común de las pruebas: una base SQLite y una carpeta de uploads
+temporales. Las variables se fijan antes de importar la aplicación porque los
+módulos leen la configuración al importarse (load_dotenv no las sobrescribe).
+"""
+import io
+import os
+import tempfile
+import uuid
+
+TEST_DIR = tempfile.mkdtemp(prefix="conectando-corazones-tests-")
+os.environ["DB_DRIVER"] = ""
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TEST_DIR, 'test.db')}"
+os.environ["DB_REPLICA_URLS"] = ""
+os.environ["UPLOAD_DIR"] = os.path.join(TEST_DIR, "uploads")
+os.environ["STORAGE_BACKEND"] = "local"
+os.environ["QUERY_BUDGET_MODE"] = "off"
+os.environ["PROFILE_DIR"] = os.path.join(TEST_DIR, "flamegraphs")
+os.environ["CACHE_ENABLED"] = "false"
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+from sqlalchemy import event
+
+import main
+from app.database.connection import engine
+from app.services.user_service import SUPERUSER_KEY
+
+PASSWORD = "secret123"
+
+
+class QueryRecorder:
+    """
+    Sentencias SQL ejecutadas en el primario (evento before_cursor_execute)
+    """
+
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def clear(self):
+        self.statements.clear()
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+
+@pytest.fixture(scope="session")
+def client():
+    # Sin el lifespan: no arrancan los hilos de fondo (outbox, revocaciones, cola
+    # de imágenes...), así que todas las consultas contadas son de la petición
+    return TestClient(main.app)
+
+
+def login(client, username: str, password: str = PASSWORD) -> dict:
+    response = client.post("/api/auth/login", json={"username_or_email": username, "password": password})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.fixture(scope="session")
+def superuser_headers(client):
+    response = client.post("/api/users/create_superuser", json={
+        "username": "admin",
+        "email": "admin@example.com",
+        "password": PASSWORD,
+        "superuser_key": SUPERUSER_KEY,
+    })
+    assert response.status_code == 200, response.text
+    return login(client, "admin")
+
+
+@pytest.fixture
+def make_user(client, superuser_headers):
+    """
+    Crea un usuario (con su perfil) y devuelve su id y las cabeceras con su token
+    """
+    def create(prefix: str = "user"):
+        username = f"{prefix}{uuid.uuid4().hex[:8]}"
+        response = client.post("/api/users/", headers=superuser_headers, json={
+            "username": username,
+            "email": f"{username}@example.com",
+            "password": PASSWORD,
+        })
+        assert response.status_code == 200, response.text
+        return response.json()["id"], login(client, username)
+
+    return create
+
+
+@pytest.fixture
+def queries():
+    recorder = QueryRecorder()
+    event.listen(engine, "before_cursor_execute", recorder)
+    yield recorder
+    event.remove(engine, "before_cursor_execute", recorder)
+
+
+def png_bytes(size=(64, 48), color="red") -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, "PNG")
+    return buffer.getvalue()
@@ -0,0 +1,77 @@
+"""
+GET /api/users/availability: libre/ocupado y comprobación en la base cuando
+el filtro de Bloom no puede descartar el valor (falsos positivos incluidos)
+"""
+import uuid
+
+from app.services.availability_service import BloomFilter, availability_filter
+
+
+def availability(client, **params) -> dict:
+    response = client.get("/api/users/availability", params=params)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def user_queries(queries) -> list:
+    return [s for s in queries.statements if "FROM users" in s]
+
+
+def test_taken_and_free(client, make_user, superuser_headers):
+    user_id, _ = make_user()
+    user = client.get(f"/api/users/{user_id}", headers=superuser_headers).json()
+    free = f"free{uuid.uuid4().hex[:8]}"
+
+    assert availability(client, username=user["username"]) == {"username": False, "email": None}
+    assert availability(client, email=user["email"]) == {"username": None, "email": False}
+    assert availability(client, username=free, email=f"{free}@example.com") == {"username": True, "email": True}
+    assert availability(client, username=free, email=user["email"]) == {"username": True, "email": False}
+
+
+def test_new_user_is_taken_immediately(client, make_user, superuser_headers):
+    availability(client, username="warmup")
+    # El filtro ya está construido: el usuario nuevo llega por after_commit
+    user_id, _ = make_user()
+    username = client.get(f"/api/users/{user_id}", headers=superuser_headers).json()["username"]
+    assert availability(client, username=username)["username"] is False
+
+
+def test_free_value_is_answered_without_the_database(client, superuser_headers, queries):
+    availability(client, username="warmup")
+    queries.clear()
+    assert availability(client, username=f"free{uuid.uuid4().hex[:8]}")["username"] is True
+    assert user_queries(queries) == []
+
+
+def test_false_positive_falls_back_to_the_database(client, superuser_headers, queries):
+    availability(client, username="warmup")
+    ghost = f"ghost{uuid.uuid4().hex[:8]}"
+    # El filtro dice "puede estar" para un valor que nadie usa
+    availability_filter._filter.add(f"u:{ghost}")
+    queries.clear()
+    assert availability(client, username=ghost)["username"] is True
+    assert len(user_queries(queries)) == 1
+
+
+def test_renamed_user_frees_the_old_username(client, make_user, superuser_headers):
+    user_id, _ = make_user()
+    old = client.get(f"/api/users/{user_id}", headers=superuser_headers).json()["username"]
+    response = client.put(f"/api/users/{user_id}", headers=superuser_headers, json={"username": f"new{old}"})
+    assert response.status_code == 200, response.text
+    # El nombre antiguo sigue en el filtro hasta la reconstrucción: lo resuelve la base
+    assert availability(client, username=old)["username"] is True
+    assert availability(client, username=f"new{old}")["username"] is False
+
+
+def test_requires_username_or_email(client):
+    assert client.get("/api/users/availability").status_code == 400
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    values = [f"u:user{i}" for i in range(1000)]
+    for value in values:
+        bloom.add(value)
+    assert all(value in bloom for value in values)
+    false_positives = sum(f"u:other{i}" in bloom for i in range(10_000))
+    assert false_positives < 300
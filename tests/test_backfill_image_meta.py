@@ -0,0 +1,84 @@
+"""
+Cálculo de image_meta para imágenes antiguas: un perfil modificado a mitad de
+lote no deja el lote sin completar
+"""
+import io
+
+import pytest
+from sqlalchemy import select, update
+
+from app.database.connection import SessionLocal
+from app.models.profile_model import Profile
+from app.services import image_queue_service
+from app.services.image_service import ImageService
+from app.services.storage_service import get_storage, path_for_key
+from tests.conftest import png_bytes
+
+
+def profiles_with_old_images(client, make_user, count: int) -> list:
+    storage = get_storage()
+    profile_ids = [client.get("/api/profiles/me", headers=make_user()[1]).json()["id"] for _ in range(count)]
+    db = SessionLocal()
+    try:
+        for profile_id in profile_ids:
+            key = f"legacy-{profile_id}.png"
+            storage.save(key, io.BytesIO(png_bytes()), "image/png")
+            db.execute(
+                update(Profile).where(Profile.id == profile_id).values(cover_image=path_for_key(key), image_meta=None)
+            )
+        db.commit()
+    finally:
+        db.close()
+    return sorted(profile_ids)
+
+
+def cover_meta(profile_ids: list) -> dict:
+    db = SessionLocal()
+    try:
+        rows = db.execute(select(Profile.id, Profile.image_meta).where(Profile.id.in_(profile_ids)))
+        return {row.id: (row.image_meta or {}).get("cover_image") for row in rows}
+    finally:
+        db.close()
+
+
+def edit_during_read(monkeypatch, profile_id: str, times: int):
+    """
+    Otro proceso modifica el perfil mientras se leen sus imágenes (times veces)
+    """
+    read_image_meta = ImageService.read_image_meta
+    edits = []
+
+    def read_and_edit(source, ext):
+        if len(edits) < times and profile_id in getattr(source, "name", ""):
+            edits.append(profile_id)
+            db = SessionLocal()
+            try:
+                db.execute(update(Profile).where(Profile.id == profile_id).values(
+                    description="editado", version=Profile.version + 1
+                ))
+                db.commit()
+            finally:
+                db.close()
+        return read_image_meta(source, ext)
+
+    monkeypatch.setattr(ImageService, "read_image_meta", staticmethod(read_and_edit))
+    return edits
+
+
+def test_stale_profile_retries_the_whole_batch(client, make_user, monkeypatch):
+    profile_ids = profiles_with_old_images(client, make_user, 3)
+    edits = edit_during_read(monkeypatch, profile_ids[0], times=1)
+
+    image_queue_service.backfill_image_meta(batch_size=1000)
+
+    assert edits == [profile_ids[0]]
+    meta = cover_meta(profile_ids)
+    assert all(meta[profile_id] for profile_id in profile_ids), meta
+
+
+def test_profile_that_keeps_changing_fails_loudly(client, make_user, monkeypatch):
+    profile_ids = profiles_with_old_images(client, make_user, 2)
+    edit_during_read(monkeypatch, profile_ids[0], times=10)
+
+    with pytest.raises(RuntimeError):
+        image_queue_service.backfill_image_meta(batch_size=1000, max_attempts=3)
@@ -0,0 +1,179 @@
+"""
+Exportación e importación del directorio: ida y vuelta a una base vacía,
+reanudación tras un corte, conflictos con usuarios existentes e imágenes
+guardadas sin comprimir y enviadas a trozos
+"""
+import io
+import json
+import os
+import uuid
+import zipfile
+
+import pytest
+from sqlalchemy import create_engine, func, insert, select, update
+
+from app.database.connection import SessionLocal
+from app.models.base_model import Base
+from app.models.outbox_event_model import OutboxEvent
+from app.models.profile_model import Profile
+from app.models.user_model import User
+from app.services import backup_service
+from app.services.storage_service import LocalStorage, get_storage, path_for_key
+from tests.conftest import TEST_DIR
+
+
+@pytest.fixture
+def cover_image(client, make_user):
+    """
+    Perfil con una portada mayor que CHUNK_SIZE; devuelve (profile_id, clave, bytes)
+    """
+    profile_id = client.get("/api/profiles/me", headers=make_user()[1]).json()["id"]
+    key = f"backup-{profile_id}.png"
+    data = os.urandom(backup_service.CHUNK_SIZE * 2 + 123)
+    get_storage().save(key, io.BytesIO(data), "image/png")
+    db = SessionLocal()
+    try:
+        db.execute(update(Profile).where(Profile.id == profile_id).values(cover_image=path_for_key(key)))
+        db.commit()
+    finally:
+        db.close()
+    return profile_id, key, data
+
+
+@pytest.fixture
+def exported(client, superuser_headers, cover_image) -> bytes:
+    response = client.get("/api/backup/export", headers=superuser_headers)
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"] == "application/zip"
+    return response.content
+
+
+@pytest.fixture
+def target(monkeypatch):
+    """
+    Base y almacenamiento vacíos donde se importa la copia
+    """
+    name = uuid.uuid4().hex[:8]
+    target_engine = create_engine(f"sqlite:///{os.path.join(TEST_DIR, f'import-{name}.db')}")
+    Base.metadata.create_all(target_engine)
+    storage = LocalStorage(root=os.path.join(TEST_DIR, f"import-{name}"))
+    monkeypatch.setattr(backup_service, "engine", target_engine)
+    monkeypatch.setattr(backup_service, "get_storage", lambda: storage)
+    yield target_engine, storage
+    target_engine.dispose()
+
+
+def ndjson(archive: zipfile.ZipFile, name: str) -> list:
+    return [json.loads(line) for line in archive.read(name).splitlines() if line.strip()]
+
+
+def table_ids(connection, table) -> set:
+    return set(connection.execute(select(table.c.id)).scalars())
+
+
+def test_export_import_round_trip(exported, cover_image, target):
+    profile_id, key, data = cover_image
+    target_engine, storage = target
+    with zipfile.ZipFile(io.BytesIO(exported)) as archive:
+        manifest = json.loads(archive.read("manifest.json"))
+        users = ndjson(archive, "users.ndjson")
+        profiles = ndjson(archive, "profiles.ndjson")
+    assert manifest["users"] == len(users) and manifest["profiles"] == len(profiles)
+    assert profile_id in {profile["id"] for profile in profiles}
+
+    report = backup_service.import_directory(io.BytesIO(exported), batch_size=3)
+
+    assert (report.users, report.profiles, report.conflicts) == (len(users), len(profiles), 0)
+    assert report.images >= 1
+    with target_engine.connect() as connection:
+        assert table_ids(connection, User.__table__) == {user["id"] for user in users}
+        assert table_ids(connection, Profile.__table__) == {profile["id"] for profile in profiles}
+        imported = connection.execute(select(Profile.cover_image).where(Profile.id == profile_id)).scalar()
+        events = connection.execute(select(func.count()).select_from(OutboxEvent)).scalar()
+    assert imported == path_for_key(key)
+    assert events == len(users) + len(profiles)
+    with storage.open(key) as source:
+        assert source.read() == data
+
+    # Repetirla no duplica nada
+    again = backup_service.import_directory(io.BytesIO(exported), batch_size=3)
+    assert (again.users, again.profiles, again.images) == (0, 0, 0)
+    assert again.skipped == len(users) + len(profiles) + report.images
+
+
+def test_import_resumes_after_a_partial_run(exported, target, monkeypatch):
+    target_engine, _ = target
+    import_batch = backup_service._import_batch
+    calls = []
+
+    def crash_on_second_batch(table, rows, report):
+        calls.append(table.name)
+        if len(calls) == 2:
+            raise RuntimeError("conexión perdida")
+        return import_batch(table, rows, report)
+
+    # Al menos el superusuario y el dueño de la portada: el corte llega a mitad de los usuarios
+    monkeypatch.setattr(backup_service, "_import_batch", crash_on_second_batch)
+    with pytest.raises(RuntimeError):
+        backup_service.import_directory(io.BytesIO(exported), batch_size=1)
+    with target_engine.connect() as connection:
+        partial = len(table_ids(connection, User.__table__))
+        assert not table_ids(connection, Profile.__table__)
+    assert partial == 1
+
+    monkeypatch.setattr(backup_service, "_import_batch", import_batch)
+    report = backup_service.import_directory(io.BytesIO(exported), batch_size=1)
+    with zipfile.ZipFile(io.BytesIO(exported)) as archive:
+        users = ndjson(archive, "users.ndjson")
+        profiles = ndjson(archive, "profiles.ndjson")
+    assert report.users == len(users) - partial
+    assert report.profiles == len(profiles)
+    with target_engine.connect() as connection:
+        assert table_ids(connection, User.__table__) == {user["id"] for user in users}
+        # Un evento por fila importada, también con la importación en dos veces
+        events = connection.execute(select(func.count()).select_from(OutboxEvent)).scalar()
+    assert events == len(users) + len(profiles)
+
+
+def test_import_skips_rows_that_conflict_with_existing_users(exported, target):
+    target_engine, _ = target
+    with zipfile.ZipFile(io.BytesIO(exported)) as archive:
+        users = ndjson(archive, "users.ndjson")
+        profiles = ndjson(archive, "profiles.ndjson")
+    taken = users[0]
+    with target_engine.begin() as connection:
+        # Otro usuario con el mismo username en la base de destino
+        connection.execute(insert(User.__table__), [{
+            "id": uuid.uuid4().hex,
+            "username": taken["username"],
+            "email": "otro@example.com",
+            "password": "x",
+            "is_superuser": False,
+        }])
+
+    report = backup_service.import_directory(io.BytesIO(exported), batch_size=1000)
+
+    orphaned = [profile for profile in profiles if profile["user_id"] == taken["id"]]
+    assert report.users == len(users) - 1
+    assert report.profiles == len(profiles) - len(orphaned)
+    assert report.conflicts == 1 + len(orphaned)
+    with target_engine.connect() as connection:
+        ids = table_ids(connection, User.__table__)
+    assert taken["id"] not in ids
+    assert {user["id"] for user in users[1:]} <= ids
+
+
+def test_images_are_stored_and_streamed_in_chunks(cover_image, monkeypatch):
+    _, key, data = cover_image
+    monkeypatch.setattr(backup_service, "CHUNK_SIZE", 64 * 1024)
+    chunks = list(backup_service.export_directory())
+
+    # La imagen llega en varios trozos, ninguno mucho mayor que CHUNK_SIZE
+    assert len(chunks) > len(data) // backup_service.CHUNK_SIZE
+    assert max(len(chunk) for chunk in chunks) < backup_service.CHUNK_SIZE * 2
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as archive:
+        info = archive.getinfo(f"{backup_service.IMAGES_PREFIX}{key}")
+        assert info.compress_type == zipfile.ZIP_STORED
+        assert info.compress_size == info.file_size == len(data)
+        assert archive.read(info) == data
+        assert archive.getinfo("users.ndjson").compress_type == zipfile.ZIP_DEFLATED
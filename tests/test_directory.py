@@ -0,0 +1,108 @@
+"""
+Directorio precalculado: tras aplicar perfiles modificados conserva el mismo
+orden (created_at, id) que una reconstrucción completa y que el listado completo,
+y los perfiles que marca el bus mientras tanto no se pierden.
+"""
+import json
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+from sqlalchemy.exc import OperationalError
+
+from app.database.connection import SessionLocal
+from app.models.profile_model import Profile
+from app.services.directory_service import DirectorySnapshot
+from app.services.profile_service import ProfileService
+
+
+def listed_ids(body: bytes) -> list:
+    return [entry["id"] for entry in json.loads(body)]
+
+
+def test_dirty_profiles_keep_full_build_order(client, make_user):
+    db = SessionLocal()
+    try:
+        snapshot = DirectorySnapshot(max_age=3600)
+        make_user()
+        snapshot.get(db)
+
+        new_ids = [client.get("/api/profiles/me", headers=make_user()[1]).json()["id"] for _ in range(3)]
+        # Uno de los nuevos con un created_at anterior a todos (reloj de otro worker)
+        db.execute(update(Profile).where(Profile.id == new_ids[1]).values(created_at=datetime(2000, 1, 1)))
+        db.commit()
+        for profile_id in reversed(new_ids):
+            snapshot.mark_dirty(profile_id)
+        body, _ = snapshot.get(db)
+
+        rebuilt, _ = DirectorySnapshot(max_age=3600).get(db)
+        assert listed_ids(body) == listed_ids(rebuilt)
+        assert listed_ids(body) == [profile.id for profile in ProfileService(db).get_all_profiles()]
+        assert listed_ids(body)[0] == new_ids[1]
+
+        # Perfiles nuevos posteriores a todos: se añaden al final en su orden
+        later = [client.get("/api/profiles/me", headers=make_user()[1]).json()["id"] for _ in range(2)]
+        db.execute(update(Profile).where(Profile.id == later[0]).values(created_at=datetime.utcnow() + timedelta(days=2)))
+        db.execute(update(Profile).where(Profile.id == later[1]).values(created_at=datetime.utcnow() + timedelta(days=1)))
+        db.commit()
+        for profile_id in later:
+            snapshot.mark_dirty(profile_id)
+        body, _ = snapshot.get(db)
+        assert listed_ids(body)[-2:] == [later[1], later[0]]
+        assert listed_ids(body) == listed_ids(DirectorySnapshot(max_age=3600).get(db)[0])
+    finally:
+        db.close()
+
+
+def test_mark_dirty_while_applying(client, make_user):
+    profile_ids = [client.get("/api/profiles/me", headers=make_user()[1]).json()["id"] for _ in range(5)]
+    db = SessionLocal()
+    try:
+        snapshot = DirectorySnapshot(max_age=3600)
+        snapshot.get(db)
+        stop = threading.Event()
+        errors = []
+
+        def bus_thread():
+            # Como el hilo del bus de invalidación: marca perfiles sin parar
+            while not stop.is_set():
+                for profile_id in profile_ids:
+                    snapshot.mark_dirty(profile_id)
+
+        thread = threading.Thread(target=bus_thread)
+        thread.start()
+        try:
+            for _ in range(50):
+                try:
+                    snapshot._apply_dirty(db)
+                except RuntimeError as e:
+                    errors.append(e)
+        finally:
+            stop.set()
+            thread.join()
+        assert not errors
+    finally:
+        db.close()
+
+
+def test_failed_apply_keeps_dirty_profiles(client, make_user):
+    profile_id = client.get("/api/profiles/me", headers=make_user()[1]).json()["id"]
+    db = SessionLocal()
+    try:
+        snapshot = DirectorySnapshot(max_age=3600)
+        snapshot.get(db)
+        snapshot.mark_dirty(profile_id)
+
+        class BrokenSession:
+            def execute(self, *args, **kwargs):
+                raise OperationalError("SELECT", {}, Exception("base caída"))
+
+        with pytest.raises(OperationalError):
+            snapshot._apply_dirty(BrokenSession())
+        # El perfil sigue pendiente y se aplica en el siguiente intento
+        assert snapshot._dirty == {profile_id}
+        snapshot._apply_dirty(db)
+        assert not snapshot._dirty
+    finally:
+        db.close()
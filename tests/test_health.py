@@ -0,0 +1,76 @@
+"""
+Calentamiento y /api/health/ready
+"""
+from app.services import health_service
+from app.services.health_service import WarmupState, run_warmup, warmup_state
+
+
+def flaky(failures: int):
+    calls = []
+
+    def step():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise RuntimeError("todavía no")
+
+    step.calls = calls
+    return step
+
+
+def test_ready_only_after_required_steps_succeed(monkeypatch):
+    state = WarmupState()
+    monkeypatch.setattr(health_service, "warmup_state", state)
+    monkeypatch.setattr(health_service, "WARMUP_RETRY_SECONDS", 0.01)
+    database = flaky(2)
+    optional = flaky(100)
+    monkeypatch.setattr(health_service, "WARMUP_OPTIONAL_ATTEMPTS", 3)
+
+    run_warmup([("database", database), ("listing", lambda: None), ("jwt", optional)], required={"database", "listing"})
+
+    assert state.ready
+    assert len(database.calls) == 3
+    assert "database" not in state.errors
+    # El opcional se abandona tras sus intentos y queda en errors sin bloquear la instancia
+    assert len(optional.calls) == 3
+    assert "jwt" in state.errors
+    assert not state.running
+
+
+def test_required_failure_keeps_instance_not_ready(monkeypatch):
+    state = WarmupState()
+    monkeypatch.setattr(health_service, "warmup_state", state)
+    monkeypatch.setattr(health_service, "WARMUP_RETRY_SECONDS", 0.01)
+    seen = []
+
+    def database():
+        seen.append(state.ready)
+        # Se apaga la instancia mientras la base sigue sin responder
+        if len(seen) == 3:
+            health_service.stop_warmup()
+        raise RuntimeError("sin conexión")
+
+    run_warmup([("database", database)], required={"database"})
+
+    assert not state.ready
+    assert seen == [False, False, False]
+    assert state.errors["database"] == "sin conexión"
+
+
+def test_ready_endpoint(client, monkeypatch):
+    monkeypatch.setattr(warmup_state, "ready", False)
+    monkeypatch.setattr(warmup_state, "errors", {"database": "sin conexión"})
+    response = client.get("/api/health/ready")
+    assert response.status_code == 503
+    assert response.json()["errors"] == {"database": "sin conexión"}
+
+    monkeypatch.setattr(warmup_state, "ready", True)
+    monkeypatch.setattr(warmup_state, "errors", {})
+    assert client.get("/api/health/ready").status_code == 200
+
+
+def test_query_cache_requires_superuser(client, make_user, superuser_headers):
+    assert client.get("/api/health/query-cache").status_code == 401
+    assert client.get("/api/health/query-cache", headers=make_user()[1]).status_code == 403
+    response = client.get("/api/health/query-cache", headers=superuser_headers)
+    assert response.status_code == 200
+    assert "primary" in response.json()
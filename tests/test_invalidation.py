@@ -0,0 +1,52 @@
+"""
+Bus de invalidación por sondeo de la tabla cache_invalidations (bases sin LISTEN/NOTIFY)
+"""
+import threading
+import time
+
+from sqlalchemy.exc import OperationalError
+
+from app.database.connection import engine
+from app.services import invalidation_service
+from app.services.invalidation_service import InvalidationBus
+
+
+class FlakyEngine:
+    """
+    Engine que falla las primeras conexiones (base caída al arrancar el worker)
+    """
+
+    def __init__(self, failures: int):
+        self.failures = failures
+
+    def connect(self):
+        if self.failures:
+            self.failures -= 1
+            raise OperationalError("SELECT 1", {}, Exception("base no disponible"))
+        return engine.connect()
+
+    def begin(self):
+        return engine.begin()
+
+
+def test_polling_survives_a_database_outage_at_startup(monkeypatch):
+    listener = InvalidationBus(poll_interval=0.01)
+    listener.use_notify = False
+    other_worker = InvalidationBus()
+    other_worker.use_notify = False
+    monkeypatch.setattr(invalidation_service, "engine", FlakyEngine(failures=2))
+    received = threading.Event()
+    listener.subscribe("profile", lambda entity_id: entity_id == "changed-profile" and received.set())
+
+    listener.start()
+    try:
+        # Cuando la base vuelve, el bus sigue recibiendo los cambios de otros workers
+        deadline = time.monotonic() + 5
+        while invalidation_service.engine.failures and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # Una vuelta más para que el bus lea el último id antes de publicar
+        time.sleep(0.05)
+        other_worker.publish("profile", "changed-profile")
+        assert received.wait(5)
+    finally:
+        listener.stop()
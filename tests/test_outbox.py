@@ -0,0 +1,124 @@
+"""
+Entrega del outbox cuando los ids se confirman fuera de orden y eventos apartados
+por fallos de los suscriptores
+"""
+import time
+import uuid
+
+import pytest
+from sqlalchemy import func, insert, select
+
+from app.database.connection import engine
+from app.models.outbox_event_model import OutboxCheckpoint, OutboxEvent, OutboxFailure
+from app.services import outbox_service
+from app.services.outbox_service import OutboxDispatcher
+
+
+@pytest.fixture
+def dispatcher(monkeypatch):
+    monkeypatch.setattr(outbox_service, "OUTBOX_GAP_TIMEOUT", 0)
+    dispatcher = OutboxDispatcher(consumer=f"test-{uuid.uuid4().hex[:8]}")
+    dispatcher.delivered = []
+    dispatcher.subscribe("test", lambda event: dispatcher.delivered.append(event.id))
+    with engine.begin() as connection:
+        base = (connection.execute(select(func.max(OutboxEvent.id))).scalar() or 0) + 100
+        connection.execute(insert(OutboxCheckpoint).values(consumer=dispatcher.consumer, last_id=base))
+    dispatcher.base = base
+    return dispatcher
+
+
+def add_event(event_id: int):
+    with engine.begin() as connection:
+        connection.execute(insert(OutboxEvent).values(id=event_id, topic="test", entity_id="x", action="updated"))
+
+
+def checkpoint(dispatcher):
+    with engine.connect() as connection:
+        return connection.execute(
+            select(OutboxCheckpoint.last_id, OutboxCheckpoint.skipped_ids)
+            .where(OutboxCheckpoint.consumer == dispatcher.consumer)
+        ).first()
+
+
+def test_late_commit_is_delivered_after_skipping(dispatcher):
+    base = dispatcher.base
+    add_event(base + 1)
+    add_event(base + 3)
+
+    assert dispatcher.dispatch_batch() == 2
+    assert dispatcher.delivered == [base + 1, base + 3]
+    state = checkpoint(dispatcher)
+    assert state.last_id == base + 3
+    assert list(state.skipped_ids) == [str(base + 2)]
+
+    # La transacción del id que faltaba hace commit más tarde
+    add_event(base + 2)
+    assert dispatcher.dispatch_batch() == 1
+    assert dispatcher.delivered == [base + 1, base + 3, base + 2]
+    assert checkpoint(dispatcher).skipped_ids is None
+
+
+def test_skipped_ids_expire_after_horizon(dispatcher, monkeypatch):
+    base = dispatcher.base
+    add_event(base + 2)
+    dispatcher.dispatch_batch()
+    assert list(checkpoint(dispatcher).skipped_ids) == [str(base + 1)]
+
+    monkeypatch.setattr(outbox_service, "OUTBOX_SKIPPED_HORIZON", 0)
+    time.sleep(0.01)
+    dispatcher.dispatch_batch()
+    assert checkpoint(dispatcher).skipped_ids is None
+    # Si aparece después ya no se entrega
+    add_event(base + 1)
+    dispatcher.dispatch_batch()
+    assert dispatcher.delivered == [base + 2]
+
+
+def test_gap_waits_before_skipping(dispatcher, monkeypatch):
+    monkeypatch.setattr(outbox_service, "OUTBOX_GAP_TIMEOUT", 60)
+    base = dispatcher.base
+    add_event(base + 2)
+    assert dispatcher.dispatch_batch() == 0
+    state = checkpoint(dispatcher)
+    assert state.last_id == base and state.skipped_ids is None
+
+
+def test_failing_subscriber_parks_the_event_and_replay_requeues_it(dispatcher, monkeypatch):
+    monkeypatch.setattr(outbox_service, "OUTBOX_MAX_ATTEMPTS", 2)
+    base = dispatcher.base
+    broken = {"active": True}
+
+    def flaky(event):
+        if broken["active"] and event.entity_id == "roto":
+            raise RuntimeError("suscriptor caído")
+        dispatcher.delivered.append(event.id)
+
+    dispatcher._subscribers["test"] = [flaky]
+    with engine.begin() as connection:
+        connection.execute(insert(OutboxEvent).values(id=base + 1, topic="test", entity_id="roto", action="updated"))
+    add_event(base + 2)
+
+    # Primer intento: se reintenta y el checkpoint no avanza
+    assert dispatcher.dispatch_batch() == 0
+    assert checkpoint(dispatcher).last_id == base
+    # Segundo intento: se aparta y los siguientes se entregan
+    assert dispatcher.dispatch_batch() == 2
+    assert dispatcher.delivered == [base + 2]
+    assert checkpoint(dispatcher).last_id == base + 2
+    with engine.connect() as connection:
+        failures = connection.execute(
+            select(OutboxFailure).where(OutboxFailure.consumer == dispatcher.consumer)
+        ).all()
+    assert [(row.event_id, row.entity_id, row.attempts) for row in failures] == [(base + 1, "roto", 2)]
+    assert "suscriptor caído" in failures[0].error
+
+    # Arreglado el suscriptor, se vuelve a encolar como evento nuevo
+    broken["active"] = False
+    assert outbox_service.replay_failures(dispatcher.consumer) == 1
+    assert dispatcher.dispatch_batch() == 1
+    assert len(dispatcher.delivered) == 2 and dispatcher.delivered[-1] > base + 2
+    with engine.connect() as connection:
+        remaining = connection.execute(
+            select(func.count()).select_from(OutboxFailure).where(OutboxFailure.consumer == dispatcher.consumer)
+        ).scalar()
+    assert remaining == 0
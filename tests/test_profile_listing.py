@@ -0,0 +1,30 @@
+"""
+Listado paginado de GET /api/profiles: recuentos por filtro bajo demanda y esquema OpenAPI
+"""
+import main
+
+
+def test_facets_only_when_requested(client, make_user, queries):
+    make_user()
+    queries.clear()
+    response = client.get("/api/profiles", params={"has_cover": "false", "limit": 5})
+    assert response.status_code == 200, response.text
+    listing = response.json()
+    assert listing["facets"] is None
+    assert listing["total"] >= 1
+    assert not any("sum(" in statement.lower() for statement in queries.statements)
+
+    response = client.get("/api/profiles", params={"has_cover": "false", "limit": 5, "facets": "true"})
+    assert response.status_code == 200, response.text
+    listing = response.json()
+    assert set(listing["facets"]) == {"has_cover", "has_whatsapp", "has_facebook"}
+    assert listing["facets"]["has_cover"] == 0
+    assert listing["total"] >= 1
+
+
+def test_openapi_declares_both_response_shapes():
+    schema = main.app.openapi()
+    response = schema["paths"]["/api/profiles"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+    variants = response.get("anyOf", [])
+    refs = {variant.get("$ref") or variant.get("items", {}).get("$ref") for variant in variants}
+    assert refs == {"#/components/schemas/AllProfilesResponse", "#/components/schemas/ProfileListingResponse"}
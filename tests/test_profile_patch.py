@@ -0,0 +1,81 @@
+"""
+PATCH /api/profiles/{id}: If-Match con la versión del perfil, permisos y el
+camino sin UPDATE ... RETURNING (MySQL)
+"""
+import uuid
+
+import pytest
+
+from app.database.connection import engine
+
+
+@pytest.fixture(params=[True, False], ids=["returning", "no_returning"])
+def update_returning(request, monkeypatch):
+    if not request.param:
+        monkeypatch.setattr(engine.dialect, "update_returning", False)
+    return request.param
+
+
+def my_profile(client, headers):
+    response = client.get("/api/profiles/me", headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_patch_applies_and_returns_new_etag(client, make_user, queries, update_returning):
+    _, headers = make_user()
+    profile = my_profile(client, headers)
+    queries.clear()
+    response = client.patch(
+        f"/api/profiles/{profile['id']}",
+        headers={**headers, "If-Match": f'"{profile["version"]}"'},
+        json={"description": "nueva"},
+    )
+    assert response.status_code == 200, response.text
+    assert response.json()["description"] == "nueva"
+    assert response.json()["version"] == profile["version"] + 1
+    assert response.headers["ETag"] == f'"{profile["version"] + 1}"'
+    updates = [s for s in queries.statements if s.startswith("UPDATE profiles")]
+    assert len(updates) == 1 and ("RETURNING" in updates[0]) == update_returning
+
+
+def test_stale_if_match_is_412(client, make_user, update_returning):
+    _, headers = make_user()
+    profile = my_profile(client, headers)
+    stale = {**headers, "If-Match": f'W/"{profile["version"]}"'}
+    assert client.patch(f"/api/profiles/{profile['id']}", headers=stale, json={"name": "uno"}).status_code == 200
+
+    response = client.patch(f"/api/profiles/{profile['id']}", headers=stale, json={"name": "dos"})
+    assert response.status_code == 412, response.text
+    assert my_profile(client, headers)["name"] == "uno"
+
+
+def test_other_users_profile_is_403(client, make_user, update_returning):
+    _, owner_headers = make_user()
+    _, other_headers = make_user()
+    profile = my_profile(client, owner_headers)
+    response = client.patch(f"/api/profiles/{profile['id']}", headers=other_headers, json={"name": "ajeno"})
+    assert response.status_code == 403, response.text
+    assert my_profile(client, owner_headers)["name"] == profile["name"]
+
+
+def test_missing_profile_is_404(client, superuser_headers, update_returning):
+    response = client.patch(f"/api/profiles/{uuid.uuid4().hex}", headers=superuser_headers, json={"name": "nadie"})
+    assert response.status_code == 404, response.text
+
+
+def test_superuser_can_patch_any_profile(client, make_user, superuser_headers, update_returning):
+    _, headers = make_user()
+    profile = my_profile(client, headers)
+    response = client.patch(f"/api/profiles/{profile['id']}", headers=superuser_headers, json={"name": "admin"})
+    assert response.status_code == 200, response.text
+    assert my_profile(client, headers)["name"] == "admin"
+
+
+def test_malformed_if_match_is_412(client, make_user):
+    _, headers = make_user()
+    profile = my_profile(client, headers)
+    response = client.patch(
+        f"/api/profiles/{profile['id']}", headers={**headers, "If-Match": '"abc"'}, json={"name": "x"}
+    )
+    assert response.status_code == 412, response.text
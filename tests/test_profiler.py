@@ -0,0 +1,114 @@
+"""
+Perfilado bajo demanda: solo se muestrean los hilos de la petición perfilada
+"""
+import asyncio
+import sys
+import threading
+import time
+import uuid
+
+from starlette.concurrency import run_in_threadpool
+
+from app.database.connection import SessionLocal
+from app.services.profiler_service import StackSampler, profiled_request, read_profile
+from app.services.revocation_service import revocation_list, revoke_user_tokens
+from app.services.user_service import SUPERUSER_KEY
+from tests.conftest import PASSWORD, login
+
+
+def _spin(seconds: float):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def _spin_request(seconds: float):
+    _spin(seconds)
+
+
+def _spin_request_loop(seconds: float):
+    _spin(seconds)
+
+
+def _spin_unrelated(seconds: float):
+    _spin(seconds)
+
+
+def _spin_background(stop: threading.Event):
+    while not stop.is_set():
+        _spin(0.01)
+
+
+def test_sampler_only_records_the_profiled_request():
+    async def scenario():
+        sampler = StackSampler(root="GET /api/test", interval_ms=1)
+
+        async def request():
+            token = profiled_request.set(sampler)
+            sampler.start(request_frame=sys._getframe())
+            try:
+                await run_in_threadpool(_spin_request, 0.2)
+                _spin_request_loop(0.1)
+            finally:
+                sampler.stop()
+                profiled_request.reset(token)
+
+        async def unrelated():
+            # Otra petición concurrente en el mismo threadpool
+            await run_in_threadpool(_spin_unrelated, 0.3)
+
+        stop = threading.Event()
+        background = threading.Thread(target=_spin_background, args=(stop,), name="image-worker")
+        background.start()
+        try:
+            await asyncio.gather(request(), unrelated())
+        finally:
+            stop.set()
+            background.join()
+        return sampler
+
+    collapsed = asyncio.run(scenario()).collapsed()
+    assert "_spin_request " in collapsed
+    assert "_spin_request_loop" in collapsed
+    assert "_spin_unrelated" not in collapsed
+    assert "_spin_background" not in collapsed
+    assert all(line.startswith("GET_/api/test;") for line in collapsed.splitlines())
+
+
+def test_profile_header_saves_a_profile(client, superuser_headers):
+    response = client.get("/api/profiles", headers={**superuser_headers, "X-Profile": "1"})
+    assert response.status_code == 200
+    profile_id = response.headers["x-profile-id"]
+    read_profile(profile_id)
+
+    # Sin token de superusuario no se perfila
+    response = client.get("/api/profiles", headers={"X-Profile": "1"})
+    assert "x-profile-id" not in response.headers
+
+
+def test_revoked_superuser_token_cannot_profile(client, superuser_headers):
+    username = f"root{uuid.uuid4().hex[:8]}"
+    response = client.post("/api/users/create_superuser", json={
+        "username": username,
+        "email": f"{username}@example.com",
+        "password": PASSWORD,
+        "superuser_key": SUPERUSER_KEY,
+    })
+    assert response.status_code == 200, response.text
+    user_id = response.json()["id"]
+    headers = {**login(client, username), "X-Profile": "1"}
+    assert "x-profile-id" in client.get("/api/health/live", headers=headers).headers
+
+    db = SessionLocal()
+    try:
+        revoke_user_tokens(db, user_id)
+        db.commit()
+    finally:
+        db.close()
+    revocation_list.after_commit()
+
+    response = client.get("/api/health/live", headers=headers)
+    assert response.status_code == 200
+    assert "x-profile-id" not in response.headers
+    # Y tampoco puede descargar los perfiles guardados
+    assert client.get("/api/profiler/samples", headers=headers).status_code == 401
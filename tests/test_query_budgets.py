@@ -0,0 +1,147 @@
+"""
+Presupuestos de consultas SQL: cada ruta declarada con query_budget(n) se
+ejecuta con TestClient y no puede hacer más de n consultas en el camino feliz.
+"""
+import pytest
+
+import main
+from app.services.user_service import SUPERUSER_KEY
+from tests.conftest import PASSWORD, png_bytes
+
+
+def declared_budgets() -> dict:
+    """
+    (método, ruta) -> presupuesto declarado con query_budget()
+    """
+    budgets = {}
+    for route in main.app.routes:
+        for dependency in getattr(route, "dependencies", []):
+            limit = getattr(dependency.dependency, "limit", None)
+            if limit is not None:
+                for method in route.methods:
+                    budgets[(method, route.path)] = limit
+    return budgets
+
+
+BUDGETS = declared_budgets()
+
+
+def assert_within_budget(method: str, path: str, response, queries):
+    assert response.status_code < 400, response.text
+    budget = BUDGETS[(method, path)]
+    statements = "\n".join(queries.statements)
+    assert queries.count <= budget, f"{method} {path}: {queries.count} consultas (presupuesto {budget})\n{statements}"
+    COVERED.add((method, path))
+
+
+COVERED = set()
+
+
+def my_profile_id(client, headers) -> str:
+    response = client.get("/api/profiles/me", headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+def test_create_superuser(client, superuser_headers, queries):
+    queries.clear()
+    response = client.post("/api/users/create_superuser", json={
+        "username": "admin2",
+        "email": "admin2@example.com",
+        "password": PASSWORD,
+        "superuser_key": SUPERUSER_KEY,
+    })
+    assert_within_budget("POST", "/api/users/create_superuser", response, queries)
+
+
+def test_create_user(client, superuser_headers, queries):
+    queries.clear()
+    response = client.post("/api/users/", headers=superuser_headers, json={
+        "username": "budget_user",
+        "email": "budget_user@example.com",
+        "password": PASSWORD,
+    })
+    assert_within_budget("POST", "/api/users/", response, queries)
+
+
+@pytest.mark.parametrize("params", [
+    {"username": "nobody_here"},
+    {"email": "nobody@example.com"},
+    {"username": "admin", "email": "admin@example.com"},
+])
+def test_availability(client, superuser_headers, queries, params):
+    queries.clear()
+    response = client.get("/api/users/availability", params=params)
+    assert_within_budget("GET", "/api/users/availability", response, queries)
+
+
+def test_update_user(client, make_user, superuser_headers, queries):
+    user_id, _ = make_user()
+    queries.clear()
+    response = client.put(f"/api/users/{user_id}", headers=superuser_headers, json={"email": f"new{user_id[:8]}@example.com"})
+    assert_within_budget("PUT", "/api/users/{user_id}", response, queries)
+
+
+def test_get_my_profile(client, make_user, queries):
+    _, headers = make_user()
+    queries.clear()
+    response = client.get("/api/profiles/me", headers=headers)
+    assert_within_budget("GET", "/api/profiles/me", response, queries)
+
+
+@pytest.mark.parametrize("params", [
+    {},
+    {"sort": "newest", "limit": 5},
+    {"has_cover": "false"},
+    {"fields": "id,name"},
+])
+def test_list_profiles(client, make_user, queries, params):
+    make_user()
+    queries.clear()
+    response = client.get("/api/profiles", params=params)
+    assert_within_budget("GET", "/api/profiles", response, queries)
+
+
+def test_list_profiles_by_ids(client, make_user, queries):
+    ids = [my_profile_id(client, make_user()[1]) for _ in range(3)]
+    queries.clear()
+    response = client.get("/api/profiles", params={"ids": ",".join(ids)})
+    assert_within_budget("GET", "/api/profiles", response, queries)
+    assert len(response.json()) == 3
+
+
+def test_get_profile(client, make_user, queries):
+    profile_id = my_profile_id(client, make_user()[1])
+    queries.clear()
+    response = client.get(f"/api/profiles/{profile_id}")
+    assert_within_budget("GET", "/api/profiles/{profile_id}", response, queries)
+
+
+def test_patch_profile(client, make_user, queries):
+    _, headers = make_user()
+    profile_id = my_profile_id(client, headers)
+    queries.clear()
+    response = client.patch(f"/api/profiles/{profile_id}", headers=headers, json={"description": "hola"})
+    assert_within_budget("PATCH", "/api/profiles/{profile_id}", response, queries)
+
+
+@pytest.mark.parametrize("with_images", [False, True])
+def test_update_my_profile(client, make_user, queries, with_images):
+    _, headers = make_user()
+    files = {"cover_image": ("a.png", png_bytes(), "image/png"), "image_1": ("b.png", png_bytes(), "image/png")} if with_images else None
+    queries.clear()
+    response = client.put("/api/profiles/me", headers=headers, data={"name": "Nombre"}, files=files)
+    assert_within_budget("PUT", "/api/profiles/me", response, queries)
+
+
+def test_update_profile(client, make_user, superuser_headers, queries):
+    profile_id = my_profile_id(client, make_user()[1])
+    queries.clear()
+    response = client.put(f"/api/profiles/{profile_id}", headers=superuser_headers, data={"name": "Otro"})
+    assert_within_budget("PUT", "/api/profiles/{profile_id}", response, queries)
+
+
+def test_every_budget_is_exercised():
+    # Se ejecuta al final del módulo: una ruta nueva con query_budget() necesita su prueba
+    missing = set(BUDGETS) - COVERED
+    assert not missing, f"Rutas con presupuesto sin prueba: {sorted(missing)}"
@@ -0,0 +1,112 @@
+"""
+Enrutado de lecturas a las réplicas con dos bases SQLite: el primario de las
+pruebas y una copia que hace de réplica (sin replicación, así que se queda
+con los datos del momento de la copia).
+"""
+import os
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from app.database import connection
+from app.database.connection import ReplicaRouter, engine
+from app.middleware import replica_routing_middleware
+from app.middleware.replica_routing_middleware import PRIMARY_COOKIE, PRIMARY_HEADER, make_primary_marker
+from tests.conftest import TEST_DIR, QueryRecorder
+
+
+@pytest.fixture
+def replica(make_user, client, monkeypatch):
+    user_id, headers = make_user()
+    profile_id = client.get("/api/profiles/me", headers=headers).json()["id"]
+
+    replica_path = os.path.join(TEST_DIR, "replica.db")
+    source = sqlite3.connect(engine.url.database)
+    target = sqlite3.connect(replica_path)
+    source.backup(target)
+    source.close()
+    target.close()
+
+    replica_engine = connection._create_engine(f"sqlite:///{replica_path}")
+    router = ReplicaRouter(engine, [replica_engine], sticky_seconds=5)
+    monkeypatch.setattr(connection, "db_router", router)
+    monkeypatch.setattr(replica_routing_middleware, "db_router", router)
+
+    primary_queries, replica_queries = QueryRecorder(), QueryRecorder()
+    connection.event.listen(engine, "before_cursor_execute", primary_queries)
+    connection.event.listen(replica_engine, "before_cursor_execute", replica_queries)
+    yield {
+        "router": router,
+        "profile_id": profile_id,
+        "headers": headers,
+        "primary": primary_queries,
+        "replica": replica_queries,
+    }
+    connection.event.remove(engine, "before_cursor_execute", primary_queries)
+    connection.event.remove(replica_engine, "before_cursor_execute", replica_queries)
+    replica_engine.dispose()
+    if os.path.isdir(replica_path):
+        os.rmdir(replica_path)
+    else:
+        os.remove(replica_path)
+
+
+def test_anonymous_reads_go_to_the_replica(replica):
+    client = TestClient(main.app)
+    response = client.get(f"/api/profiles/{replica['profile_id']}")
+    assert response.status_code == 200
+    assert replica["replica"].count == 1
+    assert replica["primary"].count == 0
+
+
+def test_reads_after_a_write_stay_on_the_primary(replica):
+    client = TestClient(main.app)
+    profile_id = replica["profile_id"]
+    response = client.patch(f"/api/profiles/{profile_id}", headers=replica["headers"], json={"description": "nueva"})
+    assert response.status_code == 200
+    marker = response.headers[PRIMARY_HEADER]
+    assert client.cookies.get(PRIMARY_COOKIE) == marker
+
+    # Con la cookie: el primario ya tiene la escritura (la réplica no)
+    replica["replica"].clear()
+    response = client.get(f"/api/profiles/{profile_id}")
+    assert response.json()["description"] == "nueva"
+    assert replica["replica"].count == 0
+
+    # Con la cabecera, desde un cliente sin cookies
+    other = TestClient(main.app)
+    response = other.get(f"/api/profiles/{profile_id}", headers={PRIMARY_HEADER: marker})
+    assert response.json()["description"] == "nueva"
+    assert replica["replica"].count == 0
+
+    # Sin marca se lee de la réplica, que sigue con el dato anterior
+    response = TestClient(main.app).get(f"/api/profiles/{profile_id}")
+    assert response.json()["description"] != "nueva"
+    assert replica["replica"].count == 1
+
+
+@pytest.mark.parametrize("marker", [
+    "9999999999999.forged",
+    make_primary_marker(1),
+])
+def test_forged_or_expired_marker_is_ignored(replica, marker):
+    client = TestClient(main.app)
+    client.get(f"/api/profiles/{replica['profile_id']}", headers={PRIMARY_HEADER: marker})
+    assert replica["replica"].count == 1
+
+
+def test_falls_back_to_primary_when_the_replica_is_down(replica):
+    router = replica["router"]
+    # Réplica caída: SQLite no puede abrir un directorio como base de datos
+    replica_path = router.replicas[0].url.database
+    router.replicas[0].dispose()
+    os.remove(replica_path)
+    os.mkdir(replica_path)
+    router.check_health()
+    assert router.healthy == []
+
+    response = TestClient(main.app).get(f"/api/profiles/{replica['profile_id']}")
+    assert response.status_code == 200
+    assert replica["primary"].count == 1
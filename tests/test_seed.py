@@ -0,0 +1,37 @@
+"""
+Carga de datos sintéticos
+"""
+from sqlalchemy import select
+
+from app.database.connection import SessionLocal
+from app.models.profile_model import Profile
+from app.models.user_model import User
+from app.services.seed_service import seed_profiles
+from app.services.storage_service import get_storage, key_from_path
+
+IMAGE_FIELDS = ("cover_image", "image_1", "image_2", "image_3")
+
+
+def test_each_seeded_profile_gets_its_own_image_files():
+    before = {stored.key for stored in get_storage().iter_objects()}
+    report = seed_profiles(count=20, batch_size=7, image_count=2, seed=1, cover_ratio=1.0)
+    assert report.users == 20
+
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            select(*[getattr(Profile, name) for name in IMAGE_FIELDS])
+            .join(User, User.id == Profile.user_id)
+            .where(User.email.like("%@seed.example.com"))
+        ).all()
+    finally:
+        db.close()
+    paths = [value for row in rows for value in row if value]
+
+    assert len(paths) == report.images >= 20
+    # Borrar la imagen de un perfil no puede dejar a otro sin la suya
+    assert len(set(paths)) == len(paths)
+    assert all(get_storage().exists(key_from_path(path)) for path in paths)
+    # Las plantillas no se quedan huérfanas en el almacenamiento
+    after = {stored.key for stored in get_storage().iter_objects()}
+    assert after - before == {key_from_path(path) for path in paths}
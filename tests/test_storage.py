@@ -0,0 +1,131 @@
+"""
+Backends de almacenamiento: S3Storage contra un servidor compatible con S3
+(moto) y la comprobación del formato al confirmar una subida firmada.
+"""
+import io
+from datetime import datetime, timezone
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from app.services import storage_service
+from app.services.storage_service import S3Storage, StorageBackend, key_from_path
+from tests.conftest import png_bytes
+
+PNG_HEADER = b"\x89PNG\r\n\x1a\n"
+
+
+def test_storage_backend_is_abstract():
+    with pytest.raises(TypeError):
+        StorageBackend()
+
+    class Incomplete(StorageBackend):
+        def save(self, key, fileobj, content_type=None):
+            return 0
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+@pytest.mark.parametrize("method,key", [
+    ("GET", "ab/cd/foto 1.png"),
+    ("PUT", "ab/cd/foto.png"),
+    ("HEAD", "foto.png"),
+    ("DELETE", "foto.png"),
+])
+def test_presign_matches_botocore(method, key):
+    boto3 = pytest.importorskip("boto3")
+    from botocore.config import Config
+
+    now = datetime(2026, 10, 19, 12, 0, 0, tzinfo=timezone.utc)
+    storage = S3Storage("bucket", "AKIDEXAMPLE", "secret", region="eu-west-1", endpoint_url="http://127.0.0.1:9000")
+    client = boto3.client(
+        "s3", endpoint_url="http://127.0.0.1:9000", region_name="eu-west-1",
+        aws_access_key_id="AKIDEXAMPLE", aws_secret_access_key="secret",
+        config=Config(signature_version="s3v4", s3={"addressing_style": "path"})
+    )
+    operations = {"GET": "get_object", "PUT": "put_object", "HEAD": "head_object", "DELETE": "delete_object"}
+    with mock.patch("botocore.auth.get_current_datetime", return_value=now.replace(tzinfo=None)):
+        expected = client.generate_presigned_url(operations[method], Params={"Bucket": "bucket", "Key": key}, ExpiresIn=900)
+
+    url = storage.presign(method, key, 900, now=now)
+    ours, theirs = urlparse(url), urlparse(expected)
+    assert ours.path == theirs.path
+    assert parse_qs(ours.query) == parse_qs(theirs.query)
+
+
+@pytest.fixture(scope="module")
+def s3():
+    server_module = pytest.importorskip("moto.server")
+    server = server_module.ThreadedMotoServer(ip_address="127.0.0.1", port=0, verbose=False)
+    server.start()
+    host, port = server.get_host_and_port()
+    storage = S3Storage("test-bucket", "testing", "testing", endpoint_url=f"http://{host}:{port}")
+    storage.client.put(storage.presign("PUT", "")).raise_for_status()
+    yield storage
+    server.stop()
+
+
+def test_s3_save_stat_read_and_delete(s3):
+    data = png_bytes()
+    assert s3.save("ab/cd/foto.png", io.BytesIO(data), "image/png") == len(data)
+
+    stored = s3.stat("ab/cd/foto.png")
+    assert stored.size == len(data)
+    assert stored.modified_at.tzinfo is not None
+    assert s3.read_head("ab/cd/foto.png", len(PNG_HEADER)) == PNG_HEADER
+    with s3.open("ab/cd/foto.png") as source:
+        assert source.read() == data
+
+    assert s3.delete("ab/cd/foto.png")
+    assert s3.stat("ab/cd/foto.png") is None
+    assert not s3.delete("ab/cd/foto.png")
+    with pytest.raises(FileNotFoundError):
+        s3.open("ab/cd/foto.png")
+
+
+def test_s3_iter_objects_and_copy(s3):
+    for name in ("a.png", "b.png"):
+        s3.save(f"list/{name}", io.BytesIO(png_bytes()), "image/png")
+    s3.save("other/c.png", io.BytesIO(png_bytes()), "image/png")
+    s3.copy("list/a.png", "list/copy.png")
+
+    keys = sorted(stored.key for stored in s3.iter_objects("list/"))
+    assert keys == ["list/a.png", "list/b.png", "list/copy.png"]
+    assert all(stored.size > 0 for stored in s3.iter_objects("list/"))
+
+
+def test_s3_presigned_upload_is_accepted(s3):
+    upload = s3.presigned_upload("direct/foto.png", "image/png")
+    response = s3.client.put(upload.url, content=png_bytes(), headers=upload.headers)
+    assert response.status_code == 200
+    assert s3.stat("direct/foto.png") is not None
+
+
+@pytest.mark.parametrize("content,status", [
+    (png_bytes(), 200),
+    (b"<html>no es una imagen</html>", 400),
+    # Una imagen real, pero de otro formato que el firmado
+    (b"GIF89a" + b"\x00" * 32, 400),
+])
+def test_confirm_upload_checks_the_format(client, make_user, s3, monkeypatch, content, status):
+    # Con S3 la subida va directa al bucket: la API solo ve el objeto al confirmar
+    monkeypatch.setattr(storage_service, "_storage", s3)
+    _, headers = make_user()
+    upload = client.post(
+        "/api/profiles/me/images/image_1/upload-url", params={"content_type": "image/png"}, headers=headers
+    ).json()
+    assert s3.client.put(upload["url"], content=content, headers=upload["headers"]).status_code == 200
+
+    response = client.put(
+        "/api/profiles/me/images/image_1",
+        json={"key": upload["key"], "upload_token": upload["upload_token"]},
+        headers=headers
+    )
+    assert response.status_code == status, response.text
+    if status == 200:
+        assert key_from_path(response.json()["image_1"]) == upload["key"]
+    else:
+        # El objeto rechazado se borra del almacenamiento
+        assert s3.stat(upload["key"]) is None
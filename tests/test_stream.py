@@ -0,0 +1,230 @@
+"""
+GET /api/profiles/stream: entrega de cambios, reanudación con Last-Event-ID
+(o "reset" si ya no se puede) y limpieza de la conexión al desconectarse
+"""
+import asyncio
+import json
+
+import main
+from app.services import stream_service
+from app.services.stream_service import profile_stream, replay_events
+
+TIMEOUT = 10
+
+
+class StreamClient:
+    """
+    Conexión SSE llamando directamente a la aplicación ASGI: el TestClient
+    espera a que termine la respuesta y un stream no termina nunca
+    """
+
+    def __init__(self, headers=None, query: str = ""):
+        self.headers = [(b"host", b"test")] + [
+            (name.lower().encode(), value.encode()) for name, value in (headers or {}).items()
+        ]
+        self.query = query.encode()
+        self.status = None
+        self._buffer = b""
+        self._chunks: asyncio.Queue = asyncio.Queue()
+        self._disconnected = asyncio.Event()
+        self._requested = False
+        self.task = None
+
+    async def _receive(self):
+        if not self._requested:
+            self._requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await self._disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def _send(self, message):
+        if message["type"] == "http.response.start":
+            self.status = message["status"]
+        elif message["type"] == "http.response.body":
+            await self._chunks.put(message.get("body", b""))
+            if not message.get("more_body"):
+                await self._chunks.put(None)
+
+    async def open(self):
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+            "scheme": "http", "path": "/api/profiles/stream", "raw_path": b"/api/profiles/stream",
+            "root_path": "", "query_string": self.query, "headers": self.headers,
+            "client": ("testclient", 50000), "server": ("test", 80),
+        }
+        self.task = asyncio.create_task(main.app(scope, self._receive, self._send))
+        return await self.next_message()
+
+    async def next_message(self) -> dict:
+        """
+        Siguiente mensaje SSE como diccionario (id, event, data...); None si se cerró
+        """
+        while b"\n\n" not in self._buffer:
+            chunk = await asyncio.wait_for(self._chunks.get(), TIMEOUT)
+            if chunk is None:
+                return None
+            self._buffer += chunk
+        raw, self._buffer = self._buffer.split(b"\n\n", 1)
+        fields = {}
+        for line in raw.decode("utf-8").split("\n"):
+            name, _, value = line.partition(":")
+            fields[name] = value.strip()
+        return fields
+
+    async def next_event(self, event: str) -> dict:
+        while True:
+            message = await self.next_message()
+            assert message is not None, "el stream se cerró"
+            if message.get("event") == event:
+                return message
+
+    async def close(self):
+        self._disconnected.set()
+        await asyncio.wait_for(self.task, TIMEOUT)
+
+
+def run_with_stream(coroutine_function, monkeypatch):
+    """
+    Arranca el broker global en un bucle propio (el TestClient no ejecuta el lifespan)
+    """
+    monkeypatch.setattr(profile_stream, "poll_interval", 0.05)
+
+    async def run():
+        await profile_stream.start()
+        try:
+            return await coroutine_function()
+        finally:
+            await profile_stream.stop()
+
+    return asyncio.run(run())
+
+
+def patch_name(client, headers, profile_id, name):
+    response = client.patch(f"/api/profiles/{profile_id}", headers=headers, json={"name": name})
+    assert response.status_code == 200, response.text
+
+
+def test_not_running_is_503(client):
+    assert not profile_stream.running
+    assert client.get("/api/profiles/stream").status_code == 503
+
+
+def test_change_is_delivered_and_disconnect_unsubscribes(client, make_user, monkeypatch):
+    _, headers = make_user()
+    profile_id = client.get("/api/profiles/me", headers=headers).json()["id"]
+
+    async def scenario():
+        stream = StreamClient()
+        ready = await stream.open()
+        assert stream.status == 200
+        assert ready["event"] == "ready" and int(ready["id"]) >= 0
+        assert profile_stream.client_count == 1
+
+        # El PATCH avisa al broker después del commit (outbox_dispatcher.after_commit)
+        await asyncio.to_thread(patch_name, client, headers, profile_id, "En directo")
+        message = await stream.next_event("profile")
+        data = json.loads(message["data"])
+        assert int(message["id"]) > int(ready["id"])
+        assert data["id"] == profile_id and data["action"] == "updated"
+        assert data["profile"]["name"] == "En directo"
+
+        await stream.close()
+        assert profile_stream.client_count == 0
+
+    run_with_stream(scenario, monkeypatch)
+
+
+def test_resume_replays_missed_events(client, make_user, monkeypatch):
+    _, headers = make_user()
+    profile_id = client.get("/api/profiles/me", headers=headers).json()["id"]
+
+    async def scenario():
+        first = StreamClient()
+        ready = await first.open()
+        await asyncio.to_thread(patch_name, client, headers, profile_id, "Primero")
+        seen = await first.next_event("profile")
+        await first.close()
+
+        # Mientras el navegador está desconectado
+        await asyncio.to_thread(patch_name, client, headers, profile_id, "Perdido 1")
+        await asyncio.to_thread(patch_name, client, headers, profile_id, "Perdido 2")
+
+        resumed = StreamClient(headers={"Last-Event-ID": seen["id"]})
+        assert (await resumed.open())["event"] == "ready"
+        names = []
+        for _ in range(2):
+            message = await resumed.next_event("profile")
+            assert int(message["id"]) > int(seen["id"])
+            data = json.loads(message["data"])
+            if data["id"] == profile_id:
+                names.append(data["profile"]["name"])
+        await resumed.close()
+        # Ambos eventos llegan con los datos actuales del perfil, sin repetir el ya visto
+        assert names == ["Perdido 2", "Perdido 2"]
+        assert int(ready["id"]) < int(seen["id"])
+
+    run_with_stream(scenario, monkeypatch)
+
+
+def test_resume_from_lost_history_sends_reset(client, make_user, monkeypatch):
+    make_user()
+
+    async def scenario():
+        stream = StreamClient(query="last_event_id=-10")
+        assert (await stream.open())["event"] == "ready"
+        reset = await stream.next_message()
+        assert reset["event"] == "reset" and int(reset["id"]) >= 0
+        await stream.close()
+        assert profile_stream.client_count == 0
+
+    run_with_stream(scenario, monkeypatch)
+
+
+def test_invalid_last_event_id_and_full_worker(client, monkeypatch):
+    async def scenario():
+        invalid = StreamClient(headers={"Last-Event-ID": "abc"})
+        await invalid.open()
+        assert invalid.status == 400
+
+        monkeypatch.setattr(profile_stream, "max_clients", 0)
+        full = StreamClient()
+        await full.open()
+        assert full.status == 503
+        assert profile_stream.client_count == 0
+
+    run_with_stream(scenario, monkeypatch)
+
+
+def test_stop_closes_open_streams(client, monkeypatch):
+    monkeypatch.setattr(profile_stream, "poll_interval", 0.05)
+
+    async def scenario():
+        await profile_stream.start()
+        stream = StreamClient()
+        await stream.open()
+        await profile_stream.stop()
+        # El broker manda None y la respuesta termina sin que el cliente se desconecte
+        assert await stream.next_message() is None
+        await asyncio.wait_for(stream.task, TIMEOUT)
+        assert profile_stream.client_count == 0
+
+    asyncio.run(scenario())
+
+
+def test_replay_events_limits(client, make_user, monkeypatch):
+    _, headers = make_user()
+    profile_id = client.get("/api/profiles/me", headers=headers).json()["id"]
+    before = stream_service._max_event_id()
+    patch_name(client, headers, profile_id, "Uno")
+    patch_name(client, headers, profile_id, "Dos")
+    after = stream_service._max_event_id()
+
+    messages = replay_events(before, after)
+    ids = [int(message.split(b"\n", 1)[0][len(b"id: "):]) for message in messages]
+    assert ids == sorted(ids) and ids[-1] == after
+    assert replay_events(after, after) == []
+    # Historia ya borrada del outbox
+    assert replay_events(-10, after) is None
+    # Demasiados eventos perdidos: mejor recargar el directorio
+    monkeypatch.setattr(stream_service, "STREAM_REPLAY_LIMIT", 1)
+    assert replay_events(before, after) is None
@@ -0,0 +1,57 @@
+"""
+GC de uploads: solo borra archivos huérfanos más antiguos que el periodo de gracia
+"""
+import io
+import os
+import time
+import uuid
+
+from sqlalchemy import update
+
+from app.database.connection import SessionLocal
+from app.models.image_job_model import ImageJob
+from app.models.profile_model import Profile
+from app.services.storage_service import get_storage, path_for_key
+from app.services.upload_gc_service import collect_orphaned_uploads
+from tests.conftest import png_bytes
+
+GRACE = 3600
+
+
+def stored_file(name: str, age_seconds: float = 0) -> str:
+    storage = get_storage()
+    key = f"gc-{name}-{uuid.uuid4().hex[:8]}.png"
+    storage.save(key, io.BytesIO(png_bytes()), "image/png")
+    if age_seconds:
+        mtime = time.time() - age_seconds
+        os.utime(storage._full_path(key), (mtime, mtime))
+    return key
+
+
+def test_grace_period_and_references(client, make_user):
+    storage = get_storage()
+    profile_id = client.get("/api/profiles/me", headers=make_user()[1]).json()["id"]
+    old_orphan = stored_file("old-orphan", age_seconds=GRACE + 60)
+    recent_orphan = stored_file("recent-orphan", age_seconds=GRACE - 60)
+    old_referenced = stored_file("old-referenced", age_seconds=GRACE * 2)
+    old_pending = stored_file("old-pending", age_seconds=GRACE * 2)
+    db = SessionLocal()
+    try:
+        db.execute(update(Profile).where(Profile.id == profile_id).values(image_2=path_for_key(old_referenced)))
+        # Subida que la cola de imágenes todavía no ha procesado
+        db.add(ImageJob(profile_id=profile_id, field="image_3", source_key=old_pending, status="pending"))
+        db.commit()
+    finally:
+        db.close()
+
+    dry_run = collect_orphaned_uploads(grace_seconds=GRACE, dry_run=True)
+    assert dry_run.orphaned >= 1 and dry_run.deleted == 0
+    assert storage.exists(old_orphan)
+
+    report = collect_orphaned_uploads(grace_seconds=GRACE, batch_size=2)
+    assert not report.errors
+    assert report.deleted >= 1
+    assert not storage.exists(old_orphan)
+    assert storage.exists(recent_orphan)
+    assert storage.exists(old_referenced)
+    assert storage.exists(old_pending)
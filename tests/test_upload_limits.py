@@ -0,0 +1,81 @@
+"""
+Límites de las subidas: 413 del middleware (por Content-Length o contando los
+bytes que llegan) y 413/400 del endpoint al validar cada imagen
+"""
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.middleware.upload_limit_middleware import UploadLimitMiddleware
+from app.services.image_service import ImageService
+from tests.conftest import png_bytes
+
+
+def limited_app(max_size: int):
+    app = FastAPI()
+    app.state.bodies = []
+
+    @app.post("/echo")
+    async def echo(request: Request):
+        body = await request.body()
+        app.state.bodies.append(len(body))
+        return {"size": len(body)}
+
+    app.add_middleware(UploadLimitMiddleware, max_size=max_size)
+    return app
+
+
+def test_content_length_over_limit_is_rejected_before_the_endpoint():
+    app = limited_app(max_size=1000)
+    client = TestClient(app)
+    response = client.post("/echo", content=b"x" * 1001)
+    assert response.status_code == 413
+    assert response.headers["connection"] == "close"
+    assert app.state.bodies == []
+
+    assert client.post("/echo", content=b"x" * 1000).json() == {"size": 1000}
+
+
+def test_streamed_body_over_limit_is_cut_while_reading():
+    app = limited_app(max_size=1000)
+    client = TestClient(app)
+
+    def chunks():
+        # Sin Content-Length (transfer-encoding: chunked)
+        for _ in range(5):
+            yield b"x" * 300
+
+    response = client.post("/echo", content=chunks())
+    assert response.status_code == 413
+    assert app.state.bodies == []
+
+
+def test_get_requests_are_not_limited():
+    app = limited_app(max_size=10)
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    assert TestClient(app).get("/ping").status_code == 200
+
+
+def test_image_over_max_size_is_413(client, make_user, monkeypatch):
+    _, headers = make_user()
+    image = png_bytes(size=(256, 256))
+    monkeypatch.setattr(ImageService, "MAX_SIZE", len(image) - 1)
+    response = client.put(
+        "/api/profiles/me", headers=headers, data={"name": "Grande"},
+        files={"cover_image": ("a.png", image, "image/png")}
+    )
+    assert response.status_code == 413, response.text
+
+
+def test_file_that_is_not_an_image_is_400(client, make_user):
+    _, headers = make_user()
+    # La extensión y el content-type no cuentan: se mira el contenido
+    response = client.put(
+        "/api/profiles/me", headers=headers, data={"name": "Falsa"},
+        files={"cover_image": ("a.png", b"<html>no soy una imagen</html>", "image/png")}
+    )
+    assert response.status_code == 400, response.text
+    assert response.json()["detail"] == "Tipo de archivo no permitido"
@@ -0,0 +1,96 @@
+"""
+Migración de uploads/ al esquema repartido en subdirectorios
+"""
+import io
+import os
+import time
+
+from sqlalchemy import select, update
+
+from app.database.connection import SessionLocal
+from app.models.outbox_event_model import OutboxEvent
+from app.models.profile_model import Profile
+from app.services.storage_service import get_storage, path_for_key, sharded_key
+from app.services.upload_gc_service import collect_orphaned_uploads
+from app.services.upload_migration_service import migrate_to_sharded_layout
+from tests.conftest import png_bytes
+
+
+def test_migration_bumps_version_and_records_an_event(client, make_user):
+    _, headers = make_user()
+    profile_id = client.get("/api/profiles/me", headers=headers).json()["id"]
+    storage = get_storage()
+    key = f"flat-{profile_id}.png"
+    storage.save(key, io.BytesIO(png_bytes()), "image/png")
+
+    db = SessionLocal()
+    try:
+        db.execute(update(Profile).where(Profile.id == profile_id).values(cover_image=path_for_key(key)))
+        db.commit()
+        version, updated_at = db.execute(select(Profile.version, Profile.updated_at).where(Profile.id == profile_id)).one()
+        last_event = db.execute(select(OutboxEvent.id).order_by(OutboxEvent.id.desc())).scalar() or 0
+    finally:
+        db.close()
+
+    report = migrate_to_sharded_layout(checkpoint_path=None)
+    assert not report.errors
+
+    db = SessionLocal()
+    try:
+        row = db.execute(
+            select(Profile.cover_image, Profile.version, Profile.updated_at).where(Profile.id == profile_id)
+        ).one()
+        events = db.execute(
+            select(OutboxEvent).where(OutboxEvent.id > last_event, OutboxEvent.entity_id == profile_id)
+        ).scalars().all()
+    finally:
+        db.close()
+
+    assert row.cover_image == path_for_key(sharded_key(key))
+    assert row.version == version + 1
+    assert row.updated_at == updated_at
+    assert [(event.topic, event.action, event.payload) for event in events] == [
+        ("profile", "updated", {"fields": ["cover_image"]})
+    ]
+    assert storage.exists(sharded_key(key))
+    assert not storage.exists(key)
+
+
+def test_gc_between_copy_and_commit_keeps_the_new_key(client, make_user, monkeypatch):
+    _, headers = make_user()
+    profile_id = client.get("/api/profiles/me", headers=headers).json()["id"]
+    storage = get_storage()
+    key = f"old-{profile_id}.png"
+    storage.save(key, io.BytesIO(png_bytes()), "image/png")
+    # Imagen subida hace tiempo: más antigua que el periodo de gracia del GC
+    old = time.time() - 7200
+    os.utime(storage._full_path(key), (old, old))
+
+    db = SessionLocal()
+    try:
+        db.execute(update(Profile).where(Profile.id == profile_id).values(cover_image=path_for_key(key)))
+        db.commit()
+    finally:
+        db.close()
+
+    copy = storage.copy
+    gc_reports = []
+
+    def copy_then_gc(source_key, target_key):
+        copy(source_key, target_key)
+        # El GC pasa antes de que la migración reescriba la ruta del perfil
+        gc_reports.append(collect_orphaned_uploads(grace_seconds=3600))
+
+    monkeypatch.setattr(storage, "copy", copy_then_gc)
+    report = migrate_to_sharded_layout(checkpoint_path=None)
+    assert not report.errors
+    assert gc_reports and not any(r.errors for r in gc_reports)
+
+    db = SessionLocal()
+    try:
+        cover_image = db.execute(select(Profile.cover_image).where(Profile.id == profile_id)).scalar()
+    finally:
+        db.close()
+    assert cover_image == path_for_key(sharded_key(key))
+    assert storage.exists(sharded_key(key))
+    assert not storage.exists(key)
@@ -0,0 +1,71 @@
+"""
+Revocación de tokens al cambiar la identidad del usuario (username y email van
+en el token) y al borrarlo
+"""
+import uuid
+
+from app.database.connection import SessionLocal, engine
+from app.models.token_revocation_model import TokenRevocation
+from tests.conftest import login
+
+
+def test_changing_identity_revokes_tokens(client, make_user, superuser_headers):
+    user_id, headers = make_user()
+    assert client.get("/api/profiles/me", headers=headers).status_code == 200
+
+    username = f"renamed{user_id[:8]}"
+    response = client.put(f"/api/users/{user_id}", headers=superuser_headers, json={"username": username})
+    assert response.status_code == 200, response.text
+    assert client.get("/api/profiles/me", headers=headers).status_code == 401
+
+    # Un token nuevo lleva el username actual y sigue valiendo
+    headers = login(client, username)
+    assert client.get("/api/profiles/me", headers=headers).status_code == 200
+
+    response = client.put(f"/api/users/{user_id}", headers=superuser_headers, json={"email": f"{username}@example.com"})
+    assert response.status_code == 200, response.text
+    assert client.get("/api/profiles/me", headers=headers).status_code == 401
+
+
+def test_unchanged_identity_keeps_tokens(client, make_user, superuser_headers):
+    user_id, headers = make_user()
+    username = client.get(f"/api/users/{user_id}", headers=superuser_headers).json()["username"]
+    response = client.put(f"/api/users/{user_id}", headers=superuser_headers, json={"username": username})
+    assert response.status_code == 200, response.text
+    assert client.get("/api/profiles/me", headers=headers).status_code == 200
+
+
+def test_bulk_delete_revokes_only_deleted_users(client, make_user, superuser_headers):
+    user_id, headers = make_user()
+    unknown_id = uuid.uuid4().hex
+    db = SessionLocal()
+    try:
+        before = db.query(TokenRevocation).filter(TokenRevocation.kind == "user").count()
+        response = client.post("/api/users/bulk-delete", headers=superuser_headers, json={"user_ids": [user_id, unknown_id]})
+        assert response.status_code == 202, response.text
+        assert response.json()["deleted"] == 1
+        revoked = [row.value for row in db.query(TokenRevocation).filter(TokenRevocation.kind == "user")]
+        assert len(revoked) == before + 1
+        assert user_id in revoked and unknown_id not in revoked
+    finally:
+        db.close()
+    assert client.get("/api/profiles/me", headers=headers).status_code == 401
+
+
+def test_bulk_delete_without_delete_returning(client, make_user, superuser_headers, queries, monkeypatch):
+    # MySQL no tiene DELETE ... RETURNING: los ids se leen antes de borrar
+    monkeypatch.setattr(engine.dialect, "delete_returning", False)
+    user_id, headers = make_user()
+    unknown_id = uuid.uuid4().hex
+    queries.clear()
+    response = client.post("/api/users/bulk-delete", headers=superuser_headers, json={"user_ids": [user_id, unknown_id]})
+    assert response.status_code == 202, response.text
+    assert response.json()["deleted"] == 1
+    assert not any(s.startswith("DELETE") and "RETURNING" in s for s in queries.statements)
+    db = SessionLocal()
+    try:
+        revoked = {row.value for row in db.query(TokenRevocation).filter(TokenRevocation.kind == "user")}
+        assert user_id in revoked and unknown_id not in revoked
+    finally:
+        db.close()
+    assert client.get("/api/profiles/me", headers=headers).status_code == 401